@@ -1,20 +1,19 @@
-from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QEventLoop
 from src.session import Session
-from src.cui import CUI
-from src.gui import GUI
-import gettext
+import argparse
 import asyncio
-import qasync
 import os
 
-def run_with_gui() -> None:
+def run_with_gui(resume: bool) -> None:
     """
     Run in GUI mode.
     """
+    # PyQt6 and qasync are only loaded when the GUI is selected.
+    from src.gui import GUI
+    import qasync
+
     view = GUI()
     view.main_window.show()
-    session = Session(view)
+    session = Session(view, resume)
     # Run Qt event loop and asyncio event loop together
     loop = qasync.QEventLoop(view.get_app_instance())
     asyncio.set_event_loop(loop)
@@ -23,18 +22,24 @@ def run_with_gui() -> None:
     finally:
         loop.close()
 
-def run_with_cui() -> None:
+def run_with_cui(resume: bool) -> None:
     """
     Run in CUI mode.
     """
+    from src.cui import CUI
+
     view = CUI()
-    session = Session(view)
+    session = Session(view, resume)
     asyncio.run(session.run())
     
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resume", action="store_true", help="resume the last interrupted session from its checkpoint")
+    args = parser.parse_args()
+
     ui_mode = os.getenv("UI_MODE", "")
     if ui_mode == "GUI":
-        run_with_gui()
+        run_with_gui(args.resume)
     else:
-        run_with_cui()
\ No newline at end of file
+        run_with_cui(args.resume)
@@ -0,0 +1,103 @@
+"""
+FileReaderの索引と内容キャッシュのベンチマーク。
+100k個のファイルを持つ合成ツリーで、毎回os.walkする方法と比較する。
+索引を使う検索は、CHECK_INTERVAL以内の繰り返し、間隔が過ぎた後、ファイルが変わった後のそれぞれで計る。
+
+    python -m benchmarks.bench_file_reader [--files 100000]
+"""
+from src.file_reader import FileIndex, FileReader
+from typing import Callable, Optional
+import argparse
+import os
+import tempfile
+import time
+
+
+def build_tree(root: str, file_count: int, files_per_dir: int = 100, dirs_per_dir: int = 10) -> str:
+    """
+    file_count個のファイルを持つツリーを作り、最後に作ったファイル名を返す。
+    """
+    directories = [root]
+    created = 0
+    name = ""
+    while created < file_count:
+        parent = directories[len(directories) // dirs_per_dir] if len(directories) > 1 else root
+        directory = os.path.join(parent, f"dir{len(directories)}")
+        os.makedirs(directory)
+        directories.append(directory)
+        for _ in range(min(files_per_dir, file_count - created)):
+            name = f"module_{created}.py"
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                f.write("x = 1\n")
+            created += 1
+    return name
+
+
+def walk_find(root: str, file_name: str) -> str:
+    for directory, _, files in os.walk(root):
+        if file_name in files:
+            return os.path.join(directory, file_name)
+    raise FileNotFoundError(file_name)
+
+
+def measure(label: str, repeat: int, function: Callable[[], object], setup: Optional[Callable[[int], object]] = None) -> None:
+    """
+    functionの1回あたりの時間を表示する。setupは毎回の前に呼ぶが、時間には含めない。
+    """
+    elapsed = 0.0
+    for i in range(repeat):
+        if setup:
+            setup(i)
+        started_at = time.perf_counter()
+        function()
+        elapsed += time.perf_counter() - started_at
+    print(f"{label:<40} {elapsed / repeat * 1000:10.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"Building a tree of {args.files} files ...")
+        last_name = build_tree(root, args.files)
+        reader = FileReader(root)
+
+        measure("os.walk find (old)", args.repeat, lambda: walk_find(root, last_name))
+        started_at = time.perf_counter()
+        reader.find_file_path(last_name)
+        print(f"{'index build (first call)':<40} {(time.perf_counter() - started_at) * 1000:10.3f} ms")
+        index = reader.get_index(root)
+        # CHECK_INTERVAL以内の繰り返しは、更新日時を確かめない。
+        measure("indexed find (within interval)", args.repeat, lambda: reader.find_file_path(last_name))
+
+        def interval_passed(_: int) -> None:
+            # CHECK_INTERVALが過ぎた状態にする。次の検索は、ツリーの全ディレクトリの更新日時を確かめる。
+            index.checked_at.clear()
+
+        measure("indexed find (interval passed)", args.repeat, lambda: reader.find_file_path(last_name), interval_passed)
+
+        def file_changed(i: int) -> None:
+            interval_passed(i)
+            with open(os.path.join(root, "dir1", f"added_{i}.py"), "w", encoding="utf-8") as f:
+                f.write("x = 1\n")
+            # 更新日時の分解能が粗いファイルシステムでも、変更として見えるようにする。
+            stat = os.stat(os.path.join(root, "dir1"))
+            os.utime(os.path.join(root, "dir1"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        measure("indexed find (file changed)", args.repeat, lambda: reader.find_file_path(last_name), file_changed)
+        print(f"(check interval: {FileIndex.CHECK_INTERVAL} s)")
+        measure("indexed find_file_list", args.repeat, lambda: reader.find_file_list("dir1"))
+
+        def read_uncached() -> None:
+            with open(reader.find_file_path(last_name), "r", encoding="utf-8") as f:
+                f.read()
+
+        measure("read_file without cache", args.repeat, read_uncached)
+        measure("read_file with cache", args.repeat, lambda: reader.read_file(last_name))
+
+
+if __name__ == "__main__":
+    main()
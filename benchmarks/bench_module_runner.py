@@ -0,0 +1,56 @@
+"""
+ModuleRunnerのベンチマーク。
+毎回python -mで起動する方法と、WarmInterpreterPoolからforkする方法で、1回の実行にかかる時間を比較する。
+
+    python -m benchmarks.bench_module_runner [--runs 20]
+"""
+from src.module_runner import ModuleRunner
+from src.warm_interpreter_pool import WarmInterpreterPool
+import argparse
+import asyncio
+import statistics
+import tempfile
+import os
+
+# 生成されるモジュールによくある、標準ライブラリをいくつか読み込んで少し出力するモジュール。
+SAMPLE_MODULE = """
+import asyncio, json, random, re, subprocess, datetime, pathlib, dataclasses
+print(json.dumps({"value": random.random()}))
+"""
+
+
+async def measure(runner: ModuleRunner, directory: str, runs: int) -> list[float]:
+    durations = []
+    for _ in range(runs):
+        result = await runner.arun_module("sample_module", directory)
+        if not result.succeeded:
+            raise RuntimeError(result.stderr)
+        durations.append(result.duration)
+    return durations
+
+
+async def main(runs: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "sample_module.py"), "w", encoding="utf-8") as f:
+            f.write(SAMPLE_MODULE)
+
+        cold = await measure(ModuleRunner(), directory, runs)
+        pool = WarmInterpreterPool()
+        await pool.start()
+        try:
+            warm = await measure(ModuleRunner(warm_pool=pool), directory, runs)
+        finally:
+            await pool.close()
+
+    cold_median = statistics.median(cold) * 1000
+    warm_median = statistics.median(warm) * 1000
+    print(f"{'cold python -m':<20} median {cold_median:8.2f} ms")
+    print(f"{'warm fork':<20} median {warm_median:8.2f} ms")
+    print(f"{'saved per run':<20}        {cold_median - warm_median:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs))
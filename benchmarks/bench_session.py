@@ -0,0 +1,158 @@
+"""
+Sessionの端から端までのベンチマーク。実際のAPIも人の入力も使わない。
+フェイクのOpenAIサーバーを立て、ScriptedUIで目標と文脈を与えて、
+10, 100, 1000個のタスクに分かれるシナリオのそれぞれで、段階ごとの時間、呼び出し回数、スループットを報告する。
+
+    python -m benchmarks.bench_session [--tasks 10 100 1000] [--latency 0.05] [--error-rate 0.0] [--malformed-rate 0.0] [--recordings recordings.json]
+
+openaiパッケージが、OPENAI_API_BASEに向けてフェイクサーバーへ問い合わせる。
+"""
+from benchmarks.fake_openai_server import FakeOpenAIServer, ScenarioResponder, load_recordings
+from benchmarks.scripted_ui import ScriptedUI
+from typing import Any, Awaitable, Callable
+import argparse
+import asyncio
+import functools
+import os
+import tempfile
+import time
+
+# 計る段階と、その段階に当たるSessionのメソッド。
+PHASES = {
+    "objective": "determine_objective",
+    "feasibility": "feasibility_assessment",
+    "split": "split_to_tasks",
+    "subdivide": "split_to_subtasks",
+    "classify": "classify_tasks",
+}
+
+
+class PhaseTimer:
+    """
+    段階ごとに、1つ以上の呼び出しが進行中だった時間の合計を計る。
+    並行して呼ばれた分は重ねて数えないので、壁時計の時間になる。
+    """
+    def __init__(self) -> None:
+        self.active: dict[str, int] = {}
+        self.started_at: dict[str, float] = {}
+        self.wall_time: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+
+    def wrap(self, phase: str, method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(method)
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            self.enter(phase)
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                self.exit(phase)
+        return timed
+
+    def enter(self, phase: str) -> None:
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        if not self.active.get(phase):
+            self.started_at[phase] = time.perf_counter()
+        self.active[phase] = self.active.get(phase, 0) + 1
+
+    def exit(self, phase: str) -> None:
+        self.active[phase] -= 1
+        if not self.active[phase]:
+            elapsed = time.perf_counter() - self.started_at[phase]
+            self.wall_time[phase] = self.wall_time.get(phase, 0.0) + elapsed
+
+
+def count_tasks(tasks: list[Any]) -> int:
+    return sum(1 + count_tasks(task.subtasks) for task in tasks)
+
+
+async def run_scenario(server: FakeOpenAIServer, task_count: int, work_dir: str) -> dict[str, Any]:
+    from src.api_scheduler import ApiScheduler
+    from src.session import Session
+    from src.telemetry import Telemetry
+
+    server.reset(ScenarioResponder(task_count))
+    # シナリオごとに、テレメトリとチェックポイントを新しくする。スケジューラは共有し、リトライ数は差分で数える。
+    Telemetry._shared = None
+    retries_before = ApiScheduler.shared().retries
+    os.environ["CHECKPOINT_PATH"] = os.path.join(work_dir, "checkpoint", f"session_{task_count}.json")
+
+    view = ScriptedUI(["Make a benchmark application.", "It runs in Python."])
+    session = Session(view)
+    timer = PhaseTimer()
+    for phase, method_name in PHASES.items():
+        setattr(session, method_name, timer.wrap(phase, getattr(session, method_name)))
+    tasks: list[Any] = []
+    split_to_tasks = session.split_to_tasks
+
+    async def keep_tasks(*args: Any, **kwargs: Any) -> Any:
+        tasks.extend(await split_to_tasks(*args, **kwargs))
+        return tasks
+    setattr(session, "split_to_tasks", keep_tasks)
+
+    started_at = time.perf_counter()
+    await session.run()
+    total = time.perf_counter() - started_at
+    return {
+        "task_count": count_tasks(tasks),
+        "total": total,
+        "phases": timer,
+        "server": server.stats(),
+        "retries": ApiScheduler.shared().retries - retries_before,
+        "parse_failure_rate": Telemetry.shared().parse_failure_rate(),
+    }
+
+
+def report(result: dict[str, Any]) -> None:
+    timer: PhaseTimer = result["phases"]
+    server_stats = result["server"]
+    calls = sum(server_stats["calls"].values())
+    print(f"--- {result['task_count']} tasks ---")
+    print(f"total: {result['total']:.2f} s, {calls} API calls ({server_stats['errors']} injected errors, {result['retries']} retries)")
+    for phase in PHASES:
+        if phase in timer.wall_time:
+            print(f"  {phase:<12} {timer.wall_time[phase]:8.2f} s  {timer.calls[phase]:5d} calls")
+    for kind, count in sorted(server_stats["calls"].items()):
+        print(f"  api {kind:<16} {count:5d}")
+    print(f"throughput: {result['task_count'] / result['total']:.1f} tasks/s, {calls / result['total']:.1f} API calls/s")
+    print(f"tokens: {server_stats['prompt_tokens']} prompt ({server_stats['cached_prompt_tokens']} cached by the provider), {server_stats['completion_tokens']} completion")
+    print(f"structured output parse failure rate: {result['parse_failure_rate']:.1%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per API response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of function call replies with broken JSON")
+    parser.add_argument("--recordings", default="", help="JSON file of recorded completions to replay")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(0, args.latency, args.jitter, args.error_rate, load_recordings(args.recordings), malformed_rate=args.malformed_rate)
+    server.start()
+    # Sessionを作る前に、openaiの向き先と、ベンチマークで邪魔になる制限を設定する。
+    os.environ["OPENAI_API_BASE"] = server.url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("RESPONSE_CACHE", "off")
+    os.environ.setdefault("OPENAI_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("OPENAI_TOKENS_PER_MINUTE", "1000000000")
+    os.environ.setdefault("EXPAND_MAX_NODES", str(max(args.tasks) * 2))
+
+    # Sessionはlog, cache, checkpoint, telemetryをカレントディレクトリに書くので、一時ディレクトリへ移って走らせる。
+    # 翻訳の置き場所は読み込んだ時のカレントディレクトリで決まるので、移る前に読み込む。
+    import src.i18n  # noqa: F401
+    original_dir = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            try:
+                for task_count in args.tasks:
+                    report(asyncio.run(run_scenario(server, task_count, work_dir)))
+            finally:
+                os.chdir(original_dir)
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+起動時間のベンチマーク。
+CUIとGUIのそれぞれについて、auto_evolver.pyがセッションを始めるまでに読み込むモジュールを
+新しいインタプリタで読み込み、その時間を計る。
+
+    python -m benchmarks.bench_startup [--runs 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 各モードで、Sessionを作るまでに実行される読み込み。
+# プロバイダのSDKは起動時ではなく、最初のAPI呼び出しで読み込まれる。
+STARTUP_CODE = {
+    "python (empty)": "pass",
+    "CUI": "import auto_evolver; from src.cui import CUI",
+    "GUI": "import auto_evolver; from src.gui import GUI; import qasync",
+    "provider SDK (first API call)": "import openai",
+}
+
+
+def measure(code: str, runs: int) -> list[float]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    durations = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True)
+        durations.append(time.perf_counter() - started_at)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr)
+    return durations
+
+
+def report(name: str, durations: list[float]) -> None:
+    print(f"{name}: median {statistics.median(durations) * 1000:.1f} ms, min {min(durations) * 1000:.1f} ms ({len(durations)} runs)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    for name, code in STARTUP_CODE.items():
+        try:
+            report(name, measure(code, args.runs))
+        except RuntimeError as e:
+            print(f"{name}: skipped ({e.args[0].strip().splitlines()[-1]})")
+
+
+if __name__ == "__main__":
+    main()
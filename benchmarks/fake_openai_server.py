@@ -0,0 +1,361 @@
+"""
+ベンチマーク用の、OpenAI APIの代わりになるローカルサーバー。
+/v1/chat/completions (ストリーミングを含む) と /v1/embeddings に答える。
+
+応答は、記録済みの応答ファイルの中で最初にプロンプトに一致したものを本文で返し、
+一致するものが無ければ、Sessionのプロンプトに合わせてScenarioResponderが作る。
+関数が指定されたリクエストには、その関数の呼び出し(function_call)で答える。
+遅延とエラー率を設定でき、エラーは429 (Retry-After付き) か500で返す。
+malformed-rateの割合で、関数の引数のJSONの後ろに余計な文字を付け、修正プロンプトを試せるようにする。
+
+    python -m benchmarks.fake_openai_server [--port 8765] [--latency 0.2] [--error-rate 0.05] [--malformed-rate 0.1] [--recordings recordings.json]
+
+記録済みの応答ファイルは、次の形のJSON。matchは最後のメッセージに対する正規表現。
+    [{"match": "feasible", "content": "Yes"}, ...]
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+
+class ScenarioResponder:
+    """
+    task_count個のタスクに分かれる目標を演じる応答者。
+    最初の分割でtask_count / 10個のグループを返し、各グループは分類で細分化に回され、9個のタスクに分かれる。
+    """
+    SUBTASKS_PER_GROUP = 9
+
+    def __init__(self, task_count: int) -> None:
+        self.group_count = max(1, task_count // (self.SUBTASKS_PER_GROUP + 1))
+
+    def respond_arguments(self, kind: str, prompt: str) -> dict[str, Any]:
+        """
+        関数呼び出しで答える場合の引数。
+        """
+        if kind == "feasibility":
+            return {"feasible": True}
+        if kind in ("split", "subdivide"):
+            return {"tasks": [line[2:] for line in self.respond(kind, prompt).split("\n")]}
+        if kind == "classify_batch":
+            lines = re.findall(r"^\s*(\d+)\. (.*)$", prompt, re.MULTILINE)
+            return {"classifications": [{"task": int(number), "number": self.tag_number(text)} for number, text in lines]}
+        if kind == "classify":
+            match = re.search(r"The task is: (.*)", prompt)
+            return {"number": self.tag_number(match.group(1) if match else "")}
+        if kind == "repair":
+            # 壊れた引数から、先頭の正しいJSONだけを取り出して返す。
+            match = re.search(r"Arguments: (.*)\n", prompt)
+            try:
+                arguments, _ = json.JSONDecoder().raw_decode(match.group(1) if match else "")
+                if isinstance(arguments, dict):
+                    return arguments
+            except json.JSONDecodeError:
+                pass
+        return {}
+
+    def respond(self, kind: str, prompt: str) -> str:
+        if kind == "feasibility":
+            return "Yes"
+        if kind == "infeasible_reason":
+            return "It needs resources that AutoEvolver does not have."
+        if kind == "split":
+            return "\n".join(f"- Module group {i + 1}" for i in range(self.group_count))
+        if kind == "subdivide":
+            match = re.search(r"Module group (\d+)", prompt)
+            group = match.group(1) if match else "0"
+            return "\n".join(f"- Module {group}.{j + 1}" for j in range(self.SUBTASKS_PER_GROUP))
+        if kind == "classify_batch":
+            lines = re.findall(r"^\s*(\d+)\. (.*)$", prompt, re.MULTILINE)
+            return "\n".join(f"{number}: {self.tag_number(text)}" for number, text in lines)
+        if kind == "classify":
+            match = re.search(r"The task is: (.*)", prompt)
+            return str(self.tag_number(match.group(1) if match else ""))
+        return "OK"
+
+    def tag_number(self, task_text: str) -> int:
+        # グループは細分化(2)、それ以外はPythonで解決(4)に分類する。
+        return 2 if "group" in task_text else 4
+
+
+def classify_prompt(prompt: str) -> str:
+    """
+    プロンプトの種類を、Sessionのプロンプトの言い回しから判定する。
+    """
+    if "do not match its JSON schema" in prompt:
+        return "repair"
+    if "why you have determined" in prompt:
+        return "infeasible_reason"
+    if "determines if the objective" in prompt:
+        return "feasibility"
+    if "listing tasks" in prompt:
+        return "split"
+    if "further subdivides" in prompt:
+        return "subdivide"
+    if "Numbers:" in prompt:
+        return "classify_batch"
+    if "Number:" in prompt:
+        return "classify"
+    return "other"
+
+
+class FakeOpenAIServer:
+    """
+    別スレッドで動くフェイクサーバー。呼び出し回数を種類ごとに数える。
+    """
+    # プロバイダ側のプロンプトキャッシュが効く、先頭の最小トークン数と、キャッシュされる単位。
+    CACHE_MIN_TOKENS = 1024
+    CACHE_INCREMENT = 128
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, recordings: Optional[list[dict[str, str]]] = None, embedding_dimension: int = 1536, seed: int = 0, malformed_rate: float = 0.0) -> None:
+        # 1回の応答にかかる秒数。jitterの範囲で一様にばらつく。
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.recordings = [(re.compile(recording["match"]), recording["content"]) for recording in recordings or []]
+        self.responder = ScenarioResponder(10)
+        self.embedding_dimension = embedding_dimension
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls: dict[str, int] = {}
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # 以前のリクエストと同じ先頭メッセージのうち、プロバイダ側のプロンプトキャッシュが効く分のトークン。
+        self.cached_prompt_tokens = 0
+        self.seen_prefixes: set[str] = set()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.make_handler())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-openai", daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset(self, responder: ScenarioResponder) -> None:
+        """
+        次のシナリオのために、応答者を替えて数を0に戻す。
+        """
+        with self.lock:
+            self.responder = responder
+            self.calls = {}
+            self.errors = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.cached_prompt_tokens = 0
+            self.seen_prefixes = set()
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "calls": dict(self.calls),
+                "errors": self.errors,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_prompt_tokens": self.cached_prompt_tokens,
+            }
+
+    def chat_content(self, prompt: str, function_name: str = "") -> tuple[str, str, bool]:
+        """
+        (プロンプトの種類, 応答, 関数呼び出しか)を返す。記録済みの応答があれば、それを本文で返す。
+        """
+        kind = classify_prompt(prompt)
+        for pattern, content in self.recordings:
+            if pattern.search(prompt):
+                return kind, content, False
+        if function_name:
+            arguments = json.dumps(self.responder.respond_arguments(kind, prompt))
+            with self.lock:
+                if kind != "repair" and self.random.random() < self.malformed_rate:
+                    arguments += "}"
+            return kind, arguments, True
+        return kind, self.responder.respond(kind, prompt), False
+
+    def embedding(self, text: str) -> list[float]:
+        """
+        テキストから決まる、長さ1の疑似ベクトル。
+        """
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        vector = [rng.gauss(0, 1) for _ in range(self.embedding_dimension)]
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def cached_tokens(self, messages: list[dict[str, Any]]) -> int:
+        """
+        先頭のメッセージが以前のリクエストと同じなら、プロバイダ側でキャッシュされるトークン数を返す。
+        プロバイダと同じく、CACHE_MIN_TOKENS未満の先頭はキャッシュせず、それ以上はCACHE_INCREMENT単位で数える。
+        """
+        if len(messages) < 2 or not messages[0].get("content"):
+            return 0
+        prefix = messages[0]["content"]
+        tokens = len(prefix) // 4
+        if tokens < self.CACHE_MIN_TOKENS:
+            return 0
+        tokens -= tokens % self.CACHE_INCREMENT
+        with self.lock:
+            if prefix in self.seen_prefixes:
+                self.cached_prompt_tokens += tokens
+                return tokens
+            self.seen_prefixes.add(prefix)
+        return 0
+
+    def record(self, kind: str, prompt_tokens: int, completion_tokens: int) -> None:
+        with self.lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def make_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", "0"))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                time.sleep(server.delay())
+                if server.should_fail():
+                    self.send_error_response()
+                    return
+                if self.path.endswith("/chat/completions"):
+                    self.chat_completions(body)
+                elif self.path.endswith("/embeddings"):
+                    self.embeddings(body)
+                else:
+                    self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+            def chat_completions(self, body: dict[str, Any]) -> None:
+                messages = body.get("messages", [])
+                prompt = messages[-1]["content"] if messages else ""
+                function_name = (body.get("function_call") or {}).get("name", "") if body.get("functions") else ""
+                kind, content, is_function_call = server.chat_content(prompt, function_name)
+                prompt_tokens = sum(len(message["content"] or "") for message in messages) // 4
+                cached_tokens = server.cached_tokens(messages)
+                completion_tokens = len(content) // 4
+                server.record(kind, prompt_tokens, completion_tokens)
+                model = body.get("model", "gpt-3.5-turbo")
+
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    for word in re.findall(r"\S+\s*", content):
+                        chunk = {"object": "chat.completion.chunk", "model": model, "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+
+                message: dict[str, Any] = {"role": "assistant", "content": content}
+                if is_function_call:
+                    message = {"role": "assistant", "content": None, "function_call": {"name": function_name, "arguments": content}}
+                self.send_json(200, {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": "function_call" if is_function_call else "stop"}],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                    },
+                })
+
+            def embeddings(self, body: dict[str, Any]) -> None:
+                texts = body.get("input", [])
+                if isinstance(texts, str):
+                    texts = [texts]
+                tokens = sum(len(text) for text in texts) // 4
+                server.record("embedding", tokens, 0)
+                self.send_json(200, {
+                    "object": "list",
+                    "model": body.get("model", "text-embedding-ada-002"),
+                    "data": [{"object": "embedding", "index": i, "embedding": server.embedding(text)} for i, text in enumerate(texts)],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                })
+
+            def send_error_response(self) -> None:
+                if server.random.random() < 0.5:
+                    self.send_json(429, {"error": {"message": "Rate limit reached.", "type": "requests"}}, {"Retry-After": "0"})
+                else:
+                    self.send_json(500, {"error": {"message": "The server had an error.", "type": "server_error"}})
+
+            def send_json(self, status: int, payload: dict[str, Any], headers: Optional[dict[str, str]] = None) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def load_recordings(path: str) -> list[dict[str, str]]:
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        recordings: list[dict[str, str]] = json.load(f)
+    return recordings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--tasks", type=int, default=10)
+    parser.add_argument("--recordings", default="")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.port, args.latency, args.jitter, args.error_rate, load_recordings(args.recordings), malformed_rate=args.malformed_rate)
+    server.reset(ScenarioResponder(args.tasks))
+    print(f"Serving on {server.url}. Set OPENAI_API_BASE to this URL.")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+ベンチマーク用の、決められた入力を順に返すUI。
+"""
+from src.ui_base import UIBase
+from src.chat_message import ChatMessage
+
+
+class ScriptedUI(UIBase):
+    """
+    request_user_inputに、inputsを先頭から順に返すUI。使い切った後は空文字列を返す。
+    表示されたメッセージは画面に出さず、messagesに溜める。
+    """
+    def __init__(self, inputs: list[str], echo: bool = False) -> None:
+        self.inputs = list(inputs)
+        self.echo = echo
+        self.messages: list[ChatMessage] = []
+
+    async def request_user_input(self) -> str:
+        return self.inputs.pop(0) if self.inputs else ""
+
+    def print_message(self, message: ChatMessage) -> None:
+        self.messages.append(message)
+        if self.echo:
+            print(f"{message.sender_info.display_name}: {message.text}")
+
+    def process_event(self) -> None:
+        pass
@@ -0,0 +1,267 @@
+from __future__ import annotations
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import weakref
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """
+    Lanes of the scheduler. Smaller values are dispatched first.
+    """
+    interactive = 0
+    normal = 1
+    background = 2
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute.
+    """
+    def __init__(self, rate_per_minute: float) -> None:
+        self.capacity = rate_per_minute
+        self.rate = rate_per_minute / 60
+        self.available = rate_per_minute
+        self.updated_at = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def seconds_until(self, amount: float) -> float:
+        """
+        Seconds until amount can be taken. Requests larger than the bucket only wait for a full bucket.
+        """
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.refill()
+        self.available -= amount
+
+
+class ApiScheduler:
+    """
+    Process-wide gate for every OpenAI call.
+    Limits requests and tokens per minute with token buckets, dispatches waiting calls by priority lane,
+    and retries transient errors with jittered exponential backoff that respects Retry-After.
+    """
+
+    RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+    RETRYABLE_ERRORS = {"RateLimitError", "APIConnectionError", "ServiceUnavailableError", "Timeout", "TryAgain", "TimeoutError"}
+
+    _shared: Optional[ApiScheduler] = None
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0) -> None:
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._waiting: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+        # One condition per event loop, as a condition can only be awaited in the loop it was first used in.
+        self._conditions: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Condition] = weakref.WeakKeyDictionary()
+
+        # Metrics
+        self.max_queue_depth = 0
+        self.dispatched = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.retries = 0
+
+    @classmethod
+    def shared(cls) -> ApiScheduler:
+        """
+        Return the scheduler shared by the whole process, configured from the environment.
+        """
+        if cls._shared is None:
+            cls._shared = cls(
+                float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "3500")),
+                float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "90000")),
+                int(os.getenv("OPENAI_MAX_RETRIES", "5")),
+                )
+        return cls._shared
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiting)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "dispatched": self.dispatched,
+            "average_wait": self.total_wait / self.dispatched if self.dispatched else 0.0,
+            "max_wait": self.max_wait,
+            "retries": self.retries,
+        }
+
+    def record_usage(self, difference: float) -> None:
+        """
+        Correct the tokens per minute bucket once the actual usage of a call is known.
+        """
+        with self._lock:
+            self.token_bucket.take(difference)
+
+    async def run(self, call: Callable[[], Awaitable[T]], tokens: int, priority: Priority = Priority.normal, on_retry: Optional[Callable[[], None]] = None) -> T:
+        """
+        Await call when the limits allow it, retrying transient errors.
+        on_retry is called before each retry.
+        """
+        attempt = 0
+        while True:
+            await self.acquire(tokens, priority)
+            try:
+                return await call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            attempt += 1
+            self.retries += 1
+            if on_retry:
+                on_retry()
+            await asyncio.sleep(delay)
+
+    def run_sync(self, call: Callable[[], T], tokens: int, priority: Priority = Priority.normal, on_retry: Optional[Callable[[], None]] = None) -> T:
+        """
+        Synchronous version of run, for callers outside the event loop.
+        """
+        attempt = 0
+        while True:
+            self.acquire_sync(tokens, priority)
+            try:
+                return call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            attempt += 1
+            self.retries += 1
+            if on_retry:
+                on_retry()
+            time.sleep(delay)
+
+    async def acquire(self, tokens: int, priority: Priority = Priority.normal) -> None:
+        """
+        Wait until this call is at the head of the queue and both buckets have room.
+        """
+        condition = self._condition()
+        entry = self._enqueue(priority)
+        started_at = time.monotonic()
+        async with condition:
+            try:
+                while True:
+                    wait = self._try_dispatch(entry, tokens)
+                    if wait == 0:
+                        break
+                    try:
+                        # Wake up early if the queue changes, e.g. a higher priority call arrives.
+                        await asyncio.wait_for(condition.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._remove(entry)
+                raise
+            finally:
+                condition.notify_all()
+        self._record_wait(time.monotonic() - started_at)
+
+    def _condition(self) -> asyncio.Condition:
+        """
+        The condition of the running event loop. Waiters in other loops poll the queue instead of being notified.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            condition = self._conditions.get(loop)
+            if condition is None:
+                condition = asyncio.Condition()
+                self._conditions[loop] = condition
+        return condition
+
+    def acquire_sync(self, tokens: int, priority: Priority = Priority.normal) -> None:
+        """
+        Synchronous version of acquire.
+        """
+        entry = self._enqueue(priority)
+        started_at = time.monotonic()
+        try:
+            while True:
+                wait = self._try_dispatch(entry, tokens)
+                if wait == 0:
+                    break
+                time.sleep(min(wait, 0.05))
+        except BaseException:
+            self._remove(entry)
+            raise
+        self._record_wait(time.monotonic() - started_at)
+
+    def _enqueue(self, priority: Priority) -> tuple[int, int]:
+        entry = (int(priority), next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiting, entry)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiting))
+        return entry
+
+    def _remove(self, entry: tuple[int, int]) -> None:
+        with self._lock:
+            if entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+
+    def _try_dispatch(self, entry: tuple[int, int], tokens: int) -> float:
+        """
+        Take from the buckets and leave the queue if entry is next and there is room.
+        Returns 0 on success, otherwise the number of seconds to wait before trying again.
+        """
+        with self._lock:
+            if self._waiting[0] != entry:
+                return 0.05
+            wait = max(self.request_bucket.seconds_until(1), self.token_bucket.seconds_until(tokens))
+            if wait > 0:
+                return wait
+            self.request_bucket.take(1)
+            self.token_bucket.take(tokens)
+            heapq.heappop(self._waiting)
+            return 0
+
+    def _record_wait(self, wait: float) -> None:
+        with self._lock:
+            self.dispatched += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Seconds to wait before retrying error, or None if it should not be retried.
+        """
+        if attempt >= self.max_retries:
+            return None
+        status = getattr(error, "http_status", None)
+        if status not in self.RETRYABLE_STATUS and type(error).__name__ not in self.RETRYABLE_ERRORS:
+            return None
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        headers = getattr(error, "headers", None) or {}
+        retry_after = headers.get("Retry-After") or headers.get("retry-after")
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
@@ -1,71 +1,401 @@
 from .role import Role
-import openai
+from .api_scheduler import ApiScheduler, Priority
+from .response_cache import ResponseCache
+from .token_counter import count_tokens
+from .telemetry import CallRecord, Telemetry
+from .model_router import ModelRouter
+from .structured_output import OutputSchema, StructuredOutputError
+from typing import Any, AsyncIterator, Optional, TypeVar
+import logging
+
+T = TypeVar("T")
+logger = logging.getLogger(__name__)
 
 class BotAgent:
     """
     要求に応じたテキストを返す、柔軟なChatBotエージェント。
     """
 
-    def __init__(self) -> None:
+    # 1メッセージあたりに加わる、role等のトークン数の目安。
+    MESSAGE_OVERHEAD_TOKENS = 4
+    SUMMARY_PREFIX = "Summary of the earlier conversation: "
+    # 構造化出力が解釈できなかった時に、修正だけを頼む回数。使い切ったら、より強い階層で問い直す。
+    STRUCTURED_REPAIR_ATTEMPTS = 1
+
+    def __init__(self, cache: Optional[ResponseCache] = None, token_budget: int = 0, priority: Priority = Priority.normal) -> None:
         self.context: list[dict[str, str]] = []
+        self.cache = cache
+        # 全てのAPI呼び出しは、プロセス共通のスケジューラをこのpriorityで通す。
+        self.scheduler = ApiScheduler.shared()
+        self.priority = priority
+        # 呼び出しごとのトークン数、待ち時間、リトライ、キャッシュの利用を記録する。
+        self.telemetry = Telemetry.shared()
+        # 呼び出しの種類ごとのモデルと、答えが使えなかった時に問い直す、より強いモデルを決める。
+        self.router = ModelRouter.shared()
+        # contextのトークン数の上限。0なら上限なし。
+        # 上限を超えたら、古いメッセージだけを要約して、最近のやりとりはそのまま残す。
+        self.token_budget = token_budget
+        self.context_tokens = 0
 
-    def response(self, prompt: str, role: Role = Role.system, model: str = "gpt-3.5-turbo") -> str:
+    def response(self, prompt: str, role: Role = Role.system, model: str = "gpt-3.5-turbo", use_cache: bool = True, prefix: str = "") -> str:
         """
         文脈を記憶せず、promptに対する応答を取得する。
         """
-        persona_message = {"role": role.name, "content": prompt}
+        return self._complete(self._prompt_messages(prompt, role, prefix), model, use_cache)
 
-        response_data = openai.ChatCompletion.create(  # type: ignore[no-untyped-call]
-            model=model,
-            messages=[persona_message],
-        )
+    async def aresponse(self, prompt: str, role: Role = Role.system, model: str = "gpt-3.5-turbo", use_cache: bool = True, prefix: str = "") -> str:
+        """
+        responseの非同期版。応答を待つ間もイベントループを止めない。
+        """
+        return await self._acomplete(self._prompt_messages(prompt, role, prefix), model, use_cache)
+
+    async def astream_response(self, prompt: str, role: Role = Role.system, model: str = "gpt-3.5-turbo", use_cache: bool = True, prefix: str = "") -> AsyncIterator[str]:
+        """
+        aresponseのストリーミング版。届いたトークンから順に返す。
+        """
+        async for chunk in self._astream(self._prompt_messages(prompt, role, prefix), model, use_cache):
+            yield chunk
+
+    async def aresponse_structured(self, prompt: str, schema: OutputSchema[T], call_type: str, role: Role = Role.system, use_cache: bool = True, prefix: str = "") -> T:
+        """
+        schemaの関数を呼ばせる形で応答を取得し、検証してTに変換した値を返す。
+        検証に失敗したら、元のpromptは送らず、壊れた応答とエラーだけを示して修正させる。
+        修正しても解釈できなければ、より強い階層のモデルで問い直し、全て失敗したらStructuredOutputErrorを送出する。
+        """
+        value, _ = await self._astructured(self._prompt_messages(prompt, role, prefix), schema, call_type, use_cache)
+        return value
 
-        response: str = response_data["choices"][0]["message"]["content"]
-        return response
-    
     def add_context(self, context: str, role: Role = Role.system) -> None:
         """
         contextを記憶する。
         """
         context_message = {"role": role.name, "content": context}
-        self.context.append(context_message)
+        self._append_context(context_message)
 
-    def response_to_context(self, model: str="gpt-3.5-turbo") -> str:
+    def response_to_context(self, model: str="gpt-3.5-turbo", use_cache: bool = True) -> str:
         """
         contextに対して応答を返す。応答も記憶する。
         """
-        response_data = openai.ChatCompletion.create(  # type: ignore[no-untyped-call]
-            model=model,
-            messages=self.context,
-        )
+        self._fit_context(model)
+        response = self._complete(self.context, model, use_cache)
+        response_context = {"role": Role.assistant.name, "content": response}
+        self._append_context(response_context)
+        return response
 
-        response: str = response_data["choices"][0]["message"]["content"]
+    async def aresponse_to_context(self, model: str="gpt-3.5-turbo", use_cache: bool = True) -> str:
+        """
+        response_to_contextの非同期版。応答も記憶する。
+        """
+        await self._afit_context(model)
+        response = await self._acomplete(self.context, model, use_cache)
         response_context = {"role": Role.assistant.name, "content": response}
-        self.context.append(response_context)
+        self._append_context(response_context)
         return response
-    
-    def compress_to_summary(self, model: str="gpt-3.5-turbo") -> None:
-        
+
+    async def aresponse_to_context_structured(self, schema: OutputSchema[T], call_type: str, use_cache: bool = True) -> T:
+        """
+        contextに対するaresponse_structured。採用した応答を記憶する。
+        """
+        await self._afit_context(self.router.model_for(call_type))
+        value, reply = await self._astructured(self.context, schema, call_type, use_cache)
+        response_context = {"role": Role.assistant.name, "content": reply}
+        self._append_context(response_context)
+        return value
+
+    async def astream_response_to_context(self, model: str="gpt-3.5-turbo", use_cache: bool = True) -> AsyncIterator[str]:
+        """
+        contextに対する応答を、届いたトークンから順に返す。応答が揃ったら記憶する。
+        """
+        await self._afit_context(model)
+        response = ""
+        async for chunk in self._astream(self.context, model, use_cache):
+            response += chunk
+            yield chunk
+        response_context = {"role": Role.assistant.name, "content": response}
+        self._append_context(response_context)
+
+    def compress_to_summary(self, model: str="gpt-3.5-turbo", use_cache: bool = True) -> None:
+        """
+        contextを、圧縮した要約1つに置き換える。
+        """
+        self._append_context(self._compress_command())
+        summary = self._complete(self.context, model, use_cache)
+        self._replace_with_summary(summary)
+
+    async def acompress_to_summary(self, model: str="gpt-3.5-turbo", use_cache: bool = True) -> None:
+        """
+        compress_to_summaryの非同期版。
+        """
+        self._append_context(self._compress_command())
+        summary = await self._acomplete(self.context, model, use_cache)
+        self._replace_with_summary(summary)
+
+    def clear_context(self) -> None:
+        """
+        文脈をクリアする。
+        """
+        self.context = []
+        self.context_tokens = 0
+
+    def _prompt_messages(self, prompt: str, role: Role, prefix: str) -> list[dict[str, str]]:
+        """
+        promptのメッセージを作る。prefixがあれば、その前に共通の前置きとして置く。
+        前置きが呼び出し間で同じで1024トークン以上あれば、プロバイダ側のプロンプトキャッシュが効く。
+        """
+        persona_message = {"role": role.name, "content": prompt}
+        if not prefix:
+            return [persona_message]
+        return [{"role": Role.system.name, "content": prefix}, persona_message]
+
+    def _append_context(self, message: dict[str, str]) -> None:
+        """
+        messageを記憶し、トークン数を数える。
+        """
+        self.context.append(message)
+        self.context_tokens += self._message_tokens(message)
+
+    def _message_tokens(self, message: dict[str, str]) -> int:
+        return count_tokens(message["content"]) + self.MESSAGE_OVERHEAD_TOKENS
+
+    def _oldest_segment(self) -> int:
+        """
+        要約すべき古いメッセージの数を返す。要約が不要なら0を返す。
+        新しいメッセージから順に、予算の半分に収まるまでをそのまま残す。
+        """
+        if not self.token_budget or self.context_tokens <= self.token_budget:
+            return 0
+
+        kept_tokens = 0
+        keep_from = len(self.context)
+        while keep_from > 1:
+            tokens = self._message_tokens(self.context[keep_from - 1])
+            if kept_tokens + tokens > self.token_budget // 2:
+                break
+            kept_tokens += tokens
+            keep_from -= 1
+        # 最新のメッセージは必ず残す。
+        count = min(keep_from, len(self.context) - 1)
+        # 要約済みのメッセージだけを、もう一度要約することはしない。
+        if count == 1 and self.context[0]["content"].startswith(self.SUMMARY_PREFIX):
+            return 0
+        return count
+
+    def _compress_command(self) -> dict[str, str]:
         content = "Please compress the following text as much as possible while preserving its meaning. It can be in a form that is not human readable. You are free to use any characters and expressions you wish. You may use emoji and symbols."
-        system_command = {"role": Role.system.name, "content": content}
-        self.context.append(system_command)
-
-        summary_data = openai.ChatCompletion.create(  # type: ignore[no-untyped-call]
-            model=model,
-            messages=self.context,
-        )
-        
-        # 要約を整形する。
-        summary = summary_data["choices"][0]["message"]["content"]
-        memorable_response = {"role": "assistant", "content": summary}
+        return {"role": Role.system.name, "content": content}
 
+    def _replace_with_summary(self, summary: str) -> None:
         # 文脈をクリアし、要約を追記する
         self.clear_context()
-        self.context.append(memorable_response)
-        print("要約化しました。")
+        self._append_context({"role": Role.assistant.name, "content": summary})
+        logger.info("要約化しました。")
 
-    def clear_context(self) -> None:
+    def _summary_messages(self, segment: list[dict[str, str]]) -> list[dict[str, str]]:
+        content = "Please summarize the following conversation as concisely as possible while preserving facts, decisions and open questions. If it begins with an earlier summary, merge it into the new summary."
+        conversation = "\n".join(f"{message['role']}: {message['content']}" for message in segment)
+        return [
+            {"role": Role.system.name, "content": content},
+            {"role": Role.user.name, "content": conversation},
+        ]
+
+    def _replace_segment(self, count: int, summary: str) -> None:
+        summary_message = {"role": Role.system.name, "content": self.SUMMARY_PREFIX + summary}
+        self.context = [summary_message] + self.context[count:]
+        self.context_tokens = sum(self._message_tokens(message) for message in self.context)
+
+    def _fit_context(self, model: str) -> None:
         """
-        文脈をクリアする。
+        contextがtoken_budgetを超えていれば、古いメッセージを1つの要約に置き換える。
+        """
+        count = self._oldest_segment()
+        if count:
+            summary = self._complete(self._summary_messages(self.context[:count]), model, True)
+            self._replace_segment(count, summary)
+
+    async def _afit_context(self, model: str) -> None:
+        """
+        _fit_contextの非同期版。
+        """
+        count = self._oldest_segment()
+        if count:
+            summary = await self._acomplete(self._summary_messages(self.context[:count]), model, True)
+            self._replace_segment(count, summary)
+
+    def _complete(self, messages: list[dict[str, str]], model: str, use_cache: bool) -> str:
+        """
+        messagesに対する応答を取得する。キャッシュがあればそれを返す。
+        """
+        with self.telemetry.call("chat", model) as record:
+            key = self._lookup_key(messages, model, use_cache)
+            if key and self.cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    record.cache_hit = True
+                    return cached
+
+            import openai
+
+            tokens = self._prompt_tokens(messages)
+            response_data = self.scheduler.run_sync(
+                lambda: openai.ChatCompletion.create(  # type: ignore[no-untyped-call]
+                    model=model,
+                    messages=messages,
+                ),
+                tokens,
+                self.priority,
+                record.add_retry,
+            )
+            response: str = response_data["choices"][0]["message"]["content"]
+            self._record_usage(record, response_data, tokens, response)
+
+            if key and self.cache:
+                self.cache.set(key, response)
+            return response
+
+    async def _astructured(self, messages: list[dict[str, str]], schema: OutputSchema[T], call_type: str, use_cache: bool) -> tuple[T, str]:
+        """
+        call_typeの階層から順に強いモデルへ、schemaに沿った応答を求め、最初に解釈できた(値, 応答)を返す。
+        """
+        path = self.router.escalation_path(call_type)
+        error = ""
+        for escalation, (tier, model) in enumerate(path):
+            labels = {"call_type": call_type, "tier": tier.name, "escalation": escalation, "schema": schema.name}
+            key = self._lookup_key(messages, model, use_cache, self._schema_params(schema))
+            reply = await self._acomplete(messages, model, use_cache, labels, schema, store=False)
+            for repair in range(self.STRUCTURED_REPAIR_ATTEMPTS + 1):
+                try:
+                    value = schema.parse(reply)
+                    self.telemetry.record_parse(schema.name, False, repair > 0)
+                    # 修正された応答も、元の問い合わせへの応答として記録する。
+                    self._store(key, reply)
+                    return value, reply
+                except StructuredOutputError as e:
+                    error = e.message
+                    self.telemetry.record_parse(schema.name, True, repair > 0)
+                if repair == 0:
+                    # 解釈できない応答は、次のセッションで再び使われないよう捨てる。
+                    self._evict(key)
+                if repair == self.STRUCTURED_REPAIR_ATTEMPTS:
+                    break
+                # 元の会話は送らず、壊れた応答とエラーだけで修正させる。
+                repair_messages = [{"role": Role.system.name, "content": schema.repair_prompt(reply, error)}]
+                reply = await self._acomplete(repair_messages, model, use_cache, {**labels, "repair": repair + 1}, schema, store=False)
+            if escalation < len(path) - 1:
+                self.router.record_escalation(call_type)
+        raise StructuredOutputError(error)
+
+    async def _acomplete(self, messages: list[dict[str, str]], model: str, use_cache: bool, labels: Optional[dict[str, Any]] = None, schema: Optional[OutputSchema[Any]] = None, store: bool = True) -> str:
+        """
+        _completeの非同期版。labelsはテレメトリの記録に添える。
+        schemaがあれば、その関数を呼ばせて、引数のJSON文字列を返す。関数が呼ばれなければ本文を返す。
+        storeがFalseなら応答をキャッシュに記録しない。応答を解釈する呼び出し元が、解釈できてから記録する。
+        """
+        with self.telemetry.call("chat", model) as record:
+            record.attributes.update(labels or {})
+            params = self._schema_params(schema)
+            key = self._lookup_key(messages, model, use_cache, params)
+            if key and self.cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    record.cache_hit = True
+                    return cached
+
+            import openai
+
+            tokens = self._prompt_tokens(messages)
+            response_data = await self.scheduler.run(
+                lambda: openai.ChatCompletion.acreate(  # type: ignore[no-untyped-call]
+                    model=model,
+                    messages=messages,
+                    **params,
+                ),
+                tokens,
+                self.priority,
+                record.add_retry,
+            )
+            message = response_data["choices"][0]["message"]
+            function_call = message.get("function_call")
+            response: str = function_call["arguments"] if function_call else message.get("content") or ""
+            self._record_usage(record, response_data, tokens, response)
+
+            if store:
+                self._store(key, response)
+            return response
+
+    async def _astream(self, messages: list[dict[str, str]], model: str, use_cache: bool) -> AsyncIterator[str]:
+        """
+        messagesに対する応答を、届いたトークンから順に返す。キャッシュがあればそれをまとめて返す。
+        """
+        with self.telemetry.call("chat_stream", model) as record:
+            key = self._lookup_key(messages, model, use_cache)
+            if key and self.cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    record.cache_hit = True
+                    yield cached
+                    return
+
+            import openai
+
+            tokens = self._prompt_tokens(messages)
+            response_stream = await self.scheduler.run(
+                lambda: openai.ChatCompletion.acreate(  # type: ignore[no-untyped-call]
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                ),
+                tokens,
+                self.priority,
+                record.add_retry,
+            )
+
+            response = ""
+            async for response_data in response_stream:
+                chunk: str = response_data["choices"][0]["delta"].get("content", "")
+                if chunk:
+                    response += chunk
+                    yield chunk
+            # ストリーミングでは使用量が返らないので、ローカルで数えた値を記録する。
+            record.set_usage(tokens, count_tokens(response))
+
+            if key and self.cache:
+                self.cache.set(key, response)
+
+    def _prompt_tokens(self, messages: list[dict[str, str]]) -> int:
+        return sum(self._message_tokens(message) for message in messages)
+
+    def _record_usage(self, record: CallRecord, response_data: Any, estimated_tokens: int, response: str) -> None:
+        """
+        使ったトークン数をテレメトリに記録し、見積もりとの差をスケジューラに伝える。
+        使用量が返らなければ、ローカルで数えた値を記録する。
+        """
+        usage = response_data.get("usage") if hasattr(response_data, "get") else None
+        if usage:
+            record.set_usage(usage["prompt_tokens"], usage["completion_tokens"])
+            self.scheduler.record_usage(usage["total_tokens"] - estimated_tokens)
+        else:
+            record.set_usage(estimated_tokens, count_tokens(response))
+
+    def _schema_params(self, schema: Optional[OutputSchema[Any]]) -> dict[str, Any]:
+        """
+        schemaの関数を呼ばせるリクエストのパラメータ。キャッシュのキーにも含める。
+        """
+        if not schema:
+            return {}
+        return {"functions": [schema.function], "function_call": {"name": schema.name}}
+
+    def _store(self, key: str, response: str) -> None:
+        if key and self.cache:
+            self.cache.set(key, response)
+
+    def _evict(self, key: str) -> None:
+        if key and self.cache:
+            self.cache.delete(key)
+
+    def _lookup_key(self, messages: list[dict[str, str]], model: str, use_cache: bool, params: Optional[dict[str, Any]] = None) -> str:
+        """
+        キャッシュを使う場合はそのキーを、使わない場合は空文字列を返す。
         """
-        self.context = []
\ No newline at end of file
+        if not self.cache or not use_cache:
+            return ""
+        return ResponseCache.make_key(model, messages, params)
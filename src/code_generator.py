@@ -1,27 +1,122 @@
+from typing import Optional
+import ast
 import os
+import tempfile
+
+
+class InvalidModuleError(Exception):
+    """
+    生成したソースコードがPythonとして正しくない場合に発生する例外。
+    """
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+    def __str__(self) -> str:
+        return f"{type(self).__name__}: {self.message}"
+
+
+class GenerationResult:
+    """
+    1つのモジュールの生成結果。
+    """
+    def __init__(self, file_name: str, path: str = "", error: str = "", line: Optional[int] = None) -> None:
+        self.file_name = file_name
+        self.path = path
+        self.error = error
+        self.line = line
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+    def __str__(self) -> str:
+        if self.ok:
+            return f"{self.file_name}: OK ({self.path})"
+        location = f" line {self.line}" if self.line else ""
+        return f"{self.file_name}:{location} {self.error}"
+
 
 class CodeGenerator:
     def generate_module(self, file_name: str, text: str, directory: str = "src") -> str:
         """
         ファイル名とソースコードから、.pyファイルを生成し、そのパスを返す。
+        ソースコードが正しくなければ、ファイルは書かずにInvalidModuleErrorを送出する。
+        """
+        result = self.generate_modules([(file_name, text)], directory)[0]
+        if not result.ok:
+            raise InvalidModuleError(str(result))
+        return result.path
+
+
+    def generate_modules(self, replies: list[tuple[str, str]], directory: str = "src") -> list[GenerationResult]:
+        """
+        (ファイル名, 返答)の組から、ソースコードを抜き出して検証し、
+        正しいものだけを.pyファイルとして書き出す。replies と同じ順で結果を返す。
         """
+        # 1つの返答の構文解析は、別のプロセスへ送る手間より軽いので、このプロセスで順に行う。
+        file_names = [file_name for file_name, _ in replies]
+        validated = [self.validate_reply(file_name, text) for file_name, text in replies]
 
+        results = []
+        for file_name, (source_code, error, line) in zip(file_names, validated):
+            if error:
+                results.append(GenerationResult(file_name, error=error, line=line))
+                continue
+            path = os.path.join(directory, file_name)
+            self.write_atomically(path, source_code)
+            results.append(GenerationResult(file_name, path=path))
+        return results
+
+
+    def write_atomically(self, path: str, source_code: str) -> None:
+        """
+        同じディレクトリの一時ファイルに書いてから置き換え、書きかけのファイルが残らないようにする。
+        """
+        directory = os.path.dirname(path) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(source_code)
+            # mkstempは所有者だけが読める0600で作るので、通常のファイルと同じ権限に戻す。
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+    def validate_reply(self, file_name: str, text: str) -> tuple[str, str, Optional[int]]:
+        """
+        返答からソースコードを抜き出し、構文解析とコンパイルを行う。
+        (ソースコード, エラーメッセージ, エラーの行)を返す。エラーがなければメッセージは空文字列。
+        """
+        source_code = self.extract_source_code(text)
+        if not source_code.strip():
+            return source_code, "No source code was found.", None
+        try:
+            tree = ast.parse(source_code, filename=file_name)
+            compile(tree, file_name, "exec")
+        except SyntaxError as e:
+            return source_code, f"{type(e).__name__}: {e.msg}", e.lineno
+        except ValueError as e:
+            return source_code, f"{type(e).__name__}: {e}", None
+        return source_code, "", None
+
+
+    def extract_source_code(self, text: str) -> str:
+        """
+        返答からソースコードを抜き出す。
+        """
         # codeにpythonコードブロックが含まれている場合、その中身を抜き出す。
         if "```python" in text:
-            source_code = self.split_by_pythoncodeBlock(text)
+            return self.split_by_pythoncodeBlock(text)
         # codeにpythonコードブロックが含まれておらず、かつコードブロックはある場合、コードブロックで抜き出す。
         elif "```" in text:
-            source_code = self.split_by_codeBlock(text)
+            return self.split_by_codeBlock(text)
         # codeにpythonコードブロックもコードブロックも含まれていない場合、そのままソースコードを使用する。
         else:
-            pass
-
-        # .pyファイルに書き出す
-        result_path = os.path.join(directory, file_name)
-        with open(result_path, 'w', encoding="utf-8") as f:
-            f.write(source_code)
-        
-        return result_path
+            return text
 
 
     def split_by_pythoncodeBlock(self, text: str) -> str:
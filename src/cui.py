@@ -32,8 +32,47 @@ class CUI(UIBase):
             print()
             return
 
-        color = colorama.Fore.WHITE
         reset = colorama.Style.RESET_ALL
+        print(self.message_header(message) + message.text + reset)
+
+        # 空行を入れる
+        print()
+
+
+    def print_partial_message(self, message: ChatMessage, chunk: str) -> None:
+        """
+        ストリーミング中のメッセージに、届いたchunkを追記表示する。
+        """
+        if message.sender_info.role == Role.user:
+            return
+
+        # 最初のchunkの前に、色と話者名を出力する。
+        if len(message.text) == len(chunk):
+            print(self.message_header(message), end="")
+        print(chunk, end="", flush=True)
+
+
+    def finish_partial_message(self, message: ChatMessage) -> None:
+        """
+        ストリーミングが終わったメッセージを確定する。
+        """
+        if message.sender_info.role == Role.user:
+            print()
+            return
+
+        # 何も届かなかったストリームにも、話者名だけは出力する。
+        if not message.text:
+            print(self.message_header(message), end="")
+        print(colorama.Style.RESET_ALL)
+        # 空行を入れる
+        print()
+
+
+    def message_header(self, message: ChatMessage) -> str:
+        """
+        メッセージの色と話者名を返す。
+        """
+        color: str = colorama.Fore.WHITE
         talker_mark = ""
 
         if message.sender_info.role == Role.assistant:
@@ -44,10 +83,7 @@ class CUI(UIBase):
         if message.sender_info.role == Role.assistant:
             talker_mark = "Bot: "
 
-        print(color + talker_mark + message.text + reset)
-
-        # 空行を入れる
-        print()
+        return color + talker_mark
 
     def process_event(self) -> None:
         pass
\ No newline at end of file
@@ -0,0 +1,71 @@
+from typing import Optional
+import array
+import hashlib
+import os
+import sqlite3
+import threading
+
+
+class EmbeddingCache:
+    """
+    テキストの埋め込みベクトルをSQLiteに保存するキャッシュ。
+    キーはモデル名とテキストのハッシュなので、同じテキストを二度ベクトル化しない。
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # SemanticCacheからは、イベントループの外の複数のスレッドで同時に使われる。
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: list[str]) -> list[Optional[list[float]]]:
+        """
+        textsそれぞれのベクトルを返す。キャッシュに無いものはNoneになる。
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        found: dict[str, list[float]] = {}
+        with self.lock:
+            # SQLiteの変数上限を超えないよう、分けて問い合わせる。
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array.array("f", blob).tolist()
+
+            vectors = [found.get(key) for key in keys]
+            hit_count = sum(vector is not None for vector in vectors)
+            self.hits += hit_count
+            self.misses += len(vectors) - hit_count
+        return vectors
+
+    def set_many(self, model: str, texts: list[str], vectors: list[list[float]]) -> None:
+        """
+        textsとそのベクトルを記録する。
+        """
+        rows = [
+            (self.make_key(model, text), array.array("f", vector).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
@@ -1,31 +1,144 @@
 import os
+import time
+
+
+class FileIndex:
+    """
+    ディレクトリ以下のファイル名とパスの索引。
+    各ディレクトリの更新日時を覚えておき、検索するディレクトリ以下のどれかが変わっていたら作り直す。
+    """
+
+    # rootの直下で、実行中に書き込まれ続けるディレクトリと.git。索引に含めないので、更新されても作り直さない。
+    # 深い階層にある同じ名前のディレクトリは、os.walkと同じく辿る。
+    IGNORED_DIRS = {".git", "cache", "checkpoint", "memory", "log", "telemetry"}
+    # 同じディレクトリの更新日時を確かめる最短の間隔(秒)。
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.dir_mtimes: dict[str, int] = {}
+        # ディレクトリから、最後に更新日時を確かめた時刻。
+        self.checked_at: dict[str, float] = {}
+        # ファイル名から、os.walkと同じ順で見つかるパスのリスト。
+        self.paths_by_name: dict[str, list[str]] = {}
+        # ディレクトリから、その直下のファイル名のリスト。
+        self.files_by_dir: dict[str, list[str]] = {}
+        self.build()
+
+    def build(self) -> None:
+        """
+        rootを走査して索引を作る。rootの直下のIGNORED_DIRSは辿らない。
+        """
+        self.dir_mtimes = {}
+        self.checked_at = {}
+        self.paths_by_name = {}
+        self.files_by_dir = {}
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                self.dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+
+            files = []
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir():
+                    if directory != self.root or entry.name not in self.IGNORED_DIRS:
+                        subdirs.append(entry.path)
+                elif entry.is_file():
+                    files.append(entry.name)
+                    self.paths_by_name.setdefault(entry.name, []).append(entry.path)
+            self.files_by_dir[directory] = files
+            # os.walkと同じく、先に見つかったサブディレクトリから辿る。
+            stack.extend(reversed(subdirs))
+
+    def covers(self, directory: str) -> bool:
+        """
+        directoryが、索引に含まれないIGNORED_DIRSの外にあればTrueを返す。
+        """
+        relative = os.path.relpath(directory, self.root)
+        return relative.split(os.sep)[0] not in self.IGNORED_DIRS
+
+    def is_stale(self, directory: str) -> bool:
+        """
+        directoryか、その下のどれかのディレクトリが更新・削除されていればTrueを返す。
+        """
+        prefix = os.path.join(directory, "")
+        for path, mtime in self.dir_mtimes.items():
+            if path != directory and not path.startswith(prefix):
+                continue
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def refresh(self, directory: str, force: bool = False) -> None:
+        """
+        directory以下が古くなっていれば作り直す。forceでなければ、CHECK_INTERVALに1回だけ確かめる。
+        """
+        now = time.monotonic()
+        if not force and now - self.checked_at.get(directory, -self.CHECK_INTERVAL) < self.CHECK_INTERVAL:
+            return
+        if self.is_stale(directory):
+            self.build()
+        self.checked_at[directory] = now
+
 
 class FileReader:
     """
     ファイルを読み込むクラス。
     """
 
-    def find_file_list(self, search_dir: str) -> list[str]:
+    # 索引と内容のキャッシュは、全てのFileReaderで共有する。
+    _indexes: dict[str, FileIndex] = {}
+    # パスから、(更新日時, サイズ, 内容)。
+    _contents: dict[str, tuple[int, int, str]] = {}
+
+    def __init__(self, root: str = "") -> None:
+        # 既定では、モジュールファイルの親ディレクトリ
+        self.repo_path = root or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def get_index(self, search_dir: str, force: bool = False) -> FileIndex:
         """
-        指定したディレクトリ内のファイル名のリストを返す。
+        repo_pathの索引を返す。search_dir以下が古くなっていれば作り直す。
         """
-        # モジュールファイルの親ディレクトリ
-        repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        index = self._indexes.get(self.repo_path)
+        if index is None:
+            index = FileIndex(self.repo_path)
+            self._indexes[self.repo_path] = index
+        else:
+            index.refresh(search_dir, force)
+        return index
 
+    def resolve_dir(self, search_dir: str) -> str:
         # 検索対象のディレクトリを決定する
         if not search_dir:
-            search_dir = repo_path
-        else:
-            search_dir = os.path.join(repo_path, search_dir)
+            return self.repo_path
+        return os.path.normpath(os.path.join(self.repo_path, search_dir))
+
+    def find_file_list(self, search_dir: str) -> list[str]:
+        """
+        指定したディレクトリ内のファイル名のリストを返す。
+        """
+        search_dir = self.resolve_dir(search_dir)
 
         # 指定したディレクトリ直下に存在するファイル名のリストを取得する
         # サブディレクトリ以下や.DS_Storeなどの隠しファイルは除く
-        file_list = []
-        for file in os.listdir(search_dir):
-            if not file.startswith('.') and os.path.isfile(os.path.join(search_dir, file)):
-                file_list.append(file)
-        
-        return file_list
+        index = self.get_index(search_dir)
+        if not index.covers(search_dir):
+            # 索引に含まれないディレクトリは、直接探す。
+            return [file for file in os.listdir(search_dir) if not file.startswith('.') and os.path.isfile(os.path.join(search_dir, file))]
+        if search_dir not in index.files_by_dir:
+            # 確かめる間隔の間に作られたディレクトリかもしれないので、作り直してから探す。
+            index = self.get_index(search_dir, True)
+        if search_dir not in index.files_by_dir:
+            raise FileNotFoundError(f"{search_dir}が見つかりませんでした。")
+        return [file for file in index.files_by_dir[search_dir] if not file.startswith('.')]
 
 
     def find_file_path(self, file_name: str, search_dir: str = "") -> str:
@@ -33,19 +146,22 @@ class FileReader:
         指定したディレクトリ内で、指定したファイル名を持つファイルのパスを返す。
         該当するファイルがない場合は、空文字列を返す。
         """
-        # モジュールファイルの親ディレクトリ
-        repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        search_dir = self.resolve_dir(search_dir)
+        prefix = os.path.join(search_dir, "")
 
-        # 検索対象のディレクトリを決定する
-        if not search_dir:
-            search_dir = repo_path
-        else:
-            search_dir = os.path.join(repo_path, search_dir)
+        if not self.get_index(search_dir).covers(search_dir):
+            # 索引に含まれないディレクトリは、直接探す。
+            for root, dirs, files in os.walk(search_dir):
+                if file_name in files:
+                    return os.path.join(root, file_name)
+            raise FileNotFoundError(f"{file_name}が見つかりませんでした。")
 
-        # 指定されたディレクトリ内でファイルを探索する
-        for root, dirs, files in os.walk(search_dir):
-            if file_name in files:
-                return os.path.join(root, file_name)
+        # 索引から、指定されたディレクトリ内で最初に見つかるパスを返す
+        # 見つからなければ、確かめる間隔の間に作られたファイルかもしれないので、作り直してからもう一度探す
+        for force in (False, True):
+            for path in self.get_index(search_dir, force).paths_by_name.get(file_name, []):
+                if path.startswith(prefix):
+                    return path
         raise FileNotFoundError(f"{file_name}が見つかりませんでした。")
 
 
@@ -62,6 +178,14 @@ class FileReader:
         if not file_path:
             return ""
 
+        # 更新日時とサイズが変わっていなければ、前回読んだ内容を返す
+        stat = os.stat(file_path)
+        cached = self._contents.get(file_path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
         # 該当するファイルがあった場合は、UTF-8エンコードでファイルを開いて中身を返す
         with open(file_path, "r", encoding="utf-8") as file:
-            return file.read()
+            content = file.read()
+        self._contents[file_path] = (stat.st_mtime_ns, stat.st_size, content)
+        return content
@@ -2,6 +2,7 @@ from .ui_base import UIBase
 from .chat_message import ChatMessage
 from .talker import Talker
 from .role import Role
+from .message_list_view import MessageListView
 from PyQt6.QtGui import QTextCharFormat, QColor
 from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QTextEdit, QLineEdit, QWidget, QSizePolicy
 from PyQt6.QtGui import QTextOption, QTextBlockFormat, QTextCursor, QKeyEvent
@@ -9,6 +10,7 @@ from PyQt6.QtCore import Qt, QObject, pyqtSignal, QEventLoop, QEvent
 from typing import Optional, Callable
 import sys
 import asyncio
+import os
 
 class InputArea(QTextEdit):
     def __init__(self, user_input_queue: asyncio.Queue[str], parent: Optional[QWidget] = None) -> None:
@@ -65,8 +67,9 @@ class GUI(UIBase):
         self.main_window.setCentralWidget(central_widget)
 
         # メッセージ欄の設定
-        self.message_area = QTextEdit(central_widget)
-        self.message_area.setReadOnly(True)
+        # 見えている行だけを描画し、GUI_SCROLLBACKを超えた古いメッセージは捨てる。
+        scrollback = int(os.getenv("GUI_SCROLLBACK", "5000"))
+        self.message_area = MessageListView(scrollback, central_widget)
         layout.addWidget(self.message_area)
 
         # 入力欄の設定
@@ -87,34 +90,34 @@ class GUI(UIBase):
 
 
     def print_message(self, message: ChatMessage) -> None:
-        # カーソルを末尾へ移動する。
-        cursor = self.message_area.textCursor()
-        cursor.movePosition(QTextCursor.MoveOperation.End)
-        self.message_area.setTextCursor(cursor)
+        self.message_area.append_message(self.message_name(message), message.text, self.message_color(message))
+
+    def print_partial_message(self, message: ChatMessage, chunk: str) -> None:
+        # 最初のchunkで行を追加し、以降はその行を差し替える。
+        if len(message.text) == len(chunk):
+            self.print_message(message)
+        else:
+            self.message_area.update_last_message(message.text)
 
+    def finish_partial_message(self, message: ChatMessage) -> None:
+        if not message.text:
+            self.print_message(message)
+
+    def message_color(self, message: ChatMessage) -> QColor:
         if message.sender_info.role == Role.assistant:
-            color = QColor("yellow")
+            return QColor("yellow")
         elif message.sender_info.role == Role.system:
-            color = QColor("cyan")
+            return QColor("cyan")
         else :
-            color = QApplication.palette().text().color()
-
-        # Set name color
-        char_format = QTextCharFormat()
-        char_format.setForeground(color)
-        self.message_area.setCurrentCharFormat(char_format)
+            return QApplication.palette().text().color()
 
-        # Insert name
+    def message_name(self, message: ChatMessage) -> str:
         if message.sender_info.role == Role.user:
-            name = "You: "
+            return "You: "
         elif message.sender_info.role == Role.assistant:
-            name = message.sender_info.display_name + ": "
+            return message.sender_info.display_name + ": "
         else:
-            name = ""
-        self.message_area.insertPlainText(name)
-
-        # Insert message text
-        self.message_area.insertPlainText(message.text + "\n\n")
+            return ""
 
     def enable_user_input(self) -> None:
         self.input_area.setEnabled(True)
@@ -1,6 +1,9 @@
+from .embedding_cache import EmbeddingCache
+from .api_scheduler import ApiScheduler, Priority
+from .token_counter import count_tokens
+from .telemetry import Telemetry
+from typing import Any, Optional
 import os
-import openai
-import pinecone
 
 
 class TryEmptyInput(Exception):
@@ -18,12 +21,41 @@ class TryEmptyInput(Exception):
 
 class Hippocampus:
     """
-    Pineconeと連携し、AIの海馬として振る舞う。
+    Pinecone、またはローカルのベクトルインデックスと連携し、AIの海馬として振る舞う。
     自然言語をVector化し記憶する。
     自然言語で記憶を検索し、候補数分のIDを返す。
     """
 
-    def __init__(self) -> None:
+    EMBEDDING_MODEL = "text-embedding-ada-002"
+    # 1回の埋め込みリクエストに含めるテキストの最大数。
+    EMBEDDING_BATCH_SIZE = 2048
+    # 1回のupsertに含めるベクトルの最大数。
+    UPSERT_BATCH_SIZE = 100
+
+    def __init__(self, priority: Priority = Priority.normal) -> None:
+        # 全てのAPI呼び出しは、プロセス共通のスケジューラをこのpriorityで通す。
+        self.scheduler = ApiScheduler.shared()
+        self.priority = priority
+        self.telemetry = Telemetry.shared()
+
+        # 埋め込みベクトルのキャッシュ。EMBEDDING_CACHEがoffなら使わない。
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if os.getenv("EMBEDDING_CACHE", "on") != "off":
+            self.embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3"))
+
+        # VECTOR_BACKENDがlocalなら、Pineconeの代わりにローカルのインデックスを使う。
+        backend = os.getenv("VECTOR_BACKEND", "pinecone")
+        dimension = 1536
+        self.index: Any
+        if backend == "local":
+            from .local_vector_index import LocalVectorIndex
+
+            directory = os.getenv("LOCAL_VECTOR_DIR", "memory")
+            self.index = LocalVectorIndex(directory, dimension)
+            return
+
+        import pinecone
+
         # Pineconeの設定を.envから読み込む。
         PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
         PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "")
@@ -36,7 +68,6 @@ class Hippocampus:
                       environment=PINECONE_ENVIRONMENT)
 
         TABLE_NAME = os.getenv("TABLE_NAME", "play_with_gpt")
-        dimension = 1536
         metric = "cosine"
         pod_type = "p1"
         if TABLE_NAME not in pinecone.list_indexes():
@@ -56,16 +87,61 @@ class Hippocampus:
             list[float]: ベクトル化された自然言語
         """
         
-        if not text:
+        return self.text_to_vectors([text])[0]
+
+    def text_to_vectors(self, texts: list[str]) -> list[list[float]]:
+        """
+        複数の自然言語テキストを、まとめてadaによってベクトル化する。
+        キャッシュ済みのテキストは再度ベクトル化しない。
+
+        Args:
+            texts (list[str]): 自然言語のリスト
+
+        Returns:
+            list[list[float]]: textsと同じ順のベクトルのリスト
+        """
+
+        if any(not text for text in texts):
             raise TryEmptyInput("Input is empty.")
 
-        # text = text.replace("\n", " ")
-        response = openai.Embedding.create(  # type: ignore[no-untyped-call]
-            input=[text],
-            model="text-embedding-ada-002"
-        )
-        result: list[float] = response["data"][0]["embedding"]
-        return result
+        vectors: list[Optional[list[float]]]
+        if self.embedding_cache:
+            vectors = self.embedding_cache.get_many(self.EMBEDDING_MODEL, texts)
+        else:
+            vectors = [None] * len(texts)
+
+        import openai
+
+        # キャッシュに無いテキストだけを、重複を除いて問い合わせる。
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if not missing:
+            with self.telemetry.call("embedding", self.EMBEDDING_MODEL) as record:
+                record.cache_hit = True
+        embedded: dict[str, list[float]] = {}
+        for i in range(0, len(missing), self.EMBEDDING_BATCH_SIZE):
+            batch = missing[i:i + self.EMBEDDING_BATCH_SIZE]
+            tokens = sum(count_tokens(text) for text in batch)
+            with self.telemetry.call("embedding", self.EMBEDDING_MODEL) as record:
+                response = self.scheduler.run_sync(
+                    lambda: openai.Embedding.create(  # type: ignore[no-untyped-call]
+                        input=batch,
+                        model=self.EMBEDDING_MODEL
+                    ),
+                    tokens,
+                    self.priority,
+                    record.add_retry,
+                )
+                usage = response.get("usage") if hasattr(response, "get") else None
+                record.set_usage(usage["prompt_tokens"] if usage else tokens, 0)
+            # レスポンスはindexで入力と対応付ける。
+            batch_vectors: list[list[float]] = [[] for _ in batch]
+            for item in response["data"]:
+                batch_vectors[item["index"]] = item["embedding"]
+            embedded.update(zip(batch, batch_vectors))
+            if self.embedding_cache:
+                self.embedding_cache.set_many(self.EMBEDDING_MODEL, batch, batch_vectors)
+
+        return [vector if vector is not None else embedded[text] for text, vector in zip(texts, vectors)]
 
     def input_memory(self, id: str, input: str, namespace: str = "") -> None:
         """
@@ -89,6 +165,26 @@ class Hippocampus:
 
         self.index.upsert(vectors, namespace)
 
+    def input_memories(self, memories: list[tuple[str, str]], namespace: str = "") -> None:
+        """
+        複数の記憶を、まとめてベクトル化して記憶する。
+
+        Args:
+            memories (list[tuple[str, str]]): 記憶のidと、記憶する自然言語の組のリスト
+            namespace (str): 記憶のnamespace
+        """
+        vectors = self.text_to_vectors([input for _, input in memories])
+        records = [
+            {
+                "id": id,
+                "values": vector
+            }
+            for (id, _), vector in zip(memories, vectors)
+        ]
+
+        for i in range(0, len(records), self.UPSERT_BATCH_SIZE):
+            self.index.upsert(records[i:i + self.UPSERT_BATCH_SIZE], namespace)
+
     def delete_memory(self, id: str, namespace: str ="") -> None:
         """
         記憶を削除する。
@@ -125,3 +221,23 @@ class Hippocampus:
         # memoryから、idだけのリストを抽出する。
         memory_ids: list[str] = [item.id for item in memory.matches]
         return memory_ids
+
+    def query_scored_memories(self, queries: list[str], top_k: int = 1, namespace: str = "") -> list[list[tuple[str, float]]]:
+        """
+        複数の検索クエリを、まとめてベクトル化して検索し、クエリごとに候補数分のIDとコサイン類似度を返す。
+
+        Args:
+            queries (list[str]): 検索クエリのリスト
+            top_k (int): 検索結果の上位何件を返すか
+            namespace (str): 検索対象のnamespace
+
+        Returns:
+            list[list[tuple[str, float]]]: queriesと同じ順の、IDと類似度の組のリスト
+        """
+
+        vectors = self.text_to_vectors(queries)
+        results: list[list[tuple[str, float]]] = []
+        for vector in vectors:
+            memory = self.index.query(vector=vector, top_k=top_k, namespace=namespace)
+            results.append([(item.id, item.score) for item in memory.matches])
+        return results
@@ -1,22 +1,32 @@
 import os
-from gettext import translation
+from gettext import NullTranslations, translation
 import locale
-
-# Specifies the language to be used. The language is taken from the environment variable and defaults to 'en'.
-language, country = locale.getdefaultlocale()
-if language is None:
-    language = "en"
-print(language)
+from typing import Optional
 
 # Sets the path to the directory where the locale files are stored.
 locales_path = os.path.join(os.getcwd(), 'locales')
 
-# Create a translation object.
-trans = translation(language, localedir=locales_path, languages=[language], fallback=False)
-# Check if the translation object loaded the translation file successfully.
-if trans is None:
-    print("Translation file could not be loaded!")
-else:
-    # Import the gettext function (_function) from the translation object.
-    _ = trans.gettext
-    print(locales_path)
+# The translation object is loaded when the first message is translated.
+trans: Optional[NullTranslations] = None
+
+
+def load_translation() -> NullTranslations:
+    """
+    Load the translation for the current locale.
+    """
+    # Specifies the language to be used. The language is taken from the environment variable and defaults to 'en'.
+    language, country = locale.getdefaultlocale()
+    if language is None:
+        language = "en"
+    # Create a translation object.
+    return translation(language, localedir=locales_path, languages=[language], fallback=False)
+
+
+def _(message: str) -> str:
+    """
+    Translate message, loading the translation on first use.
+    """
+    global trans
+    if trans is None:
+        trans = load_translation()
+    return trans.gettext(message)
@@ -0,0 +1,162 @@
+from typing import Any, Optional
+from urllib.parse import quote
+import json
+import os
+import threading
+import numpy as np
+
+
+class Match:
+    """
+    検索結果の1件。pineconeのScoredVectorと同じくidとscoreを持つ。
+    """
+    def __init__(self, id: str, score: float) -> None:
+        self.id = id
+        self.score = score
+
+
+class QueryResponse:
+    """
+    検索結果。pineconeのQueryResponseと同じくmatchesを持つ。
+    """
+    def __init__(self, matches: list[Match]) -> None:
+        self.matches = matches
+
+
+class VectorNamespace:
+    """
+    1つのnamespaceのベクトルを、メモリマップしたNumPy行列としてディスクに保持する。
+    ベクトルは正規化して保存するので、内積がそのままコサイン類似度になる。
+    """
+
+    def __init__(self, directory: str, dimension: int) -> None:
+        self.directory = directory
+        self.dimension = dimension
+        self.matrix_path = os.path.join(directory, "vectors.npy")
+        self.ids_path = os.path.join(directory, "ids.json")
+        os.makedirs(directory, exist_ok=True)
+
+        self.ids: list[str] = []
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, "r", encoding="utf-8") as f:
+                self.ids = json.load(f)
+        self.rows = {id: row for row, id in enumerate(self.ids)}
+
+        if os.path.exists(self.matrix_path):
+            self.matrix: np.memmap[Any, Any] = np.load(self.matrix_path, mmap_mode="r+")
+        else:
+            self.matrix = self._allocate(16)
+
+    def _allocate(self, capacity: int) -> "np.memmap[Any, Any]":
+        matrix: np.memmap[Any, Any] = np.lib.format.open_memmap(
+            self.matrix_path, mode="w+", dtype=np.float32, shape=(capacity, self.dimension)
+        )
+        return matrix
+
+    def _grow(self, capacity: int) -> None:
+        """
+        行列の容量を増やす。既存の行は新しいファイルへ写す。
+        """
+        old_matrix = np.array(self.matrix[:len(self.ids)])
+        del self.matrix
+        self.matrix = self._allocate(capacity)
+        self.matrix[:len(old_matrix)] = old_matrix
+
+    def upsert(self, ids: list[str], values: np.ndarray[Any, Any]) -> None:
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values = values / np.where(norms == 0, 1, norms)
+
+        new_ids = [id for id in dict.fromkeys(ids) if id not in self.rows]
+        required = len(self.ids) + len(new_ids)
+        if required > len(self.matrix):
+            capacity = len(self.matrix)
+            while capacity < required:
+                capacity *= 2
+            self._grow(capacity)
+
+        for id in new_ids:
+            self.rows[id] = len(self.ids)
+            self.ids.append(id)
+        rows = [self.rows[id] for id in ids]
+        self.matrix[rows] = values
+        self.save()
+
+    def delete(self, ids: list[str]) -> None:
+        # 削除した行には末尾の行を移し、行列を詰めたまま保つ。
+        for id in ids:
+            row = self.rows.pop(id, None)
+            if row is None:
+                continue
+            last_row = len(self.ids) - 1
+            last_id = self.ids.pop()
+            if row != last_row:
+                self.matrix[row] = self.matrix[last_row]
+                self.ids[row] = last_id
+                self.rows[last_id] = row
+        self.save()
+
+    def delete_all(self) -> None:
+        self.ids = []
+        self.rows = {}
+        self.save()
+
+    def query(self, vector: np.ndarray[Any, Any], top_k: int) -> list[Match]:
+        count = len(self.ids)
+        if count == 0 or top_k <= 0:
+            return []
+
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        scores = self.matrix[:count] @ vector
+        k = min(top_k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [Match(self.ids[row], float(scores[row])) for row in top]
+
+    def save(self) -> None:
+        self.matrix.flush()
+        temp_path = self.ids_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.ids, f, ensure_ascii=False)
+        os.replace(temp_path, self.ids_path)
+
+
+class LocalVectorIndex:
+    """
+    pinecone.Indexと同じメソッドを持つ、プロセス内のベクトルインデックス。
+    namespaceごとにディレクトリを分けてディスクへ永続化する。
+    """
+
+    def __init__(self, directory: str, dimension: int = 1536) -> None:
+        self.directory = directory
+        self.dimension = dimension
+        self.namespaces: dict[str, VectorNamespace] = {}
+        # SemanticCacheから、複数のスレッドで同時に使われる。
+        self.lock = threading.Lock()
+
+    def _namespace(self, namespace: str) -> VectorNamespace:
+        if namespace not in self.namespaces:
+            name = quote(namespace, safe="") if namespace else "__default__"
+            self.namespaces[namespace] = VectorNamespace(os.path.join(self.directory, name), self.dimension)
+        return self.namespaces[namespace]
+
+    def upsert(self, vectors: list[dict[str, Any]], namespace: str = "") -> None:
+        if not vectors:
+            return
+        ids = [vector["id"] for vector in vectors]
+        values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        with self.lock:
+            self._namespace(namespace).upsert(ids, values)
+
+    def delete(self, ids: Optional[list[str]] = None, namespace: str = "", delete_all: bool = False) -> None:
+        with self.lock:
+            if delete_all:
+                self._namespace(namespace).delete_all()
+            elif ids:
+                self._namespace(namespace).delete(ids)
+
+    def query(self, vector: list[float], top_k: int = 1, namespace: str = "") -> QueryResponse:
+        values = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            return QueryResponse(self._namespace(namespace).query(values, top_k))
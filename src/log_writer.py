@@ -0,0 +1,140 @@
+from typing import Any, Optional
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+
+class JsonlLogWriter:
+    """
+    ログを1行1件のJSONLとして追記するクラス。
+    書き込みはバックグラウンドのスレッドで行い、一定の量か時間が溜まったらまとめてファイルへ書き出す。
+    ファイルがmax_bytesを超えたら次のファイルへ切り替え、必要なら古いファイルをgzipで圧縮する。
+    """
+
+    def __init__(self, base_path: str, max_bytes: int = 10 * 1024 * 1024, flush_bytes: int = 64 * 1024, flush_interval: float = 1.0, compress: bool = False) -> None:
+        self.base_path = base_path
+        self.max_bytes = max_bytes
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.compress = compress
+        # これまでに書き出したファイルのパス。切り替え後は圧縮後のパスになる。
+        self.paths: list[str] = []
+
+        directory = os.path.dirname(base_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._queue: queue.Queue[Optional[str]] = queue.Queue()
+        self._flushed = threading.Condition()
+        self._written = 0
+        self._enqueued = 0
+        self._file_index = 0
+        self._file = self._open_file()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="JsonlLogWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, record: dict[str, Any]) -> None:
+        """
+        recordを1行として書き出すよう予約する。
+        閉じた後に届いた記録は捨てる。UIのコールバックから遅れて届くことがあるため。
+        """
+        if self._closed:
+            return
+        self._enqueued += 1
+        self._queue.put(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        """
+        予約済みの行が全てファイルへ書き出されるまで待つ。
+        """
+        target = self._enqueued
+        self._queue.put("")
+        with self._flushed:
+            self._flushed.wait_for(lambda: self._written >= target or not self._thread.is_alive())
+
+    def close(self) -> None:
+        """
+        残りの行を書き出してファイルを閉じる。
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _current_path(self) -> str:
+        if self._file_index == 0:
+            return self.base_path
+        root, ext = os.path.splitext(self.base_path)
+        return f"{root}.{self._file_index}{ext}"
+
+    def _open_file(self) -> Any:
+        path = self._current_path()
+        self.paths.append(path)
+        return open(path, "a", encoding="utf-8")
+
+    def _rotate(self) -> None:
+        self._file.close()
+        if self.compress:
+            path = self.paths[-1]
+            with open(path, "rb") as source, gzip.open(path + ".gz", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.remove(path)
+            self.paths[-1] = path + ".gz"
+        self._file_index += 1
+        self._file = self._open_file()
+
+    def _write_lines(self, lines: list[str], count: int) -> None:
+        if lines:
+            self._file.write("".join(lines))
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+        with self._flushed:
+            self._written += count
+            self._flushed.notify_all()
+
+    def _run(self) -> None:
+        lines: list[str] = []
+        size = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                line = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                line = ""
+
+            if line:
+                lines.append(line)
+                size += len(line)
+            # 空文字列は即時の書き出し要求、Noneは終了要求。
+            if line is None or not line or size >= self.flush_bytes or time.monotonic() >= deadline:
+                self._write_lines(lines, len(lines))
+                lines = []
+                size = 0
+                deadline = time.monotonic() + self.flush_interval
+            if line is None:
+                self._file.close()
+                return
+
+
+def convert_jsonl_to_json(paths: list[str], json_path: str) -> None:
+    """
+    JSONLのログファイル(gzip圧縮を含む)を、1つのJSON配列のファイルに変換する。
+    """
+    records: list[dict[str, Any]] = []
+    for path in paths:
+        opener: Any = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, indent=4, ensure_ascii=False)
@@ -2,9 +2,11 @@ from .ui_base import UIBase
 from .chat_message import ChatMessage
 from .talker import Talker
 from .role import Role
-import json
+from .sender import Sender
+from .log_writer import JsonlLogWriter, convert_jsonl_to_json
 from datetime import datetime
-from typing import List, Dict
+from typing import AsyncIterator, Optional
+import os
 
 
 
@@ -14,7 +16,8 @@ class MessageCarrier:
     """
     def __init__(self, ui: UIBase):
         self.ui = ui
-        self.logData: List[Dict[str, str]] = []
+        # ログは記録した順にJSONLファイルへ追記する。ファイルは最初の記録時に開く。
+        self.log_writer: Optional[JsonlLogWriter] = None
         self.system = Talker(role=Role.system, persona_name="system", display_name="System")
         self.user = Talker(role=Role.user, persona_name="user", display_name="User")
 
@@ -28,6 +31,21 @@ class MessageCarrier:
             self.write_to_log(message)
 
     
+    async def print_stream(self, chunks: AsyncIterator[str], sender_info: Sender, should_log: bool) -> str:
+        """
+        届いたchunkから順にUIへ伝達する。ログには完成したメッセージを一度だけ記録する。
+        完成したテキストを返す。
+        """
+        message = ChatMessage("", sender_info, should_log)
+        async for chunk in chunks:
+            message.text += chunk
+            self.ui.print_partial_message(message, chunk)
+        self.ui.finish_partial_message(message)
+        if message.should_log:
+            self.write_to_log(message)
+        return message.text
+
+
     def print_message_as_system(self, text: str, should_log: bool) -> None:
         """
         テキストをシステムメッセージとして表示する。
@@ -54,26 +72,43 @@ class MessageCarrier:
         formatted_prompt = {"sender": message.sender_info.display_name,
                             "content": message.text,
                             "datetime": now}
-        # logDataに追加
-        self.logData.append(formatted_prompt)
+        self.get_log_writer().write(formatted_prompt)
+
+
+    def get_log_writer(self) -> JsonlLogWriter:
+        """
+        ログの書き出し先を返す。無ければ、起動日時を名前にしたファイルを開く。
+        """
+        if self.log_writer is None:
+            now = datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.log_writer = JsonlLogWriter(
+                os.path.join("log", now + ".jsonl"),
+                max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+                flush_bytes=int(os.getenv("LOG_FLUSH_BYTES", str(64 * 1024))),
+                flush_interval=float(os.getenv("LOG_FLUSH_INTERVAL", "1.0")),
+                compress=os.getenv("LOG_COMPRESS", "off") == "on",
+            )
+        return self.log_writer
+
+
+    def close_log(self) -> None:
+        """
+        残りのログを書き出してファイルを閉じる。
+        """
+        if self.log_writer:
+            self.log_writer.close()
 
 
     def save_log_as_json(self) -> None:
         """
-        これまでに記録したログデータをjson形式で保存する
+        これまでに記録したJSONLのログを、json形式のファイルに変換して保存する
         """
 
         # ログが空なら、何もしない
-        if not self.logData:
+        if self.log_writer is None:
             return
 
-        # ファイル名を取得
-        now = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = "log/" + now + ".json"
-
-        # ログデータをjson形式で保存
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(self.logData, f, indent=4, ensure_ascii=False)
-        
-        # ログデータを初期化
-        self.logData.clear()
\ No newline at end of file
+        # 記録済みのログを全て書き出してから変換する
+        self.log_writer.flush()
+        root, _ = os.path.splitext(self.log_writer.base_path)
+        convert_jsonl_to_json(self.log_writer.paths, root + ".json")
@@ -0,0 +1,181 @@
+from PyQt6.QtGui import QColor, QPainter
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QStyleOptionViewItem, QWidget, QAbstractItemView
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QPersistentModelIndex, QRect, QSize, QTimer
+from typing import Any, Optional, Union
+
+
+class MessageRow:
+    """
+    メッセージ一覧の1行。折り返し後の高さを幅ごとにキャッシュする。
+    """
+    def __init__(self, name: str, text: str, color: QColor) -> None:
+        self.name = name
+        self.text = text
+        self.color = color
+        self.cached_width = -1
+        self.cached_height = 0
+
+    @property
+    def display_text(self) -> str:
+        return self.name + self.text
+
+    def invalidate(self) -> None:
+        self.cached_width = -1
+
+
+class MessageListModel(QAbstractListModel):
+    """
+    メッセージ一覧のモデル。scrollbackを超えた古い行は捨てる。
+    """
+    def __init__(self, scrollback: int, parent: Optional[QWidget] = None) -> None:
+        super().__init__(parent)
+        self.scrollback = scrollback
+        self.rows: list[MessageRow] = []
+
+    def rowCount(self, parent: Union[QModelIndex, QPersistentModelIndex] = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index: Union[QModelIndex, QPersistentModelIndex], role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return row.display_text
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return row.color
+        return None
+
+    def append_rows(self, rows: list[MessageRow]) -> None:
+        """
+        複数の行をまとめて末尾に追加する。
+        """
+        if not rows:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+        self.trim()
+
+    def update_last_row(self, text: str) -> None:
+        """
+        最後の行のテキストを差し替える。
+        """
+        if not self.rows:
+            return
+        row = self.rows[-1]
+        row.text = text
+        row.invalidate()
+        index = self.index(len(self.rows) - 1)
+        self.dataChanged.emit(index, index)
+
+    def trim(self) -> None:
+        overflow = len(self.rows) - self.scrollback
+        if overflow <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+        del self.rows[:overflow]
+        self.endRemoveRows()
+
+
+class MessageDelegate(QStyledItemDelegate):
+    """
+    メッセージを折り返して描画する。高さは行ごとにキャッシュするので、見える行だけが計算される。
+    """
+    MARGIN = 6
+
+    def __init__(self, model: MessageListModel, parent: Optional[QWidget] = None) -> None:
+        super().__init__(parent)
+        self.model = model
+
+    def text_rect(self, rect: QRect) -> QRect:
+        return rect.adjusted(self.MARGIN, self.MARGIN // 2, -self.MARGIN, -self.MARGIN // 2)
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: Union[QModelIndex, QPersistentModelIndex]) -> QSize:
+        row = self.model.rows[index.row()]
+        width = max(1, option.rect.width() - self.MARGIN * 2)
+        if row.cached_width != width:
+            bounding = option.fontMetrics.boundingRect(
+                QRect(0, 0, width, 1_000_000), Qt.TextFlag.TextWordWrap, row.display_text
+            )
+            row.cached_width = width
+            row.cached_height = bounding.height() + self.MARGIN * 2
+        return QSize(option.rect.width(), row.cached_height)
+
+    def paint(self, painter: Optional[QPainter], option: QStyleOptionViewItem, index: Union[QModelIndex, QPersistentModelIndex]) -> None:
+        if painter is None:
+            return
+        row = self.model.rows[index.row()]
+        painter.save()
+        painter.setPen(row.color)
+        painter.drawText(self.text_rect(option.rect), Qt.TextFlag.TextWordWrap, row.display_text)
+        painter.restore()
+
+
+class MessageListView(QListView):
+    """
+    メッセージを仮想化して表示するリスト。
+    短時間に届いた追加や更新は、1フレームに1回だけまとめて反映する。
+    """
+    FRAME_INTERVAL_MS = 16
+
+    def __init__(self, scrollback: int, parent: Optional[QWidget] = None) -> None:
+        super().__init__(parent)
+        self.message_model = MessageListModel(scrollback, self)
+        self.setModel(self.message_model)
+        self.setItemDelegate(MessageDelegate(self.message_model, self))
+        self.setWordWrap(True)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+        self.pending_rows: list[MessageRow] = []
+        self.pending_last_text: Optional[str] = None
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.FRAME_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def append_message(self, name: str, text: str, color: QColor) -> None:
+        """
+        メッセージの追加を予約する。
+        """
+        self.flush_pending_last_text()
+        self.pending_rows.append(MessageRow(name, text, color))
+        self.schedule_flush()
+
+    def update_last_message(self, text: str) -> None:
+        """
+        最後のメッセージのテキストの差し替えを予約する。ストリーミング中の追記に使う。
+        """
+        if self.pending_rows:
+            self.pending_rows[-1].text = text
+        else:
+            self.pending_last_text = text
+        self.schedule_flush()
+
+    def flush_pending_last_text(self) -> None:
+        if self.pending_last_text is not None:
+            self.message_model.update_last_row(self.pending_last_text)
+            self.pending_last_text = None
+
+    def schedule_flush(self) -> None:
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self) -> None:
+        """
+        予約された追加と更新をまとめてモデルへ反映する。
+        """
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar is None or scrollbar.value() >= scrollbar.maximum()
+
+        self.flush_pending_last_text()
+        rows = self.pending_rows
+        self.pending_rows = []
+        self.message_model.append_rows(rows)
+
+        if at_bottom:
+            self.scrollToBottom()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+from enum import IntEnum
+from typing import Optional
+import os
+
+
+class ModelTier(IntEnum):
+    """
+    Tiers of models, from the fastest and cheapest to the strongest.
+    """
+    fast = 0
+    standard = 1
+    strong = 2
+
+
+class ModelRouter:
+    """
+    Chooses the model of each call type, and the stronger tiers to escalate to
+    when the answer of a cheaper tier cannot be used.
+    """
+
+    # Tier of each call type unless MODEL_ROUTES overrides it.
+    DEFAULT_ROUTES = {
+        "feasibility": ModelTier.fast,
+        "infeasible_reason": ModelTier.fast,
+        "classify": ModelTier.fast,
+        "classify_batch": ModelTier.fast,
+        "summary": ModelTier.fast,
+        "split": ModelTier.standard,
+        "subdivide": ModelTier.standard,
+        "generate": ModelTier.strong,
+    }
+
+    _shared: Optional[ModelRouter] = None
+
+    def __init__(self, models: dict[ModelTier, str], routes: Optional[dict[str, ModelTier]] = None, default_tier: ModelTier = ModelTier.standard) -> None:
+        self.models = models
+        self.routes = {**self.DEFAULT_ROUTES, **(routes or {})}
+        self.default_tier = default_tier
+        # Number of escalations per call type.
+        self.escalations: dict[str, int] = {}
+
+    @classmethod
+    def shared(cls) -> ModelRouter:
+        """
+        Return the router shared by the whole process, configured from the environment.
+        MODEL_ROUTES is a comma separated list of call_type=tier, e.g. "subdivide=strong,classify=standard".
+        """
+        if cls._shared is None:
+            models = {
+                ModelTier.fast: os.getenv("MODEL_FAST", "gpt-3.5-turbo"),
+                ModelTier.standard: os.getenv("MODEL_STANDARD", "gpt-3.5-turbo"),
+                ModelTier.strong: os.getenv("MODEL_STRONG", "gpt-4"),
+            }
+            routes = {}
+            for route in os.getenv("MODEL_ROUTES", "").split(","):
+                if not route.strip():
+                    continue
+                call_type, tier = route.split("=")
+                routes[call_type.strip()] = ModelTier[tier.strip()]
+            cls._shared = cls(models, routes)
+        return cls._shared
+
+    def tier_for(self, call_type: str) -> ModelTier:
+        return self.routes.get(call_type, self.default_tier)
+
+    def model_for(self, call_type: str) -> str:
+        return self.models[self.tier_for(call_type)]
+
+    def escalation_path(self, call_type: str) -> list[tuple[ModelTier, str]]:
+        """
+        The tier of call_type followed by every stronger tier, skipping tiers whose model was already tried.
+        """
+        path: list[tuple[ModelTier, str]] = []
+        for tier in ModelTier:
+            if tier < self.tier_for(call_type):
+                continue
+            model = self.models[tier]
+            if all(model != tried for _, tried in path):
+                path.append((tier, model))
+        return path
+
+    def record_escalation(self, call_type: str) -> None:
+        self.escalations[call_type] = self.escalations.get(call_type, 0) + 1
@@ -1,13 +1,194 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable, Optional
+import asyncio
+import os
+import signal
 import subprocess
+import sys
+import time
+
+if TYPE_CHECKING:
+    from .warm_interpreter_pool import WarmInterpreterPool
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore[assignment]
+
+
+class RunResult:
+    """
+    モジュールの実行結果。
+    """
+    def __init__(self, module_name: str, exit_code: Optional[int], duration: float, peak_rss: int, stdout: str, stderr: str, timed_out: bool) -> None:
+        self.module_name = module_name
+        # タイムアウトで止めた場合など、終了コードが得られなければNone。
+        self.exit_code = exit_code
+        self.duration = duration
+        # 最大常駐メモリ(バイト)。測れなかった場合は0。
+        self.peak_rss = peak_rss
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+
+    @property
+    def succeeded(self) -> bool:
+        return self.exit_code == 0 and not self.timed_out
 
 
 class ModuleRunner:
     """
     指定したモジュールを実行するクラス。
     """
+    # 実行中のメモリ使用量と終了を調べる間隔(秒)。
+    RSS_SAMPLE_INTERVAL = 0.05
+    # パイプを読む単位(バイト)。行の長さには上限を設けない。
+    READ_CHUNK_SIZE = 65536
+    # モジュールの終了後、残った子孫プロセスがパイプを閉じるのを待つ時間(秒)。
+    PIPE_GRACE_PERIOD = 0.5
+
+    def __init__(self, max_concurrency: int = 4, timeout: Optional[float] = 60.0, memory_limit: Optional[int] = None, cpu_limit: Optional[int] = None, warm_pool: Optional[WarmInterpreterPool] = None) -> None:
+        self.timeout = timeout
+        # 指定されていれば、温まった親インタプリタからforkして実行する。
+        self.warm_pool = warm_pool
+        # メモリ(バイト)とCPU時間(秒)の上限。POSIXでのみ有効。
+        self.memory_limit = memory_limit
+        self.cpu_limit = cpu_limit
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
     def run_module(self, module_name: str, directory: str) -> None:
         """
         指定したモジュールを実行する。
         """
         subprocess.run(["python", "-m", module_name], cwd=directory)
 
+    async def arun_modules(self, module_names: list[str], directory: str, on_output: Optional[Callable[[str, str, str], None]] = None) -> list[RunResult]:
+        """
+        複数のモジュールを、max_concurrencyまで同時に実行する。module_namesと同じ順で結果を返す。
+        """
+        return list(await asyncio.gather(*(self.arun_module(module_name, directory, on_output) for module_name in module_names)))
+
+    async def arun_module(self, module_name: str, directory: str, on_output: Optional[Callable[[str, str, str], None]] = None) -> RunResult:
+        """
+        指定したモジュールを、イベントループを止めずに実行する。
+        on_outputには(モジュール名, "stdout"か"stderr", 1行)が、出力されるたびに渡される。
+        """
+        if self.warm_pool:
+            async with self.semaphore:
+                result = await self.warm_pool.run(module_name, directory, self.timeout, self.memory_limit, self.cpu_limit)
+            # 温まった親で実行した場合、出力は終了後にまとめて渡す。
+            if on_output:
+                for name, output in (("stdout", result.stdout), ("stderr", result.stderr)):
+                    for line in output.splitlines(keepends=True):
+                        on_output(module_name, name, line)
+            return result
+
+        async with self.semaphore:
+            started_at = time.monotonic()
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", module_name,
+                cwd=directory,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                preexec_fn=self._apply_limits if resource and os.name == "posix" else None,
+                # 孫プロセスもまとめて止められるよう、独立したプロセスグループで起動する。
+                start_new_session=os.name == "posix",
+            )
+            stdout_lines: list[str] = []
+            stderr_lines: list[str] = []
+            peak_rss = [0]
+
+            def emit(name: str, lines: list[str], raw_line: bytes) -> None:
+                line = raw_line.decode("utf-8", errors="replace")
+                lines.append(line)
+                if on_output:
+                    on_output(module_name, name, line)
+
+            async def read(stream: Optional[asyncio.StreamReader], name: str, lines: list[str]) -> None:
+                # StreamReaderの行単位の読み込みは64KiBを超える行で失敗するので、塊で読んで自分で行に分ける。
+                if stream is None:
+                    return
+                buffer = b""
+                while True:
+                    chunk = await stream.read(self.READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    buffer += chunk
+                    *complete_lines, buffer = buffer.split(b"\n")
+                    for raw_line in complete_lines:
+                        emit(name, lines, raw_line + b"\n")
+                if buffer:
+                    emit(name, lines, buffer)
+
+            async def wait_exit() -> None:
+                # process.wait()はパイプが閉じるまで返らない。モジュールが終了しても、
+                # パイプを引き継いだ子孫プロセスが残っていれば待ち続けるので、終了コードを直接調べる。
+                while process.returncode is None:
+                    peak_rss[0] = max(peak_rss[0], self._read_peak_rss(process.pid))
+                    await asyncio.sleep(self.RSS_SAMPLE_INTERVAL)
+
+            readers = asyncio.gather(
+                read(process.stdout, "stdout", stdout_lines),
+                read(process.stderr, "stderr", stderr_lines),
+            )
+            timed_out = False
+            try:
+                await asyncio.wait_for(wait_exit(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                self._kill(process)
+            # 残った子孫プロセスがパイプを閉じなければ止めて、読み終える。
+            try:
+                await asyncio.wait_for(asyncio.shield(readers), timeout=self.PIPE_GRACE_PERIOD)
+            except asyncio.TimeoutError:
+                self._kill(process)
+                try:
+                    await asyncio.wait_for(readers, timeout=self.PIPE_GRACE_PERIOD)
+                except asyncio.TimeoutError:
+                    # 別のセッションへ抜けた子孫がまだパイプを持っている。読めた分だけを返す。
+                    pass
+
+            return RunResult(
+                module_name,
+                None if timed_out else process.returncode,
+                time.monotonic() - started_at,
+                peak_rss[0],
+                "".join(stdout_lines),
+                "".join(stderr_lines),
+                timed_out,
+            )
+
+    def _apply_limits(self) -> None:
+        """
+        子プロセスの中で、メモリとCPU時間の上限を設定する。
+        """
+        if self.memory_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
+        if self.cpu_limit:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_limit, self.cpu_limit))
+
+    def _kill(self, process: asyncio.subprocess.Process) -> None:
+        if os.name == "posix":
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+                return
+            except ProcessLookupError:
+                return
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+    def _read_peak_rss(self, pid: int) -> int:
+        """
+        /proc から、プロセスのこれまでの最大常駐メモリ(バイト)を読む。読めなければ0を返す。
+        /procが無い環境では測れない。子ごとの値が要る場合は、wait4で回収するWarmInterpreterPoolを使う。
+        """
+        try:
+            with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return 0
@@ -0,0 +1,65 @@
+from string import Formatter
+from typing import Optional
+from .token_counter import count_tokens
+
+
+class PromptTemplate:
+    """
+    A prompt compiled once from its source text.
+    Indentation and surrounding blank lines are removed, the {name} fields are found,
+    and the tokens of the fixed text are counted ahead of time.
+    """
+    def __init__(self, name: str, text: str, model: str = "gpt-3.5-turbo") -> None:
+        self.name = name
+        self.model = model
+        self.text = self.normalize(text)
+        # The fixed text and field name pairs, in order. The field name is None after the last literal.
+        self.pieces: list[tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(self.text)
+        ]
+        self.fields = [field for _, field in self.pieces if field]
+        self.static_tokens = count_tokens("".join(literal for literal, _ in self.pieces), model)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Strip the indentation and trailing whitespace of every line, and blank lines at both ends.
+        """
+        return "\n".join(line.strip() for line in text.strip().splitlines())
+
+    def render(self, **values: str) -> str:
+        missing = [field for field in self.fields if field not in values]
+        if missing:
+            raise KeyError(f"{self.name} needs {', '.join(missing)}")
+        return "".join(literal + (values[field] if field else "") for literal, field in self.pieces)
+
+    def count_tokens(self, **values: str) -> int:
+        """
+        Estimate the tokens of the rendered prompt, counting only the values.
+        """
+        return self.static_tokens + sum(count_tokens(values[field], self.model) for field in self.fields)
+
+
+class PromptRegistry:
+    """
+    Named prompt templates, compiled when they are registered.
+    """
+    def __init__(self) -> None:
+        self.templates: dict[str, PromptTemplate] = {}
+
+    def register(self, name: str, text: str) -> PromptTemplate:
+        template = PromptTemplate(name, text)
+        self.templates[name] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        return self.templates[name]
+
+    def render(self, name: str, **values: str) -> str:
+        return self.templates[name].render(**values)
+
+    def token_counts(self) -> dict[str, int]:
+        """
+        Tokens of the fixed text of each template.
+        """
+        return {name: template.static_tokens for name, template in self.templates.items()}
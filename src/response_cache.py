@@ -0,0 +1,118 @@
+from typing import Any, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class ResponseCache:
+    """
+    ChatCompletionの応答をSQLiteに保存する永続キャッシュ。
+    キーはmodel、messages、サンプリングパラメータから作る。
+    古い記録と、容量を超えた分の最も使われていない記録から削除する。
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, max_age: float = 7 * 24 * 60 * 60) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.connection.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(model: str, messages: list[dict[str, str]], params: Optional[dict[str, Any]] = None) -> str:
+        """
+        model、messages、サンプリングパラメータからキーを作る。
+        """
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params or {}},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        キャッシュされた応答を返す。無いか期限切れならNoneを返す。
+        """
+        now = time.time()
+        row = self.connection.execute(
+            "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[1] > self.max_age:
+            self.misses += 1
+            return None
+
+        self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self.connection.commit()
+        self.hits += 1
+        response: str = row[0]
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        """
+        応答を記録し、必要なら古い記録を削除する。
+        """
+        now = time.time()
+        size = len(key) + len(response.encode("utf-8"))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, response, size, now, now),
+        )
+        self.connection.commit()
+        self.evict()
+
+    def delete(self, key: str) -> None:
+        """
+        keyの記録を削除する。解釈できなかった応答を再び返さないために使う。
+        """
+        self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.connection.commit()
+
+    def evict(self) -> None:
+        """
+        期限切れの記録と、max_bytesを超えた分の最も使われていない記録を削除する。
+        """
+        self.connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,))
+
+        total: int = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            rows = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+            stale_keys = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                stale_keys.append((key,))
+                total -= size
+            self.connection.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+        self.connection.commit()
+
+    def clear(self) -> None:
+        """
+        全ての記録を削除する。
+        """
+        self.connection.execute("DELETE FROM responses")
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
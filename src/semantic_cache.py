@@ -0,0 +1,196 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+if TYPE_CHECKING:
+    from .hippocampus import Hippocampus
+
+
+def parse_overrides(text: str) -> dict[str, float]:
+    """
+    "call_type=value"をカンマで区切った設定を読む。例: "classify=0.97,subdivide=0.93"
+    """
+    overrides: dict[str, float] = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        call_type, value = item.split("=")
+        overrides[call_type.strip()] = float(value)
+    return overrides
+
+
+class SemanticCache:
+    """
+    意味の近い問い合わせに、以前の応答を返すキャッシュ。
+    問い合わせはHippocampusでベクトル化して、呼び出しの種類とscopeごとのnamespaceに記憶し、
+    コサイン類似度が閾値以上の記憶があれば、その応答をSQLiteから返す。
+    共通の目的と文脈まで埋め込むと、同じ目的の別のタスク同士が似て見えるので、
+    埋め込むのは問い合わせ自体だけにして、目的と文脈はscopeごとのnamespaceで分ける。
+    scopeも埋め込みで探すので、言い換えた目的は、以前の近い目的のscopeを使う。
+    閾値と有効期限は呼び出しの種類ごとに設定できる。
+    """
+
+    def __init__(self, hippocampus: Hippocampus, path: str, namespace: str = "semantic-cache", threshold: float = 0.95, ttl: float = 7 * 24 * 60 * 60, thresholds: Optional[dict[str, float]] = None, ttls: Optional[dict[str, float]] = None, scope_threshold: float = 0.9) -> None:
+        self.hippocampus = hippocampus
+        self.path = path
+        self.namespace = namespace
+        # 目的と文脈が、以前のscopeのものの言い換えとみなされる最小のコサイン類似度。
+        self.scope_threshold = scope_threshold
+        self.threshold = threshold
+        self.ttl = ttl
+        self.thresholds = thresholds or {}
+        self.ttls = ttls or {}
+        # 呼び出しの種類ごとの、問い合わせ数とヒット数。
+        self.lookups: dict[str, int] = {}
+        self.hits: dict[str, int] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # イベントループを止めないよう、別スレッドから呼ばれる。
+        # 埋め込みとインデックスの問い合わせは並行させ、SQLiteの操作だけを排他する。
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                id TEXT PRIMARY KEY,
+                call_type TEXT NOT NULL,
+                namespace TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.commit()
+
+    @classmethod
+    def from_env(cls) -> SemanticCache:
+        """
+        .envの設定でキャッシュを作る。
+        """
+        from .hippocampus import Hippocampus
+
+        return cls(
+            Hippocampus(),
+            os.getenv("SEMANTIC_CACHE_PATH", "cache/semantic.sqlite3"),
+            os.getenv("SEMANTIC_CACHE_NAMESPACE", "semantic-cache"),
+            float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            float(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 60 * 60))),
+            parse_overrides(os.getenv("SEMANTIC_CACHE_THRESHOLDS", "")),
+            parse_overrides(os.getenv("SEMANTIC_CACHE_TTLS", "")),
+            float(os.getenv("SEMANTIC_CACHE_SCOPE_THRESHOLD", "0.9")),
+        )
+
+    def scope_for(self, text: str) -> str:
+        """
+        目的と文脈のtextに最も近い、既存のscopeを返す。scope_threshold以上のものが無ければ、textのハッシュを新しいscopeとして記憶する。
+        """
+        namespace = f"{self.namespace}-scopes"
+        candidates = self.hippocampus.query_scored_memories([text], 1, namespace)[0]
+        if candidates and candidates[0][1] >= self.scope_threshold:
+            return candidates[0][0]
+        scope = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        self.hippocampus.input_memories([(scope, text)], namespace)
+        return scope
+
+    @staticmethod
+    def make_id(call_type: str, scope: str, text: str) -> str:
+        return hashlib.sha256(f"{call_type}\0{scope}\0{text}".encode("utf-8")).hexdigest()
+
+    def namespace_for(self, call_type: str, scope: str) -> str:
+        return f"{self.namespace}-{call_type}-{scope}"
+
+    def threshold_for(self, call_type: str) -> float:
+        return self.thresholds.get(call_type, self.threshold)
+
+    def ttl_for(self, call_type: str) -> float:
+        return self.ttls.get(call_type, self.ttl)
+
+    def get_many(self, call_type: str, scope: str, texts: list[str]) -> list[Optional[str]]:
+        """
+        scopeの中で、textsそれぞれに最も近い問い合わせの応答を返す。閾値未満か期限切れならNoneになる。
+        """
+        if not texts:
+            return []
+        namespace = self.namespace_for(call_type, scope)
+        matches = self.hippocampus.query_scored_memories(texts, 1, namespace)
+        threshold = self.threshold_for(call_type)
+        expires_before = time.time() - self.ttl_for(call_type)
+        answers: list[Optional[str]] = []
+        expired: list[str] = []
+        with self.lock:
+            for candidates in matches:
+                answer = None
+                if candidates and candidates[0][1] >= threshold:
+                    id = candidates[0][0]
+                    row = self.connection.execute("SELECT answer, created_at FROM answers WHERE id = ?", (id,)).fetchone()
+                    if row is not None and row[1] >= expires_before:
+                        answer = row[0]
+                    else:
+                        expired.append(id)
+                answers.append(answer)
+
+            if expired:
+                self.connection.executemany("DELETE FROM answers WHERE id = ?", [(id,) for id in expired])
+                self.connection.commit()
+
+            self.lookups[call_type] = self.lookups.get(call_type, 0) + len(texts)
+            self.hits[call_type] = self.hits.get(call_type, 0) + sum(answer is not None for answer in answers)
+
+        # 期限切れの記憶は、次の問い合わせで新しい応答に置き換わるよう削除する。
+        if expired:
+            self.hippocampus.index.delete(ids=expired, namespace=namespace)
+        return answers
+
+    def set_many(self, call_type: str, scope: str, items: list[tuple[str, str]]) -> None:
+        """
+        scopeの中で、問い合わせと応答の組を記憶する。
+        """
+        if not items:
+            return
+        namespace = self.namespace_for(call_type, scope)
+        memories = [(self.make_id(call_type, scope, text), text) for text, _ in items]
+        self.hippocampus.input_memories(memories, namespace)
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO answers (id, call_type, namespace, answer, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(id, call_type, namespace, answer, now) for (id, _), (_, answer) in zip(memories, items)],
+            )
+            self.connection.commit()
+
+    def hit_rate(self, call_type: Optional[str] = None) -> float:
+        lookups = self.lookups.get(call_type, 0) if call_type else sum(self.lookups.values())
+        hits = self.hits.get(call_type, 0) if call_type else sum(self.hits.values())
+        return hits / lookups if lookups else 0.0
+
+    def format_summary(self) -> str:
+        """
+        呼び出しの種類ごとのヒット率を整形する。問い合わせが無ければ空文字列を返す。
+        """
+        if not self.lookups:
+            return ""
+        lines = [f"{'call type':<16}{'lookups':>8}{'hits':>7}{'rate':>7}{'threshold':>10}"]
+        for call_type, lookups in self.lookups.items():
+            lines.append(f"{call_type:<16}{lookups:>8}{self.hits.get(call_type, 0):>7}{self.hit_rate(call_type):>7.1%}{self.threshold_for(call_type):>10.2f}")
+        lines.append(f"Overall hit rate: {self.hit_rate():.1%}")
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        """
+        全ての記録を削除する。
+        """
+        with self.lock:
+            namespaces = [namespace for (namespace,) in self.connection.execute("SELECT DISTINCT namespace FROM answers").fetchall()]
+            self.connection.execute("DELETE FROM answers")
+            self.connection.commit()
+        for namespace in namespaces + [f"{self.namespace}-scopes"]:
+            self.hippocampus.index.delete(delete_all=True, namespace=namespace)
+
+    def close(self) -> None:
+        self.connection.close()
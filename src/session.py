@@ -1,30 +1,187 @@
 from .ui_base import UIBase
 from .role import Role
 from .bot_agent import BotAgent
+from .api_scheduler import ApiScheduler, Priority
+from .model_router import ModelRouter, ModelTier
+from .structured_output import OutputSchema, StructuredOutputError
+from .session_prompts import PROMPTS
+from .response_cache import ResponseCache
+from .semantic_cache import SemanticCache
 from .file_reader import FileReader
 from .message_carrier import MessageCarrier
 from .task import Task, TaskTag
-from dotenv import load_dotenv
+from .task_tree_expander import TaskTreeExpander
+from .session_checkpoint import SessionCheckpoint
+from .token_counter import count_tokens
+from .telemetry import CallRecord, Telemetry, traced
 from .i18n import _
+from typing import Callable, Optional
+from datetime import datetime
 import asyncio
-import openai
+import json
 import os
+import re
+
+# Numbers the classification prompts answer with, mapped to TaskTag. They follow the order of the prompts' choices.
+TASK_TAG_NUMBERS = {
+    0: TaskTag.unsolvable,
+    1: TaskTag.ask_user,
+    2: TaskTag.subdivide,
+    3: TaskTag.use_bot,
+    4: TaskTag.use_python,
+    }
+
+
+# Other words a feasibility answer may use, mapped to yes or no.
+FEASIBILITY_WORDS = {"true": "yes", "false": "no"}
+
+
+def parse_feasibility(response: str) -> Optional[bool]:
+    """
+    Read a Yes/No answer, or true/false. Returns None if the answer is missing or hedged, e.g. "Yes, but no".
+    """
+    words = [FEASIBILITY_WORDS.get(word, word) for word in re.findall(r"[a-z]+", response.lower())]
+    answers = {word for word in words if word in ("yes", "no")}
+    if len(answers) != 1 or words[0] not in answers:
+        return None
+    return "yes" in answers
+
+
+def parse_tag_number(response: str) -> Optional[TaskTag]:
+    """
+    Read a single classification number. Returns None if there is none, several different ones, or it is out of range.
+    """
+    numbers = set(re.findall(r"\d+", response))
+    if len(numbers) != 1:
+        return None
+    return TASK_TAG_NUMBERS.get(int(numbers.pop()))
+
+
+def parse_task_lines(response: str) -> Optional[list[str]]:
+    """
+    Read the lines starting with "-" as tasks. Returns None if there are none.
+    """
+    tasks = [line[1:].strip() for line in response.split("\n") if line.startswith("-")]
+    return tasks or None
+
+
+def parse_tag_lines(response: str) -> Optional[dict[int, TaskTag]]:
+    """
+    Read "task number: number" lines. Returns None if there are none.
+    """
+    tags = {}
+    for line in response.split("\n"):
+        match = re.match(r"\s*(\d+)\s*[:.)\-]\s*(\d)", line)
+        if match and int(match.group(2)) in TASK_TAG_NUMBERS:
+            tags[int(match.group(1))] = TASK_TAG_NUMBERS[int(match.group(2))]
+    return tags or None
+
+
+TAG_NUMBER_PROPERTY = {"type": "integer", "enum": sorted(TASK_TAG_NUMBERS)}
+
+# Reply formats of the session's prompts. Plain text replies are read with the parsers above.
+FEASIBILITY_SCHEMA = OutputSchema(
+    "report_feasibility",
+    "Report whether the objective is feasible for AutoEvolver.",
+    {"type": "object", "properties": {"feasible": {"type": "boolean"}}, "required": ["feasible"]},
+    lambda arguments: bool(arguments["feasible"]),
+    parse_feasibility,
+    )
+TASK_LIST_SCHEMA = OutputSchema(
+    "list_tasks",
+    "List the tasks in the order they should be done, one short sentence each.",
+    {"type": "object", "properties": {"tasks": {"type": "array", "items": {"type": "string"}}}, "required": ["tasks"]},
+    lambda arguments: [task.strip().lstrip("-").strip() for task in arguments["tasks"] if task.strip()],
+    parse_task_lines,
+    )
+CLASSIFICATION_SCHEMA = OutputSchema(
+    "classify_task",
+    "Classify how the task should be solved.",
+    {"type": "object", "properties": {"number": TAG_NUMBER_PROPERTY}, "required": ["number"]},
+    lambda arguments: TASK_TAG_NUMBERS[arguments["number"]],
+    parse_tag_number,
+    )
+BATCH_CLASSIFICATION_SCHEMA = OutputSchema(
+    "classify_tasks",
+    "Classify how each numbered task should be solved.",
+    {
+        "type": "object",
+        "properties": {
+            "classifications": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"task": {"type": "integer", "minimum": 1}, "number": TAG_NUMBER_PROPERTY},
+                    "required": ["task", "number"],
+                },
+            },
+        },
+        "required": ["classifications"],
+    },
+    lambda arguments: {item["task"]: TASK_TAG_NUMBERS[item["number"]] for item in arguments["classifications"]},
+    parse_tag_lines,
+    )
 
 class Session():
     """
     Autonomous task resolution sessions.
     """
 
-    def __init__(self, view: UIBase) -> None:
+    def __init__(self, view: UIBase, resume: bool = False) -> None:
         self.view = view
+        # State saved after each phase. With resume, completed phases are skipped.
+        self.checkpoint = SessionCheckpoint(os.getenv("CHECKPOINT_PATH", "checkpoint/session.json"))
+        self.resume = resume
         self.message_carrier = MessageCarrier(view)
         self.file_reader = FileReader()
-        # Read the API key from .env.
-        openai.api_key = os.getenv("OPENAI_API_KEY", "")
+        # Model of each call type, and the stronger models cheap calls escalate to.
+        self.router = ModelRouter.shared()
+        # Persistent cache of completions, shared by every BotAgent in the session.
+        self.response_cache: Optional[ResponseCache] = None
+        if os.getenv("RESPONSE_CACHE", "on") != "off":
+            self.response_cache = ResponseCache(
+                os.getenv("RESPONSE_CACHE_PATH", "cache/responses.sqlite3"),
+                int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+                float(os.getenv("RESPONSE_CACHE_MAX_AGE", str(7 * 24 * 60 * 60))),
+                )
+        # Answers of earlier, differently worded classification and subdivision prompts, found through Hippocampus.
+        self.semantic_cache: Optional[SemanticCache] = None
+        if os.getenv("SEMANTIC_CACHE", "off") == "on":
+            self.semantic_cache = SemanticCache.from_env()
+        self.semantic_cache_errors = 0
+        # Scope of each objective and context asked this session.
+        self.semantic_scopes: dict[tuple[str, str], str] = {}
+        # Token budget of each agent's context. 0 means no limit.
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+        # Maximum number of task classification requests in flight at once.
+        self.classify_concurrency = max(1, int(os.getenv("CLASSIFY_CONCURRENCY", "5")))
+        # Number of task lines classified by a single request. 1 disables batching.
+        self.classify_batch_size = max(1, int(os.getenv("CLASSIFY_BATCH_SIZE", "10")))
+        self.classify_semaphore = asyncio.Semaphore(self.classify_concurrency)
+        self.classify_tokens_saved = 0
+        self.classify_requests_saved = 0
+        # Limits for subdividing the task tree.
+        self.expand_max_depth = int(os.getenv("EXPAND_MAX_DEPTH", "3"))
+        self.expand_max_nodes = int(os.getenv("EXPAND_MAX_NODES", "200"))
+        self.expand_time_limit = float(os.getenv("EXPAND_TIME_LIMIT", "300"))
+        # Split and classify the objective while its feasibility is still being assessed.
+        self.speculative_split = os.getenv("SPECULATIVE_SPLIT", "on") != "off"
+        self.speculation: Optional[asyncio.Future[list[Task]]] = None
+        # Calls and new classifications of the running speculation, and the calls of cancelled ones.
+        self.speculation_calls: list[CallRecord] = []
+        self.speculation_answers: list[tuple[str, str]] = []
+        self.wasted_speculation: list[CallRecord] = []
         # Checks if the OpenAI API key has been set and returns an exception if not.
-        if not openai.api_key:
+        # The openai package reads it from the environment when it is first imported by BotAgent.
+        if not os.getenv("OPENAI_API_KEY", ""):
             raise ValueError("APIKey is not set.")
         
+    def create_agent(self, priority: Priority = Priority.normal) -> BotAgent:
+        """
+        Create a BotAgent that shares the session's cache and token budget.
+        """
+        return BotAgent(self.response_cache, self.context_token_budget, priority)
+
     async def run(self) -> None:
         """
         Start Session.        
@@ -37,18 +194,65 @@ class Session():
         # 6. repeat 4-5 until unresolvables is empty
         # 7. resolve resolvables
         self.message_carrier.print_message_as_system("=== Start Session ===", True)
-        objective, context = await self.determine_objective()
-        tasks = self.split_to_tasks(objective, context)
+        if not (self.resume and self.checkpoint.load()):
+            self.checkpoint.clear()
+
+        saved_objective = self.checkpoint.objective
+        if saved_objective:
+            objective, context = saved_objective
+            text = f"Resumed from checkpoint.\nObjective: {objective}\nContext: {context}"
+            self.message_carrier.print_message_as_system(text, True)
+        else:
+            objective, context = await self.determine_objective()
+            self.checkpoint.save_objective(objective, context)
+
+        tasks = await self.split_to_tasks(objective, context)
+        self.checkpoint.clear()
         await self.end()
 
     async def end(self) -> None:
+        if self.classify_requests_saved:
+            text = f"Batch classification saved {self.classify_requests_saved} requests and about {self.classify_tokens_saved} prompt tokens."
+            self.message_carrier.print_message_as_system(text, True)
+        if self.response_cache:
+            text = f"Response cache: {self.response_cache.hits} hits, {self.response_cache.misses} misses."
+            self.message_carrier.print_message_as_system(text, True)
+        if self.semantic_cache:
+            summary = self.semantic_cache.format_summary()
+            if summary:
+                self.message_carrier.print_message_as_system("Semantic cache:\n" + summary, True)
+            if self.semantic_cache_errors:
+                self.message_carrier.print_message_as_system(f"Semantic cache failed {self.semantic_cache_errors} times.", True)
+        if self.wasted_speculation:
+            usage = Telemetry.usage(self.wasted_speculation)
+            text = f"Cancelled speculative splits wasted {usage['calls']} calls, {usage['tokens']} tokens, ${usage['cost']:.4f}."
+            self.message_carrier.print_message_as_system(text, True)
+        stats = ApiScheduler.shared().stats()
+        if stats["dispatched"]:
+            text = f"API scheduler: {stats['dispatched']} calls, {stats['retries']} retries, max queue depth {stats['max_queue_depth']}, average wait {stats['average_wait']:.2f}s, max wait {stats['max_wait']:.2f}s."
+            self.message_carrier.print_message_as_system(text, True)
+        telemetry = Telemetry.shared()
+        if telemetry.calls or telemetry.spans:
+            self.message_carrier.print_message_as_system("Telemetry:\n" + telemetry.format_summary(), True)
+            routing = telemetry.format_routing_summary(self.router.models[ModelTier.strong])
+            if routing:
+                self.message_carrier.print_message_as_system("Model routing:\n" + routing, True)
+            parses = telemetry.format_parse_summary()
+            if parses:
+                self.message_carrier.print_message_as_system("Structured outputs:\n" + parses, True)
+            paths = telemetry.export(datetime.now().strftime("%Y%m%d_%H%M%S"))
+            if paths:
+                self.message_carrier.print_message_as_system("Telemetry written to " + ", ".join(paths), True)
         self.message_carrier.print_message_as_system("=== End Session ===", True)
-        self.message_carrier.save_log_as_json()
+        if os.getenv("LOG_EXPORT_JSON", "off") == "on":
+            self.message_carrier.save_log_as_json()
+        self.message_carrier.close_log()
         # Display a message to exit when you type something.
         self.message_carrier.print_message_as_system(_("Enter something and it will exit."), False)
         await self.view.request_user_input()
 
     
+    @traced("objective")
     async def determine_objective(self) -> tuple[str, str]:
         """
         Ask the user for objectives until a feasible objective and its context are established.
@@ -56,16 +260,59 @@ class Session():
         while True:
             objective = await self.ask_objective()
             context = await self.ask_context()
-            feasibility = await self.feasibility_assessment(objective, context)
-            if not feasibility:
-                text = _("Error: Unobtainable. \nPlease start over from the objective setting.")
-                self.message_carrier.print_message_as_system(text, True)
-            else:
+            # Most objectives are feasible, so the initial split starts now instead of after the assessment.
+            speculation = None
+            if self.speculative_split:
+                self.speculation_calls = []
+                self.speculation_answers = []
+                speculation = asyncio.ensure_future(self.speculate_tasks(objective, context))
+            feasible = False
+            try:
+                feasible, agent = await self.feasibility_assessment(objective, context)
+            finally:
+                # Stop the split as soon as the answer is No, before the reason is explained, or when the assessment fails.
+                if speculation and not feasible:
+                    await self.cancel_speculation(speculation)
+            if feasible:
+                self.speculation = speculation
                 text = _("The objective has been determined to be achievable. \nGenerate task ......")
                 self.message_carrier.print_message_as_system(text, True)
                 return objective, context
+            await self.explain_infeasibility(agent)
+            text = _("Error: Unobtainable. \nPlease start over from the objective setting.")
+            self.message_carrier.print_message_as_system(text, True)
 
 
+    async def speculate_tasks(self, objective: str, context: str) -> list[Task]:
+        """
+        Split the objective into classified tasks ahead of the feasibility assessment.
+        Its calls are collected in speculation_calls, and also recorded under the "speculative_split" span when telemetry is on.
+        Its new classifications wait in speculation_answers, out of the semantic cache, until the objective is found feasible.
+        """
+        telemetry = Telemetry.shared()
+        with telemetry.collect() as calls, telemetry.span("speculative_split"):
+            self.speculation_calls = calls
+            return await self.initial_tasks(objective, context, self.speculation_answers)
+
+    async def cancel_speculation(self, speculation: asyncio.Future[list[Task]]) -> None:
+        """
+        Cancel a speculative split of an infeasible objective and report what it had already cost.
+        """
+        speculation.cancel()
+        try:
+            await speculation
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # The split failed before it was cancelled. Its calls are still counted below.
+            pass
+        usage = Telemetry.usage(self.speculation_calls)
+        self.wasted_speculation.extend(self.speculation_calls)
+        self.speculation_calls = []
+        self.speculation_answers = []
+        text = f"Speculative split cancelled: {usage['calls']} calls, {usage['tokens']} tokens, ${usage['cost']:.4f} wasted."
+        self.message_carrier.print_message_as_system(text, True)
+
     async def decide_on_specifications(self) -> str:
         """
         仕様についてユーザーと議論し、策定する。
@@ -78,43 +325,37 @@ class Session():
         """
         pass
 
-    async def feasibility_assessment(self, objective: str, context: str) -> bool:
+    @traced("feasibility")
+    async def feasibility_assessment(self, objective: str, context: str) -> tuple[bool, BotAgent]:
         """
         Determine feasibility of objectives.
+        Returns the verdict and the agent that gave it, which can explain_infeasibility afterwards.
         """
-        agent = BotAgent()
+        agent = self.create_agent(Priority.interactive)
 
         text = _("Determine the feasibility of your objectives ......")
         self.message_carrier.print_message_as_system(text, True)
 
+        agent.add_context(self.prompt_prefix(objective, context))
         abilities = self.file_reader.read_file("abilities.txt", "documents")
-        prompt = f"""
-        You are an AI that determines if the objective given by the user are feasible.
-        You are part of a repository called AutoEvolver.
-        AutoEvolver is capable of: 
-        {abilities}
-        Based on the above, determine whether or not the following objective is feasible.
-        Response with a just simple "Yes" or "No”.
-        Objective: {objective}
-        Context: {context}
-        Response: 
-        """
-
-        agent.add_context(prompt)
-        response = agent.response_to_context()
-        self.view.process_event()
-        if "Yes" in response:
-            return True
-
-        prompt = f"""
-        Please tell me why you have determined that this task is not feasible.
-        Response:"""
-        agent.add_context(prompt)
-        response = agent.response_to_context()
-        self.view.process_event()
-        # responseを解決不能な理由として表示する
-        self.message_carrier.print_message_as_system(response, True)
-        return False
+        agent.add_context(PROMPTS.render("feasibility", abilities=abilities.strip()))
+        # A cheap model answers first. A reply that does not match the schema is repaired, then asked again to a stronger one.
+        try:
+            feasible = await agent.aresponse_to_context_structured(FEASIBILITY_SCHEMA, "feasibility")
+        except StructuredOutputError:
+            # No model gave a clear answer. Treat it as not feasible and let it explain why.
+            feasible = False
+        return feasible, agent
+
+
+    @traced("feasibility")
+    async def explain_infeasibility(self, agent: BotAgent) -> None:
+        """
+        Have the agent of an infeasible assessment explain why.
+        """
+        agent.add_context(PROMPTS.render("infeasible_reason"))
+        # responseを解決不能な理由として、届いた順に表示する
+        await self.message_carrier.print_stream(agent.astream_response_to_context(self.router.model_for("infeasible_reason")), self.message_carrier.system.sender_info, True)
 
 
     async def ask_objective(self) -> str:
@@ -156,27 +397,22 @@ class Session():
         return context
                 
 
-    def split_to_tasks(self, objective: str, context: str) -> list[Task]:
-        agent = BotAgent()
-        prompt = f"""
-        You are an AI listing tasks to be performed based on the following objective: {objective}.
-        The context regarding the objective is as follows: {context}
-        You are part of a repository called AutoEvolver and this objective must be resolved by AutoEvolver alone.
-        Subdivide and list the objectives into tasks in order to resolve them. Do not try to solve them at this point.
-        When subdividing, do not add more than the original objective. Subdivide into tasks that require the least amount of effort to accomplish.
-        If the task can be solved in the Python code implementation, subdivide it into modules.
-        Do not create abstract tasks. Whenever possible, format the task to be solved by generating Python modules.
-        The list should be formatted with the "-" sign and should not include responses other than the list.
-        Response:"""
-        response = agent.response(prompt)
-        self.view.process_event()
-        tasks_text = response.split("\n") if "\n" in response else [response]
-
-        # Extract only lines starting with "-".
-        tasks_text = [task for task in tasks_text if task.startswith("-")]
-
-        # Convert all tasks_text to tasks
-        tasks = [self.tasktext_to_task(objective, context, task_text) for task_text in tasks_text]
+    @traced("split")
+    async def split_to_tasks(self, objective: str, context: str) -> list[Task]:
+        saved_tasks = self.checkpoint.tasks
+        if saved_tasks is not None:
+            tasks = saved_tasks
+        else:
+            # Use the split started during the feasibility assessment, if any.
+            if self.speculation:
+                speculation, self.speculation = self.speculation, None
+                tasks = await speculation
+                # The objective is feasible, so the classifications made during the assessment can be cached now.
+                await self.cache_answers("classify", objective, context, self.speculation_answers)
+                self.speculation_answers = []
+            else:
+                tasks = await self.initial_tasks(objective, context)
+            self.checkpoint.save_tasks(tasks, False)
 
         # Display a list of Tasks before subdividing.
         # The list is displayed in order of Task's Content - TaskTag.value.
@@ -187,46 +423,61 @@ class Session():
             print_text += f"{task.content} - {task.tag.name}\n"
         self.message_carrier.print_message_as_system(print_text, True)
 
-        # Check if each task should be subdivided, and set subtask if it should be subdivided.
-        for task in tasks:
-            if task.tag == TaskTag.subdivide:
-                subtasks = self.split_to_subtasks(objective, context, task)
-                task.subtasks = subtasks
+        # Subdivide subdividable tasks, level by level, within the session's expansion budget.
+        # Tasks subdivided before an interruption keep their subtasks and are not asked again.
+        if not self.checkpoint.subdivided:
+            expander = TaskTreeExpander(
+                lambda task, claim: self.split_to_subtasks(objective, context, task, claim),
+                self.expand_max_depth,
+                self.expand_max_nodes,
+                self.expand_time_limit,
+                lambda: self.checkpoint.save_tasks(tasks, False),
+                )
+            await expander.expand(tasks)
+            if expander.stopped_reason:
+                text = f"Task expansion stopped early: {expander.stopped_reason}"
+                self.message_carrier.print_message_as_system(text, True)
+            self.checkpoint.save_tasks(tasks, True)
 
         # Display the final list of Tasks.
         self.message_carrier.print_message_as_system("=== Confirmed Tasks ===", True)
-        print_text = ""
-        for task in tasks:
-            print_text += f"{task.content} - {task.tag.name}\n"
-            if task.subtasks:
-                for subtask in task.subtasks:
-                    print_text += f"    {subtask.content} - {subtask.tag.name}\n"
+        print_text = self.format_task_tree(tasks)
         self.message_carrier.print_message_as_system(print_text, True)
 
         return tasks
     
-    def split_to_subtasks(self, objective: str, context: str, task: Task) -> list[Task]:
+    async def initial_tasks(self, objective: str, context: str, pending: Optional[list[tuple[str, str]]] = None) -> list[Task]:
+        """
+        Split the objective into the first level of tasks and classify them.
+        New classifications go to pending, if given, instead of the semantic cache.
+        """
+        agent = self.create_agent()
+        prompt = PROMPTS.render("split")
+        tasks_text = await agent.aresponse_structured(prompt, TASK_LIST_SCHEMA, "split", prefix=self.prompt_prefix(objective, context))
+
+        # Convert all tasks_text to tasks
+        return await self.classify_tasks(objective, context, tasks_text, pending)
+
+    @traced("subdivide")
+    async def split_to_subtasks(self, objective: str, context: str, task: Task, claim: Optional[Callable[[int], int]] = None) -> list[Task]:
         """
         Split the Task into smaller Tasks and return a list of those Tasks.
+        With claim, only as many of them as it grants are classified and returned.
         """
-        agent = BotAgent()
-        prompt = f"""
-        You are an AI that further subdivides the subdivided tasks to achieve the final objective {objective}.
-        The context of the objective is {context}.
-        You are part of a repository called AutoEvolver.
-        The task to subdivide is {task.content}.
-        When subdividing, do not add more than the original objective. Subdivide into tasks that require the least amount of effort to accomplish.
-        If the task can be solved in the Python code implementation, subdivide it into modules.
-        The list should be formatted with the "-" sign and should not include responses other than the list.
-        Response:"""
-        response = agent.response(prompt)
-        self.view.process_event()
-        tasks_text = response.split("\n") if "\n" in response else [response]
-        # Extract only lines beginning with "-".
-        tasks_text = [task for task in tasks_text if task.startswith("-")]
+        cached = (await self.cached_answers("subdivide", objective, context, [task.content]))[0]
+        if cached is not None:
+            tasks_text: list[str] = json.loads(cached)
+        else:
+            agent = self.create_agent(Priority.background)
+            prompt = PROMPTS.render("subdivide", task=task.content)
+            tasks_text = await agent.aresponse_structured(prompt, TASK_LIST_SCHEMA, "subdivide", prefix=self.prompt_prefix(objective, context))
+            await self.cache_answers("subdivide", objective, context, [(task.content, json.dumps(tasks_text, ensure_ascii=False))])
+
+        if claim:
+            tasks_text = tasks_text[:claim(len(tasks_text))]
 
         # Convert all tasks_text to tasks
-        tasks = [self.tasktext_to_task(objective, context, task_text) for task_text in tasks_text]
+        tasks = await self.classify_tasks(objective, context, tasks_text)
 
         # Display a list of subdivided Tasks.
         self.message_carrier.print_message_as_system("=== Subdivided Tasks ===", True)
@@ -238,32 +489,158 @@ class Session():
         return tasks
 
 
-    def tasktext_to_task(self, objective: str, context: str, task_text: str) -> Task:
-        agent = BotAgent()
-        prompt = f"""
-        You are an AI that categorizes the solution to a given task as "ask user (1)", "Further divide into smaller tasks (2)" "output text by ChatGPT itself (3)", "run or write new Python module to solve (4)" or "unsolvable (0)".
-        The task is part of the final objective {objective}. The context of that objective is {context}.
-        The task is: {task_text}
-        Select only one most appropriate number and return that number only. Any other response will not be included.
-        If it is difficult to determine, just answer "2" for now.
-		Choose the solution with the highest number possible.
-        Number:"""
-        response = agent.response(prompt)
-        self.view.process_event()
+    def format_task_tree(self, tasks: list[Task], depth: int = 0) -> str:
+        """
+        Format the Task tree as indented "Content - TaskTag" lines.
+        """
+        text = ""
+        for task in tasks:
+            text += "    " * depth + f"{task.content} - {task.tag.name}\n"
+            text += self.format_task_tree(task.subtasks, depth + 1)
+        return text
+
+
+    @traced("classify")
+    async def classify_tasks(self, objective: str, context: str, tasks_text: list[str], pending: Optional[list[tuple[str, str]]] = None) -> list[Task]:
+        """
+        Classify task lines concurrently, up to classify_concurrency requests at a time across the session.
+        Lines are sent classify_batch_size at a time; lines whose batch result cannot be parsed fall back to a single-task request.
+        Lines with an answer in the semantic cache are not sent. New answers are stored there, or added to pending if it is given.
+        Results keep the order of tasks_text. A task whose reply cannot be parsed is marked as failed.
+        """
+        semaphore = self.classify_semaphore
+
+        async def classify(task_text: str) -> Task:
+            async with semaphore:
+                try:
+                    return await self.tasktext_to_task(objective, context, task_text)
+                except ValueError as e:
+                    task = Task(task_text, TaskTag.unsolvable)
+                    task.fail(str(e))
+                    return task
+
+        async def classify_batch(batch: list[str]) -> list[Task]:
+            if len(batch) == 1:
+                return [await classify(batch[0])]
+            async with semaphore:
+                tags = await self.tasktexts_to_tags(objective, context, batch)
+            # Lines that could not be parsed are asked again one by one.
+            fallbacks = [task_text for task_text, tag in zip(batch, tags) if tag is None]
+            retried = iter(await asyncio.gather(*(classify(task_text) for task_text in fallbacks)))
+            return [Task(task_text, tag) if tag is not None else next(retried) for task_text, tag in zip(batch, tags)]
+
+        cached = await self.cached_answers("classify", objective, context, tasks_text)
+        uncached = [task_text for task_text, answer in zip(tasks_text, cached) if answer is None]
+
+        batch_size = self.classify_batch_size
+        batches = [uncached[i:i + batch_size] for i in range(0, len(uncached), batch_size)]
+        results = await asyncio.gather(*(classify_batch(batch) for batch in batches))
+        classified = [task for batch_result in results for task in batch_result]
+        answers = [(task.content, task.tag.name) for task in classified if not task.failed]
+        if pending is not None:
+            pending.extend(answers)
+        else:
+            await self.cache_answers("classify", objective, context, answers)
+
+        new_tasks = iter(classified)
+        return [Task(task_text, TaskTag[answer]) if answer is not None else next(new_tasks) for task_text, answer in zip(tasks_text, cached)]
+
+
+    async def tasktexts_to_tags(self, objective: str, context: str, tasks_text: list[str]) -> list[Optional[TaskTag]]:
+        """
+        Classify several task lines with a single request.
+        Returns one TaskTag per line, or None for lines whose result could not be parsed.
+        """
+        agent = self.create_agent()
+        numbered_tasks = "\n".join(f"{i + 1}. {task_text}" for i, task_text in enumerate(tasks_text))
+        prompt = PROMPTS.render("classify_batch", tasks=numbered_tasks)
+        try:
+            classified = await agent.aresponse_structured(prompt, BATCH_CLASSIFICATION_SCHEMA, "classify_batch", prefix=self.prompt_prefix(objective, context))
+        except StructuredOutputError:
+            # Every line falls back to a single-task request.
+            classified = {}
+        tags: list[Optional[TaskTag]] = [classified.get(i + 1) for i in range(len(tasks_text))]
+
+        # Record how many prompt tokens were saved compared with one request per parsed task.
+        # A batch with no parsed line saved nothing, and its lines are asked again one by one.
+        parsed = [task_text for task_text, tag in zip(tasks_text, tags) if tag is not None]
+        if parsed:
+            # Token counts of the templates were measured when they were compiled, so only the tasks are counted here.
+            # Every request, batched or not, sends the same prefix.
+            prefix_tokens = count_tokens(self.prompt_prefix(objective, context))
+            single_tokens = sum(prefix_tokens + PROMPTS.get("classify").count_tokens(task=task_text) for task_text in parsed)
+            batch_tokens = prefix_tokens + PROMPTS.get("classify_batch").count_tokens(tasks=numbered_tasks)
+            self.classify_tokens_saved += max(0, single_tokens - batch_tokens)
+            self.classify_requests_saved += len(parsed) - 1
+        return tags
+
+
+    async def cached_answers(self, call_type: str, objective: str, context: str, texts: list[str]) -> list[Optional[str]]:
+        """
+        Answers of the semantic cache for texts asked under the objective, or None where there is none.
+        A cache that fails is treated as a miss.
+        """
+        if not self.semantic_cache:
+            return [None] * len(texts)
+        try:
+            scope = await self.semantic_scope(objective, context)
+            # Hippocampus embeds synchronously, so the lookup runs outside the event loop.
+            return await asyncio.to_thread(self.semantic_cache.get_many, call_type, scope, texts)
+        except Exception as e:
+            self.semantic_cache_failed(e)
+            return [None] * len(texts)
+
+
+    async def cache_answers(self, call_type: str, objective: str, context: str, items: list[tuple[str, str]]) -> None:
+        """
+        Store (text, answer) pairs asked under the objective in the semantic cache.
+        A cache that fails leaves them unstored.
+        """
+        if not self.semantic_cache or not items:
+            return
+        try:
+            scope = await self.semantic_scope(objective, context)
+            await asyncio.to_thread(self.semantic_cache.set_many, call_type, scope, items)
+        except Exception as e:
+            self.semantic_cache_failed(e)
+
+
+    async def semantic_scope(self, objective: str, context: str) -> str:
+        """
+        The semantic cache scope of the objective and context, shared with earlier rewordings of them.
+        """
+        assert self.semantic_cache
+        key = (objective, context)
+        if key not in self.semantic_scopes:
+            self.semantic_scopes[key] = await asyncio.to_thread(self.semantic_cache.scope_for, f"Objective: {objective}\nContext: {context}")
+        return self.semantic_scopes[key]
+
+
+    def semantic_cache_failed(self, error: Exception) -> None:
+        """
+        Count a failure of the semantic cache. Only the first one is shown, so an unreachable embedding API does not flood the log.
+        """
+        if not self.semantic_cache_errors:
+            text = f"Semantic cache failed and is skipped: {type(error).__name__}: {error}"
+            self.message_carrier.print_message_as_system(text, True)
+        self.semantic_cache_errors += 1
+
+
+    def prompt_prefix(self, objective: str, context: str) -> str:
+        """
+        The message every call of the session starts with: the preamble, objective and context.
+        """
+        return PROMPTS.render("prefix", objective=objective, context=context)
+
+
+    async def tasktext_to_task(self, objective: str, context: str, task_text: str) -> Task:
+        agent = self.create_agent()
+        prompt = PROMPTS.render("classify", task=task_text)
+        # A cheap model classifies first. A reply that does not match the schema is repaired, then asked again to a stronger one.
         try:
-            digit = response[0]
-            number = int(digit)
-        except ValueError:
-            raise ValueError(f"response is not a number: {response} for {task_text}")
-        # responseからタグを抽出する
-        tag_dict = {
-            0: TaskTag.unsolvable, 
-            1: TaskTag.ask_user, 
-            2: TaskTag.use_bot, 
-            3: TaskTag.use_python,
-            4: TaskTag.subdivide,
-            }
-        tag = tag_dict[number]
+            tag = await agent.aresponse_structured(prompt, CLASSIFICATION_SCHEMA, "classify", prefix=self.prompt_prefix(objective, context))
+        except StructuredOutputError as e:
+            raise ValueError(f"{e} for {task_text}")
         task = Task(task_text, tag)
         return task
     
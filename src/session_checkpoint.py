@@ -0,0 +1,68 @@
+from .task import Task
+from typing import Any, Optional
+import json
+import os
+
+
+class SessionCheckpoint:
+    """
+    Saves the state of a Session after each phase so that an interrupted session can be resumed
+    without repeating the completions it already paid for.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.state: dict[str, Any] = {}
+
+    def load(self) -> bool:
+        """
+        Load the saved state. Returns False if there is no checkpoint.
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.state = json.load(f)
+        return True
+
+    def save(self) -> None:
+        """
+        Write the state atomically, so a crash while saving keeps the previous checkpoint.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+    def clear(self) -> None:
+        self.state = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def objective(self) -> Optional[tuple[str, str]]:
+        if "objective" not in self.state:
+            return None
+        return self.state["objective"], self.state["context"]
+
+    def save_objective(self, objective: str, context: str) -> None:
+        self.state["objective"] = objective
+        self.state["context"] = context
+        self.save()
+
+    @property
+    def tasks(self) -> Optional[list[Task]]:
+        if "tasks" not in self.state:
+            return None
+        return [Task.from_dict(task) for task in self.state["tasks"]]
+
+    @property
+    def subdivided(self) -> bool:
+        return bool(self.state.get("subdivided", False))
+
+    def save_tasks(self, tasks: list[Task], subdivided: bool) -> None:
+        self.state["tasks"] = [task.to_dict() for task in tasks]
+        self.state["subdivided"] = subdivided
+        self.save()
@@ -0,0 +1,68 @@
+from .prompt_templates import PromptRegistry
+
+# Prompts of the Session, compiled once at import.
+# Every call of a session starts with the same short "prefix" message holding the objective and its context.
+# The templates below only hold the part specific to each call.
+# The prefix is far below the 1024 tokens providers need before they cache a prompt, so it is kept small
+# instead: abilities.txt is only sent to the feasibility assessment, which needs it.
+PROMPTS = PromptRegistry()
+
+PROMPTS.register("prefix", """
+    You are part of a repository called AutoEvolver.
+    The final objective is: {objective}
+    The context of the objective is: {context}
+    """)
+
+PROMPTS.register("feasibility", """
+    You are an AI that determines if the objective given by the user is feasible.
+    AutoEvolver is capable of:
+    {abilities}
+    Based on the above, determine whether or not the objective is feasible.
+    Response with a just simple "Yes" or "No".
+    Response:
+    """)
+
+PROMPTS.register("infeasible_reason", """
+    Please tell me why you have determined that this task is not feasible.
+    Response:
+    """)
+
+PROMPTS.register("split", """
+    You are an AI listing tasks to be performed based on the objective.
+    This objective must be resolved by AutoEvolver alone.
+    Subdivide and list the objectives into tasks in order to resolve them. Do not try to solve them at this point.
+    When subdividing, do not add more than the original objective. Subdivide into tasks that require the least amount of effort to accomplish.
+    If the task can be solved in the Python code implementation, subdivide it into modules.
+    Do not create abstract tasks. Whenever possible, format the task to be solved by generating Python modules.
+    The list should be formatted with the "-" sign and should not include responses other than the list.
+    Response:
+    """)
+
+PROMPTS.register("subdivide", """
+    You are an AI that further subdivides the subdivided tasks to achieve the final objective.
+    The task to subdivide is {task}.
+    When subdividing, do not add more than the original objective. Subdivide into tasks that require the least amount of effort to accomplish.
+    If the task can be solved in the Python code implementation, subdivide it into modules.
+    The list should be formatted with the "-" sign and should not include responses other than the list.
+    Response:
+    """)
+
+PROMPTS.register("classify_batch", """
+    You are an AI that categorizes the solution to each given task as "ask user (1)", "Further divide into smaller tasks (2)" "output text by ChatGPT itself (3)", "run or write new Python module to solve (4)" or "unsolvable (0)".
+    The tasks are part of the final objective. The tasks are:
+    {tasks}
+    For each task, select only one most appropriate number. Answer one line per task in the form "task number: number". Any other response will not be included.
+    If it is difficult to determine, just answer "2" for now.
+    Choose the solution with the highest number possible.
+    Numbers:
+    """)
+
+PROMPTS.register("classify", """
+    You are an AI that categorizes the solution to a given task as "ask user (1)", "Further divide into smaller tasks (2)" "output text by ChatGPT itself (3)", "run or write new Python module to solve (4)" or "unsolvable (0)".
+    The task is part of the final objective.
+    The task is: {task}
+    Select only one most appropriate number and return that number only. Any other response will not be included.
+    If it is difficult to determine, just answer "2" for now.
+    Choose the solution with the highest number possible.
+    Number:
+    """)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+from typing import Any, Callable, Generic, Optional, TypeVar
+import json
+import re
+
+T = TypeVar("T")
+
+# Python types accepted for each JSON schema type. bool is excluded from the numbers on purpose.
+JSON_TYPES: dict[str, tuple[type, ...]] = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+
+
+class StructuredOutputError(ValueError):
+    """
+    Raised when a reply does not match the schema it was asked for.
+    """
+    def __init__(self, message: str) -> None:
+        self.message = message
+        super().__init__(message)
+
+    def __str__(self) -> str:
+        return f"{type(self).__name__}: {self.message}"
+
+
+def validate(schema: dict[str, Any], value: Any, path: str = "$") -> None:
+    """
+    Check value against the subset of JSON schema used by the output schemas:
+    type, enum, properties, required, items, minimum and maximum.
+    Raises StructuredOutputError naming the first offending path.
+    """
+    expected = schema.get("type")
+    if expected:
+        types = JSON_TYPES[expected]
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            raise StructuredOutputError(f"{path} must be {expected}, got {json.dumps(value)[:80]}")
+    if "enum" in schema and value not in schema["enum"]:
+        raise StructuredOutputError(f"{path} must be one of {schema['enum']}, got {json.dumps(value)[:80]}")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            raise StructuredOutputError(f"{path} must be at least {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            raise StructuredOutputError(f"{path} must be at most {schema['maximum']}")
+    if isinstance(value, dict):
+        for name in schema.get("required", []):
+            if name not in value:
+                raise StructuredOutputError(f"{path}.{name} is missing")
+        for name, property_schema in schema.get("properties", {}).items():
+            if name in value:
+                validate(property_schema, value[name], f"{path}.{name}")
+    if isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            validate(schema["items"], item, f"{path}[{i}]")
+
+
+class OutputSchema(Generic[T]):
+    """
+    A typed reply format. It is sent as a function for the model to call, and the arguments
+    are validated against parameters and converted to T with convert.
+    Replies in plain text are read as JSON, or with text_parser when one is given.
+    """
+    def __init__(self, name: str, description: str, parameters: dict[str, Any], convert: Callable[[dict[str, Any]], T], text_parser: Optional[Callable[[str], Optional[T]]] = None) -> None:
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.convert = convert
+        self.text_parser = text_parser
+
+    @property
+    def function(self) -> dict[str, Any]:
+        """
+        The function definition sent with the request.
+        """
+        return {"name": self.name, "description": self.description, "parameters": self.parameters}
+
+    def parse(self, reply: str) -> T:
+        """
+        Parse and validate reply. Raises StructuredOutputError if it does not match.
+        """
+        try:
+            arguments = json.loads(self.extract_json(reply))
+        except json.JSONDecodeError as e:
+            value = self.parse_text(reply)
+            if value is not None:
+                return value
+            raise StructuredOutputError(f"invalid JSON at line {e.lineno} column {e.colno}: {e.msg}")
+        # A bare answer such as "4" or "true" is valid JSON but not the arguments of the function.
+        if not isinstance(arguments, dict):
+            value = self.parse_text(reply)
+            if value is not None:
+                return value
+        validate(self.parameters, arguments)
+        try:
+            return self.convert(arguments)
+        except (KeyError, ValueError, TypeError) as e:
+            raise StructuredOutputError(f"{type(e).__name__}: {e}")
+
+    def parse_text(self, reply: str) -> Optional[T]:
+        """
+        Read a plain text reply with text_parser. Returns None if there is none or it cannot read the reply.
+        """
+        if not self.text_parser:
+            return None
+        return self.text_parser(reply)
+
+    def extract_json(self, reply: str) -> str:
+        """
+        Strip a code block around the JSON, as models sometimes add one to plain text replies.
+        """
+        match = re.search(r"```(?:json)?\s*(.*?)```", reply, re.DOTALL)
+        return match.group(1) if match else reply
+
+    def repair_prompt(self, reply: str, error: str) -> str:
+        """
+        A minimal prompt asking to fix only the broken reply, without the original question.
+        """
+        return (
+            f"The following arguments for {self.name} do not match its JSON schema.\n"
+            f"Error: {error}\n"
+            f"Arguments: {reply}\n"
+            f"Call {self.name} again with corrected arguments. Keep every value that was already valid."
+        )
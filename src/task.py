@@ -1,5 +1,6 @@
 from __future__ import annotations
 from enum import Enum
+from typing import Any
 
 class TaskTag(Enum):
     """
@@ -19,6 +20,7 @@ class Task:
         self.content = content
         self.tag = tag
         self.completed = False
+        self.failed = False
         self.result: str = ""
         self.subtasks: list[Task] = []
 
@@ -26,9 +28,32 @@ class Task:
         self.completed = True
         self.result = result
 
+    def fail(self, reason: str) -> None:
+        self.failed = True
+        self.result = reason
+
     def set_subtasks(self, subtasks: list[Task]) -> None:
         self.subtasks = subtasks
 
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "content": self.content,
+            "tag": self.tag.name,
+            "completed": self.completed,
+            "failed": self.failed,
+            "result": self.result,
+            "subtasks": [subtask.to_dict() for subtask in self.subtasks],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Task:
+        task = cls(data["content"], TaskTag[data["tag"]])
+        task.completed = data.get("completed", False)
+        task.failed = data.get("failed", False)
+        task.result = data.get("result", "")
+        task.subtasks = [cls.from_dict(subtask) for subtask in data.get("subtasks", [])]
+        return task
+
     @property
     def subdividable(self) -> bool:
         return self.tag == TaskTag.subdivide
\ No newline at end of file
@@ -0,0 +1,116 @@
+from .task import Task
+from typing import Awaitable, Callable, Optional
+import asyncio
+import time
+
+
+class TaskTreeExpander:
+    """
+    Expands subdividable Tasks level by level until the tree is resolved or a budget is exhausted.
+    Subdividable Tasks on the same level are expanded concurrently, as far as the node budget allows.
+    split is called with the Task and a claim function. It passes claim the number of subtasks it found
+    before classifying them, and keeps only as many as claim grants.
+    """
+
+    def __init__(self, split: Callable[[Task, Callable[[int], int]], Awaitable[list[Task]]], max_depth: int, max_nodes: int, time_limit: float, on_level: Optional[Callable[[], None]] = None) -> None:
+        self.split = split
+        # Called after each level has been attached to the tree, e.g. to save a checkpoint.
+        self.on_level = on_level
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        # Set when expansion stopped before every subdividable Task was expanded.
+        self.stopped_reason = ""
+
+    async def expand(self, tasks: list[Task]) -> list[Task]:
+        """
+        Expand tasks in place and return them. When a limit is hit, the partial tree is returned.
+        Tasks that already have subtasks are not expanded again, but their subtasks are.
+        """
+        self.stopped_reason = ""
+        deadline = time.monotonic() + self.time_limit
+        node_count = self.count_nodes(tasks)
+        level = tasks
+        depth = 0
+
+        while level:
+            frontier = [task for task in level if task.subdividable and not task.subtasks and not task.failed]
+            if frontier:
+                node_count = await self.expand_level(frontier, depth, node_count, deadline)
+                if self.on_level:
+                    self.on_level()
+                if self.stopped_reason:
+                    break
+            level = [subtask for task in level for subtask in task.subtasks]
+            depth += 1
+
+        return tasks
+
+    async def expand_level(self, frontier: list[Task], depth: int, node_count: int, deadline: float) -> int:
+        """
+        Expand the Tasks in frontier concurrently, in order until the node budget is claimed, and return the new node count.
+        """
+        if depth >= self.max_depth:
+            self.stopped_reason = f"depth limit ({self.max_depth})"
+            return node_count
+        if node_count >= self.max_nodes:
+            self.stopped_reason = f"node limit ({self.max_nodes})"
+            return node_count
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self.stopped_reason = f"time limit ({self.time_limit}s)"
+            return node_count
+
+        # Nodes left in the budget. A split claims its subtasks from it before they are classified.
+        available = self.max_nodes - node_count
+        claimed: set[Task] = set()
+
+        def claimer(task: Task) -> Callable[[int], int]:
+            def claim(count: int) -> int:
+                nonlocal available
+                claimed.add(task)
+                granted = min(count, available)
+                available -= granted
+                if granted < count:
+                    self.stopped_reason = f"node limit ({self.max_nodes})"
+                return granted
+            return claim
+
+        # Launch a split only while the splits that have not claimed yet could each still get a node.
+        queue = list(frontier)
+        task_by_future: dict[asyncio.Future[list[Task]], Task] = {}
+        running: set[asyncio.Future[list[Task]]] = set()
+        while True:
+            while queue and available > sum(task_by_future[future] not in claimed for future in running):
+                task = queue.pop(0)
+                started = asyncio.ensure_future(self.split(task, claimer(task)))
+                task_by_future[started] = task
+                running.add(started)
+            if not running:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                for future in running:
+                    future.cancel()
+                self.stopped_reason = f"time limit ({self.time_limit}s)"
+                break
+            _, running = await asyncio.wait(running, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        if queue and not self.stopped_reason:
+            self.stopped_reason = f"node limit ({self.max_nodes})"
+
+        # Attach results in frontier order. Which Tasks got the last nodes of the budget depends on completion order.
+        for future, task in task_by_future.items():
+            if not future.done() or future.cancelled():
+                continue
+            exception = future.exception()
+            if exception is not None:
+                task.fail(str(exception))
+                continue
+            subtasks = future.result()
+            task.set_subtasks(subtasks)
+            node_count += len(subtasks)
+
+        return node_count
+
+    def count_nodes(self, tasks: list[Task]) -> int:
+        return sum(1 + self.count_nodes(task.subtasks) for task in tasks)
@@ -0,0 +1,417 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar
+import asyncio
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+T = TypeVar("T")
+
+# USD per 1K tokens as (prompt, completion). Used for the cost estimate only; update when pricing changes.
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.0015, 0.002),
+    "gpt-3.5-turbo-16k": (0.003, 0.004),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+    "text-embedding-ada-002": (0.0001, 0.0),
+}
+
+
+class Span:
+    """
+    A timed phase of the session. Spans opened inside another span become its children.
+    """
+    def __init__(self, span_id: int, name: str, parent_id: Optional[int], thread: int) -> None:
+        self.span_id = span_id
+        self.name = name
+        self.parent_id = parent_id
+        self.thread = thread
+        self.started_at = time.perf_counter()
+        self.ended_at: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.ended_at or time.perf_counter()) - self.started_at
+
+
+class CallRecord:
+    """
+    One BotAgent or Hippocampus call: model, tokens, latency, retries and whether it was served from a cache.
+    """
+    def __init__(self, kind: str, model: str, span: Optional[Span], thread: int) -> None:
+        self.kind = kind
+        self.model = model
+        self.span_id = span.span_id if span else None
+        self.phase = span.name if span else ""
+        self.thread = thread
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.cache_hit = False
+        self.error = ""
+        # Free-form labels such as the routing decision of the call.
+        self.attributes: dict[str, Any] = {}
+        self.started_at = time.perf_counter()
+        self.latency = 0.0
+
+    def add_retry(self) -> None:
+        self.retries += 1
+
+    def set_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    @property
+    def cost(self) -> float:
+        if self.cache_hit:
+            return 0.0
+        prompt_price, completion_price = MODEL_PRICES.get(self.model, (0.0, 0.0))
+        return (self.prompt_tokens * prompt_price + self.completion_tokens * completion_price) / 1000
+
+
+class Telemetry:
+    """
+    Process-wide recorder of calls and phases.
+    Writes a trace in the Chrome trace event format (viewable in chrome://tracing or Perfetto)
+    and a Prometheus text file, and formats a summary table.
+    """
+
+    _shared: Optional[Telemetry] = None
+
+    def __init__(self, directory: str = "telemetry", enabled: bool = True) -> None:
+        self.directory = directory
+        self.enabled = enabled
+        self.spans: list[Span] = []
+        self.calls: list[CallRecord] = []
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._current: ContextVar[Optional[Span]] = ContextVar("telemetry_span", default=None)
+        # Lists opened by collect() in the current context. They receive calls even when telemetry is off.
+        self._collectors: ContextVar[tuple[list[CallRecord], ...]] = ContextVar("telemetry_collectors", default=())
+        # Per output schema: replies parsed, replies that failed to parse, and replies to repair prompts.
+        self.parses: dict[str, dict[str, int]] = {}
+        # Small thread numbers for the trace, one per asyncio task or thread.
+        self._threads: dict[int, int] = {}
+
+    @classmethod
+    def shared(cls) -> Telemetry:
+        """
+        Return the recorder shared by the whole process, configured from the environment.
+        """
+        if cls._shared is None:
+            cls._shared = cls(
+                os.getenv("TELEMETRY_DIR", "telemetry"),
+                os.getenv("TELEMETRY", "on") != "off",
+                )
+        return cls._shared
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[Optional[Span]]:
+        """
+        Time the enclosed block as a span nested in the current one.
+        """
+        if not self.enabled:
+            yield None
+            return
+        parent = self._current.get()
+        span = Span(next(self._ids), name, parent.span_id if parent else None, self._thread())
+        with self._lock:
+            self.spans.append(span)
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            span.ended_at = time.perf_counter()
+            self._current.reset(token)
+
+    @contextmanager
+    def collect(self) -> Iterator[list[CallRecord]]:
+        """
+        Collect the calls made inside the block, including those of tasks it starts, whether or not telemetry is enabled.
+        """
+        records: list[CallRecord] = []
+        token = self._collectors.set(self._collectors.get() + (records,))
+        try:
+            yield records
+        finally:
+            self._collectors.reset(token)
+
+    @contextmanager
+    def call(self, kind: str, model: str) -> Iterator[CallRecord]:
+        """
+        Record the enclosed API call. The caller fills in tokens, retries and cache hits on the record.
+        """
+        record = CallRecord(kind, model, self._current.get(), self._thread())
+        try:
+            yield record
+        except GeneratorExit:
+            # A streaming caller stopped reading early. That is not an error of the call.
+            raise
+        except BaseException as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            record.latency = time.perf_counter() - record.started_at
+            for records in self._collectors.get():
+                records.append(record)
+            if self.enabled:
+                with self._lock:
+                    self.calls.append(record)
+
+    def record_parse(self, schema_name: str, failed: bool, repair: bool) -> None:
+        """
+        Count one structured reply of schema_name, whether it failed to parse, and whether it answered a repair prompt.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            counts = self.parses.setdefault(schema_name, {"replies": 0, "failures": 0, "repairs": 0, "repaired": 0})
+            counts["replies"] += 1
+            counts["failures"] += failed
+            counts["repairs"] += repair
+            counts["repaired"] += repair and not failed
+
+    def parse_failure_rate(self) -> float:
+        with self._lock:
+            replies = sum(counts["replies"] for counts in self.parses.values())
+            failures = sum(counts["failures"] for counts in self.parses.values())
+        return failures / replies if replies else 0.0
+
+    def format_parse_summary(self) -> str:
+        """
+        Format the parse failures per output schema. Returns an empty string if nothing was parsed.
+        """
+        with self._lock:
+            parses = {name: dict(counts) for name, counts in self.parses.items()}
+        if not parses:
+            return ""
+        lines = [f"{'schema':<24}{'replies':>8}{'failed':>8}{'rate':>7}{'repairs':>8}{'repaired':>9}"]
+        for name, counts in parses.items():
+            rate = counts["failures"] / counts["replies"]
+            lines.append(f"{name:<24}{counts['replies']:>8}{counts['failures']:>8}{rate:>7.1%}{counts['repairs']:>8}{counts['repaired']:>9}")
+        lines.append(f"Overall parse failure rate: {self.parse_failure_rate():.1%}")
+        return "\n".join(lines)
+
+    def _thread(self) -> int:
+        try:
+            key = id(asyncio.current_task())
+        except RuntimeError:
+            key = threading.get_ident()
+        with self._lock:
+            return self._threads.setdefault(key, len(self._threads) + 1)
+
+    def summary_rows(self) -> list[dict[str, Any]]:
+        """
+        Per phase: number of spans, total span time, and the calls made directly inside it.
+        """
+        rows: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            spans = list(self.spans)
+            calls = list(self.calls)
+        for span in spans:
+            row = rows.setdefault(span.name, self._empty_row(span.name))
+            row["spans"] += 1
+            row["seconds"] += span.duration
+        for record in calls:
+            row = rows.setdefault(record.phase or "-", self._empty_row(record.phase or "-"))
+            row["calls"] += 1
+            row["cache_hits"] += record.cache_hit
+            row["retries"] += record.retries
+            row["tokens"] += record.prompt_tokens + record.completion_tokens
+            row["latency"] += record.latency
+            row["cost"] += record.cost
+        return list(rows.values())
+
+    @staticmethod
+    def usage(records: list[CallRecord]) -> dict[str, Any]:
+        """
+        Calls, tokens and cost of the records.
+        """
+        usage: dict[str, Any] = {"calls": 0, "tokens": 0, "cost": 0.0}
+        for record in records:
+            usage["calls"] += 1
+            usage["tokens"] += record.prompt_tokens + record.completion_tokens
+            usage["cost"] += record.cost
+        return usage
+
+    def _empty_row(self, name: str) -> dict[str, Any]:
+        return {"phase": name, "spans": 0, "seconds": 0.0, "calls": 0, "cache_hits": 0, "retries": 0, "tokens": 0, "latency": 0.0, "cost": 0.0}
+
+    def format_summary(self) -> str:
+        """
+        Format the summary as a fixed-width table.
+        """
+        lines = [f"{'phase':<12}{'spans':>6}{'time(s)':>9}{'calls':>7}{'cached':>7}{'retries':>8}{'tokens':>9}{'latency(s)':>11}{'cost($)':>9}"]
+        for row in self.summary_rows():
+            lines.append(
+                f"{row['phase']:<12}{row['spans']:>6}{row['seconds']:>9.2f}{row['calls']:>7}{row['cache_hits']:>7}"
+                f"{row['retries']:>8}{row['tokens']:>9}{row['latency']:>11.2f}{row['cost']:>9.4f}"
+            )
+        return "\n".join(lines)
+
+    def format_routing_summary(self, reference_model: str) -> str:
+        """
+        Format the routed calls per call type, tier and model, with the cost they would have had on reference_model.
+        Returns an empty string if no call was routed.
+        """
+        rows: dict[tuple[str, str, str], dict[str, Any]] = {}
+        with self._lock:
+            calls = [record for record in self.calls if "call_type" in record.attributes]
+        if not calls:
+            return ""
+        reference_prices = MODEL_PRICES.get(reference_model, (0.0, 0.0))
+        for record in calls:
+            key = (record.attributes["call_type"], record.attributes.get("tier", ""), record.model)
+            row = rows.setdefault(key, {"calls": 0, "escalated": 0, "latency": 0.0, "cost": 0.0, "reference_cost": 0.0})
+            row["calls"] += 1
+            row["escalated"] += record.attributes.get("escalation", 0) > 0
+            row["latency"] += record.latency
+            row["cost"] += record.cost
+            if not record.cache_hit:
+                row["reference_cost"] += (record.prompt_tokens * reference_prices[0] + record.completion_tokens * reference_prices[1]) / 1000
+
+        lines = [f"{'call type':<18}{'tier':<10}{'model':<16}{'calls':>6}{'escalated':>10}{'avg(s)':>8}{'cost($)':>9}{'saved($)':>9}"]
+        for (call_type, tier, model), row in rows.items():
+            lines.append(
+                f"{call_type:<18}{tier:<10}{model:<16}{row['calls']:>6}{row['escalated']:>10}"
+                f"{row['latency'] / row['calls']:>8.2f}{row['cost']:>9.4f}{row['reference_cost'] - row['cost']:>9.4f}"
+            )
+        lines.append(f"saved($) is relative to sending the same calls to {reference_model}.")
+        return "\n".join(lines)
+
+    def export(self, name: str) -> list[str]:
+        """
+        Write the trace to <directory>/<name>.trace.json and the metrics to <directory>/metrics.prom.
+        Returns the written paths.
+        """
+        if not self.enabled:
+            return []
+        os.makedirs(self.directory, exist_ok=True)
+        trace_path = os.path.join(self.directory, name + ".trace.json")
+        metrics_path = os.path.join(self.directory, "metrics.prom")
+        self._write_atomically(trace_path, json.dumps(self.trace(), ensure_ascii=False))
+        self._write_atomically(metrics_path, self.prometheus_text())
+        return [trace_path, metrics_path]
+
+    def trace(self) -> dict[str, Any]:
+        """
+        Spans and calls as complete ("X") events of the Chrome trace event format, in microseconds.
+        """
+        def micros(value: float) -> int:
+            return int((value - self.started_at) * 1_000_000)
+
+        events: list[dict[str, Any]] = []
+        with self._lock:
+            spans = list(self.spans)
+            calls = list(self.calls)
+        for span in spans:
+            events.append({
+                "name": span.name, "cat": "phase", "ph": "X", "pid": 1, "tid": span.thread,
+                "ts": micros(span.started_at), "dur": int(span.duration * 1_000_000),
+                "args": {"id": span.span_id, "parent": span.parent_id},
+            })
+        for record in calls:
+            events.append({
+                "name": record.kind, "cat": "call", "ph": "X", "pid": 1, "tid": record.thread,
+                "ts": micros(record.started_at), "dur": int(record.latency * 1_000_000),
+                "args": {
+                    "model": record.model, "span": record.span_id,
+                    "prompt_tokens": record.prompt_tokens, "completion_tokens": record.completion_tokens,
+                    "retries": record.retries, "cache_hit": record.cache_hit, "error": record.error,
+                    "cost": record.cost, **record.attributes,
+                },
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def prometheus_text(self) -> str:
+        """
+        Counters and summaries in the Prometheus text exposition format.
+        """
+        counters: dict[str, dict[tuple[tuple[str, str], ...], float]] = {}
+
+        def add(metric: str, labels: dict[str, str], value: float) -> None:
+            series = counters.setdefault(metric, {})
+            key = tuple(sorted(labels.items()))
+            series[key] = series.get(key, 0.0) + value
+
+        with self._lock:
+            spans = list(self.spans)
+            calls = list(self.calls)
+        for record in calls:
+            labels = {"kind": record.kind, "model": record.model, "phase": record.phase}
+            add("autoevolver_api_calls_total", {**labels, "cache": "hit" if record.cache_hit else "miss"}, 1)
+            add("autoevolver_api_tokens_total", {**labels, "type": "prompt"}, record.prompt_tokens)
+            add("autoevolver_api_tokens_total", {**labels, "type": "completion"}, record.completion_tokens)
+            add("autoevolver_api_retries_total", labels, record.retries)
+            add("autoevolver_api_errors_total", labels, 1 if record.error else 0)
+            add("autoevolver_api_cost_dollars_total", labels, record.cost)
+            add("autoevolver_api_latency_seconds_sum", labels, record.latency)
+            add("autoevolver_api_latency_seconds_count", labels, 1)
+            if "call_type" in record.attributes:
+                route = {"call_type": record.attributes["call_type"], "tier": record.attributes.get("tier", ""), "model": record.model}
+                add("autoevolver_route_calls_total", route, 1)
+                add("autoevolver_route_escalations_total", route, 1 if record.attributes.get("escalation", 0) > 0 else 0)
+        with self._lock:
+            parses = {name: dict(counts) for name, counts in self.parses.items()}
+        for name, counts in parses.items():
+            add("autoevolver_structured_replies_total", {"schema": name}, counts["replies"])
+            add("autoevolver_structured_parse_failures_total", {"schema": name}, counts["failures"])
+            add("autoevolver_structured_repairs_total", {"schema": name}, counts["repairs"])
+        for span in spans:
+            add("autoevolver_phase_seconds_sum", {"phase": span.name}, span.duration)
+            add("autoevolver_phase_seconds_count", {"phase": span.name}, 1)
+
+        descriptions = {
+            "autoevolver_api_calls_total": ("counter", "API calls by kind, model, phase and cache result."),
+            "autoevolver_api_tokens_total": ("counter", "Prompt and completion tokens."),
+            "autoevolver_api_retries_total": ("counter", "Retries of transient API errors."),
+            "autoevolver_api_errors_total": ("counter", "Calls that ended with an error."),
+            "autoevolver_api_cost_dollars_total": ("counter", "Estimated cost in USD."),
+            "autoevolver_api_latency_seconds": ("summary", "Latency of API calls including queueing and retries."),
+            "autoevolver_phase_seconds": ("summary", "Duration of session phases."),
+            "autoevolver_route_calls_total": ("counter", "Routed calls by call type, tier and model."),
+            "autoevolver_route_escalations_total": ("counter", "Routed calls that escalated from a cheaper tier."),
+            "autoevolver_structured_replies_total": ("counter", "Structured replies parsed, by output schema."),
+            "autoevolver_structured_parse_failures_total": ("counter", "Structured replies that did not match their schema."),
+            "autoevolver_structured_repairs_total": ("counter", "Replies to repair prompts."),
+        }
+        lines = []
+        for base, (metric_type, description) in descriptions.items():
+            names = [base] if metric_type == "counter" else [base + "_sum", base + "_count"]
+            if not any(name in counters for name in names):
+                continue
+            lines.append(f"# HELP {base} {description}")
+            lines.append(f"# TYPE {base} {metric_type}")
+            for name in names:
+                for key, value in counters.get(name, {}).items():
+                    label_text = ",".join(f'{label}="{self._escape(text)}"' for label, text in key)
+                    lines.append(f"{name}{{{label_text}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def _escape(self, text: str) -> str:
+        return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def _write_atomically(self, path: str, text: str) -> None:
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+
+
+def traced(name: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """
+    Decorator that runs a coroutine function inside a span of the shared Telemetry.
+    """
+    def decorator(function: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(function)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with Telemetry.shared().span(name):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,32 @@
+from functools import lru_cache
+from typing import Any, Optional
+
+# モデル名から、そのエンコーディング。tiktokenは初めて数える時に読み込む。
+_encodings: dict[str, Optional[Any]] = {}
+
+
+def _get_encoding(model: str) -> Optional[Any]:
+    if model not in _encodings:
+        try:
+            import tiktoken
+        except ImportError:
+            _encodings[model] = None
+            return None
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    textのトークン数をローカルで数える。
+    tiktokenが無い環境では、4文字で1トークンとして概算する。
+    セッション共通の前置きのように、同じテキストは何度も数え直さない。
+    """
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
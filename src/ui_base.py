@@ -21,4 +21,18 @@ class UIBase(ABC):
         """
         待機中にUIを固まらせないためにコールする
         """
-        pass
\ No newline at end of file
+        pass
+
+    def print_partial_message(self, message: ChatMessage, chunk: str) -> None:
+        """
+        ストリーミング中のチャットメッセージに、届いたchunkを追記表示する。
+        message.textはchunkを含むここまでの全文。
+        既定では何もせず、finish_partial_messageでまとめて表示する。
+        """
+        pass
+
+    def finish_partial_message(self, message: ChatMessage) -> None:
+        """
+        ストリーミングが終わったチャットメッセージを確定する。
+        """
+        self.print_message(message)
@@ -0,0 +1,157 @@
+from .module_runner import RunResult
+from typing import Any, Optional
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+# 温めておくモジュール。WARM_PRELOADにカンマ区切りで指定すると差し替えられる。
+# 生成されたモジュールは実行の間に書き換わるので、読み込んでおかない。
+DEFAULT_PRELOAD = [
+    "asyncio", "collections", "dataclasses", "datetime", "functools", "itertools", "json",
+    "math", "os", "pathlib", "random", "re", "subprocess", "sys", "typing",
+    # 生成されたモジュールがabilities.txtの機能を使うために読み込む、このプロジェクトのモジュールと、その重い依存。
+    # 依存は使う時に読み込まれるので、ここで先に読み込む。入っていないものは読み飛ばされる。
+    "src.bot_agent", "src.hippocampus", "src.file_reader", "src.log_writer", "src.role",
+    "openai", "numpy", "tiktoken", "src.local_vector_index",
+]
+
+
+class WarmInterpreterPool:
+    """
+    よく使うモジュールを読み込み済みの親インタプリタを立ち上げておき、
+    実行のたびにそこからforkしてモジュールを実行する。POSIXでのみ使える。
+    子プロセスは実行ごとに独立しているので、実行同士が影響し合うことはない。
+    出力はファイルに書かれ、実行が終わってからまとめて返る。
+    """
+
+    def __init__(self, preload: Optional[list[str]] = None) -> None:
+        if os.name != "posix":
+            raise OSError("WarmInterpreterPool requires fork().")
+        if preload is None:
+            configured = os.getenv("WARM_PRELOAD", "")
+            preload = [name.strip() for name in configured.split(",") if name.strip()] if configured else DEFAULT_PRELOAD
+        self.preload = preload
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.output_dir = tempfile.mkdtemp(prefix="auto_evolver_runs_")
+        self._ids = itertools.count()
+        self._started: dict[str, asyncio.Future[int]] = {}
+        self._exited: dict[str, asyncio.Future[dict[str, Any]]] = {}
+        self._reader: Optional[asyncio.Task[None]] = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """
+        親インタプリタを起動し、読み込みが終わるまで待つ。
+        """
+        async with self._start_lock:
+            if self.process:
+                return
+            repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "src.warm_worker", *self.preload,
+                cwd=repo_path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+            )
+            assert process.stdout
+            ready = await process.stdout.readline()
+            if not ready or json.loads(ready).get("event") != "ready":
+                raise RuntimeError("The warm interpreter did not start.")
+            self.process = process
+            self._reader = asyncio.ensure_future(self._read_events())
+
+    async def close(self) -> None:
+        if not self.process:
+            return
+        assert self.process.stdin
+        self.process.stdin.close()
+        await self.process.wait()
+        if self._reader:
+            await self._reader
+        self.process = None
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    async def _read_events(self) -> None:
+        assert self.process and self.process.stdout
+        async for line in self.process.stdout:
+            event = json.loads(line)
+            request_id = event["id"]
+            if event["event"] == "started":
+                self._started.pop(request_id).set_result(event["pid"])
+            elif event["event"] == "exited":
+                self._exited.pop(request_id).set_result(event)
+        # 親インタプリタが落ちた場合、待っている実行を全て失敗させる。
+        futures: list[asyncio.Future[Any]] = [*self._started.values(), *self._exited.values()]
+        for future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError("The warm interpreter exited."))
+
+    async def run(self, module_name: str, directory: str, timeout: Optional[float] = None, memory_limit: Optional[int] = None, cpu_limit: Optional[int] = None) -> RunResult:
+        """
+        温まった親からforkして、指定したモジュールを実行する。
+        """
+        await self.start()
+        assert self.process and self.process.stdin
+
+        loop = asyncio.get_running_loop()
+        request_id = str(next(self._ids))
+        stdout_path = os.path.join(self.output_dir, f"{request_id}.out")
+        stderr_path = os.path.join(self.output_dir, f"{request_id}.err")
+        started: asyncio.Future[int] = loop.create_future()
+        exited: asyncio.Future[dict[str, Any]] = loop.create_future()
+        self._started[request_id] = started
+        self._exited[request_id] = exited
+
+        started_at = time.monotonic()
+        request = {
+            "id": request_id,
+            "module": module_name,
+            "cwd": os.path.abspath(directory),
+            "stdout": stdout_path,
+            "stderr": stderr_path,
+            "memory_limit": memory_limit,
+            "cpu_limit": cpu_limit,
+        }
+        self.process.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+        await self.process.stdin.drain()
+        pid = await started
+
+        timed_out = False
+        try:
+            result = await asyncio.wait_for(asyncio.shield(exited), timeout=timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            result = await exited
+        duration = time.monotonic() - started_at
+
+        stdout = self._read_and_remove(stdout_path)
+        stderr = self._read_and_remove(stderr_path)
+        return RunResult(
+            module_name,
+            None if timed_out else result["exit_code"],
+            duration,
+            result["peak_rss"],
+            stdout,
+            stderr,
+            timed_out,
+        )
+
+    def _read_and_remove(self, path: str) -> str:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
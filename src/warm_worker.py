@@ -0,0 +1,145 @@
+"""
+WarmInterpreterPoolが起動する、温まった親インタプリタ。
+よく使うモジュールを読み込んだ状態で待機し、実行要求のたびにforkして子プロセスでモジュールを実行する。
+
+標準入力から1行1件のJSONで要求を受け取り、標準出力へ1行1件のJSONで結果を返す。
+    要求: {"id", "module", "cwd", "stdout", "stderr", "memory_limit", "cpu_limit"}
+    結果: {"id", "event": "started", "pid"} と {"id", "event": "exited", "exit_code", "peak_rss"}
+"""
+from typing import Any
+import importlib
+import json
+import os
+import runpy
+import selectors
+import signal
+import sys
+import traceback
+
+
+def preload(module_names: list[str]) -> None:
+    for module_name in module_names:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            # 読み込めないモジュールは、実行時に子プロセスで読み込めばよい。
+            pass
+
+
+def send(message: dict[str, Any]) -> None:
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def run_child(request: dict[str, Any]) -> None:
+    """
+    fork後の子プロセスで、要求されたモジュールを実行して終了する。
+    """
+    exit_code = 0
+    try:
+        os.setsid()
+        # 親の終了通知の設定は、実行するモジュールに引き継がない。
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        import resource
+        if request.get("memory_limit"):
+            resource.setrlimit(resource.RLIMIT_AS, (request["memory_limit"], request["memory_limit"]))
+        if request.get("cpu_limit"):
+            resource.setrlimit(resource.RLIMIT_CPU, (request["cpu_limit"], request["cpu_limit"]))
+
+        # 親との通信路を閉じ、出力を要求されたファイルへ向ける。
+        null_fd = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null_fd, 0)
+        stdout_fd = os.open(request["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        stderr_fd = os.open(request["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", buffering=1, closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+
+        os.chdir(request["cwd"])
+        sys.path[0] = request["cwd"]
+        sys.argv = [request["module"]]
+        importlib.invalidate_caches()
+        runpy.run_module(request["module"], run_name="__main__", alter_sys=True)
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def main() -> None:
+    preload([name for name in sys.argv[1:] if name])
+    send({"event": "ready"})
+
+    running: dict[int, str] = {}
+    selector = selectors.DefaultSelector()
+    stdin_fd = sys.stdin.fileno()
+    selector.register(stdin_fd, selectors.EVENT_READ)
+    # 子プロセスの終了はSIGCHLDで知る。シグナルはwakeup_fdのパイプに書かれるので、
+    # 要求と同じselectで、時間を区切らずに待てる。
+    wakeup_read, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_read, False)
+    os.set_blocking(wakeup_write, False)
+    signal.set_wakeup_fd(wakeup_write)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    selector.register(wakeup_read, selectors.EVENT_READ)
+    stdin_open = True
+    buffer = b""
+
+    while stdin_open or running:
+        ready = {key.fd for key, _ in selector.select()}
+        if wakeup_read in ready:
+            try:
+                while os.read(wakeup_read, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+        # 要求は、届いた分を全て行に分けて処理する。
+        if stdin_fd in ready and stdin_open:
+            data = os.read(stdin_fd, 65536)
+            if not data:
+                stdin_open = False
+                selector.unregister(stdin_fd)
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                pid = os.fork()
+                if pid == 0:
+                    run_child(request)
+                running[pid] = request["id"]
+                send({"id": request["id"], "event": "started", "pid": pid})
+
+        # 終了した子プロセスを回収する。wait4で子ごとの最大常駐メモリも得られる。
+        while running:
+            pid, status, usage = os.wait4(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            request_id = running.pop(pid, None)
+            if request_id is None:
+                continue
+            exit_code = os.waitstatus_to_exitcode(status)
+            peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+            send({"id": request_id, "event": "exited", "exit_code": exit_code, "peak_rss": peak_rss})
+
+
+if __name__ == "__main__":
+    main()
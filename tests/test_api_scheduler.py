@@ -0,0 +1,51 @@
+import asyncio
+
+from src.api_scheduler import ApiScheduler, Priority
+
+
+async def acquire_under_contention(scheduler: ApiScheduler, count: int) -> None:
+    # With an empty request bucket, every call but the first waits on the condition.
+    scheduler.request_bucket.available = 0
+    await asyncio.gather(*(scheduler.acquire(1, Priority.normal) for _ in range(count)))
+
+
+def test_acquire_in_consecutive_event_loops() -> None:
+    scheduler = ApiScheduler(requests_per_minute=6000, tokens_per_minute=1_000_000)
+    asyncio.run(acquire_under_contention(scheduler, 3))
+    asyncio.run(acquire_under_contention(scheduler, 3))
+    assert scheduler.dispatched == 6
+    assert scheduler.queue_depth == 0
+
+
+def test_acquire_dispatches_by_priority() -> None:
+    scheduler = ApiScheduler(requests_per_minute=6000, tokens_per_minute=1_000_000)
+    order: list[Priority] = []
+
+    async def call(priority: Priority) -> None:
+        await scheduler.acquire(1, priority)
+        order.append(priority)
+
+    async def main() -> None:
+        scheduler.request_bucket.available = 0
+        await asyncio.gather(call(Priority.background), call(Priority.interactive))
+
+    asyncio.run(main())
+    assert order == [Priority.interactive, Priority.background]
+
+
+def test_run_retries_transient_errors() -> None:
+    scheduler = ApiScheduler(requests_per_minute=6000, tokens_per_minute=1_000_000, base_delay=0.0)
+    attempts = 0
+
+    class RateLimitError(Exception):
+        pass
+
+    async def call() -> str:
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise RateLimitError()
+        return "ok"
+
+    assert asyncio.run(scheduler.run(call, 1)) == "ok"
+    assert scheduler.retries == 2
@@ -0,0 +1,44 @@
+import asyncio
+from typing import Any, Optional
+
+from src.bot_agent import BotAgent
+from src.structured_output import OutputSchema
+
+
+def summarizing_agent(token_budget: int, summaries: list[list[dict[str, str]]]) -> BotAgent:
+    """
+    An agent whose completions record the messages they were asked to summarize and answer "short summary".
+    """
+    agent = BotAgent(token_budget=token_budget)
+
+    async def acomplete(messages: list[dict[str, str]], model: str, use_cache: bool, labels: Optional[dict[str, Any]] = None, schema: Optional[OutputSchema[Any]] = None, store: bool = True) -> str:
+        summaries.append(messages)
+        return "short summary"
+
+    agent._acomplete = acomplete  # type: ignore[method-assign]
+    return agent
+
+
+def test_old_messages_are_summarized_and_recent_ones_kept() -> None:
+    summaries: list[list[dict[str, str]]] = []
+    agent = summarizing_agent(100, summaries)
+    for i in range(10):
+        agent.add_context(f"message {i} " + "word " * 20)
+
+    asyncio.run(agent._afit_context("gpt-3.5-turbo"))
+
+    assert len(summaries) == 1
+    assert agent.context[0]["content"] == BotAgent.SUMMARY_PREFIX + "short summary"
+    assert agent.context[-1]["content"].startswith("message 9 ")
+    assert agent.context_tokens <= 100
+    assert agent.context_tokens == sum(agent._message_tokens(message) for message in agent.context)
+
+
+def test_context_within_the_budget_is_left_alone() -> None:
+    summaries: list[list[dict[str, str]]] = []
+    agent = summarizing_agent(1000, summaries)
+    agent.add_context("hello")
+
+    asyncio.run(agent._afit_context("gpt-3.5-turbo"))
+    assert summaries == []
+    assert [message["content"] for message in agent.context] == ["hello"]
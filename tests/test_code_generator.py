@@ -0,0 +1,37 @@
+import os
+import stat
+from pathlib import Path
+
+import pytest
+
+from src.code_generator import CodeGenerator, InvalidModuleError
+
+
+def test_validate_reply_extracts_the_python_block() -> None:
+    reply = "Here is the module.\n```python\nprint('hello')\n```\nDone."
+    assert CodeGenerator().validate_reply("hello.py", reply) == ("\nprint('hello')\n", "", None)
+
+
+def test_validate_reply_reports_syntax_errors_with_their_line() -> None:
+    source_code, error, line = CodeGenerator().validate_reply("broken.py", "```\nx = 1\ndef f(:\n```")
+    assert error.startswith("SyntaxError")
+    assert line == 3
+
+
+def test_validate_reply_rejects_empty_replies() -> None:
+    assert CodeGenerator().validate_reply("empty.py", "```python\n\n```")[1] == "No source code was found."
+
+
+def test_generate_modules_writes_only_valid_modules(tmp_path: Path) -> None:
+    results = CodeGenerator().generate_modules([("good.py", "x = 1\n"), ("bad.py", "x = (\n")], str(tmp_path))
+
+    assert [result.ok for result in results] == [True, False]
+    assert (tmp_path / "good.py").read_text(encoding="utf-8") == "x = 1\n"
+    assert stat.S_IMODE(os.stat(tmp_path / "good.py").st_mode) == 0o644
+    assert sorted(os.listdir(tmp_path)) == ["good.py"]
+
+
+def test_generate_module_raises_for_invalid_code(tmp_path: Path) -> None:
+    with pytest.raises(InvalidModuleError):
+        CodeGenerator().generate_module("bad.py", "def f(:\n", str(tmp_path))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,38 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from src.embedding_cache import EmbeddingCache
+
+
+def test_vectors_round_trip_per_model(tmp_path: Path) -> None:
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    cache.set_many("model-a", ["hello", "world"], [[0.5, 1.0], [0.25, -2.0]])
+
+    assert cache.get_many("model-a", ["world", "missing", "hello"]) == [[0.25, -2.0], None, [0.5, 1.0]]
+    assert cache.get_many("model-b", ["hello"]) == [None]
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_hippocampus_embeds_only_uncached_texts_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    openai = pytest.importorskip("openai")
+    from src.hippocampus import Hippocampus
+
+    monkeypatch.setenv("VECTOR_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_VECTOR_DIR", str(tmp_path / "memory"))
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "embeddings.sqlite3"))
+    requests: list[list[str]] = []
+
+    class Embedding:
+        @staticmethod
+        def create(input: list[str], model: str) -> dict[str, Any]:
+            requests.append(list(input))
+            return {"data": [{"index": i, "embedding": [float(len(text)), 1.0]} for i, text in enumerate(input)]}
+
+    monkeypatch.setattr(openai, "Embedding", Embedding, raising=False)
+    hippocampus = Hippocampus()
+
+    assert hippocampus.text_to_vectors(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert hippocampus.text_to_vectors(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert requests == [["a", "bb"], ["ccc"]]
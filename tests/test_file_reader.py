@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src.file_reader import FileIndex, FileReader
+
+
+def write(path: Path, text: str = "") -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_nested_runtime_directory_names_are_indexed(tmp_path: Path) -> None:
+    write(tmp_path / "src" / "cache" / "foo.py")
+    write(tmp_path / "src" / "log" / "bar.txt")
+    write(tmp_path / "docs" / ".drafts" / "note.md")
+    reader = FileReader(str(tmp_path))
+
+    assert reader.find_file_path("foo.py") == str(tmp_path / "src" / "cache" / "foo.py")
+    assert reader.find_file_path("bar.txt", "src") == str(tmp_path / "src" / "log" / "bar.txt")
+    assert reader.find_file_path("note.md", "docs") == str(tmp_path / "docs" / ".drafts" / "note.md")
+    assert reader.find_file_list("src/cache") == ["foo.py"]
+
+
+def test_top_level_runtime_directories_are_searched_directly(tmp_path: Path) -> None:
+    write(tmp_path / "log" / "session.jsonl")
+    reader = FileReader(str(tmp_path))
+
+    assert "session.jsonl" not in reader.get_index("").paths_by_name
+    assert reader.find_file_path("session.jsonl", "log") == str(tmp_path / "log" / "session.jsonl")
+    assert reader.find_file_list("log") == ["session.jsonl"]
+
+
+def test_changed_directory_makes_the_index_stale(tmp_path: Path) -> None:
+    write(tmp_path / "documents" / "a.txt")
+    write(tmp_path / "other" / "b.txt")
+    index = FileIndex(str(tmp_path))
+    assert not index.is_stale(str(tmp_path / "documents"))
+
+    write(tmp_path / "other" / "c.txt")
+    stat = os.stat(tmp_path / "other")
+    os.utime(tmp_path / "other", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    # Only the subtree being searched is checked.
+    assert not index.is_stale(str(tmp_path / "documents"))
+    assert index.is_stale(str(tmp_path / "other"))
+    assert index.is_stale(str(tmp_path))
+
+
+def test_new_file_is_found_within_the_check_interval(tmp_path: Path) -> None:
+    write(tmp_path / "documents" / "a.txt")
+    reader = FileReader(str(tmp_path))
+    reader.find_file_path("a.txt", "documents")
+
+    write(tmp_path / "documents" / "b.txt", "new")
+    # A miss rebuilds the index even though the directory was checked less than CHECK_INTERVAL ago.
+    assert reader.read_file("b.txt", "documents") == "new"
+    with pytest.raises(FileNotFoundError):
+        reader.find_file_path("missing.txt", "documents")
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from src.local_vector_index import LocalVectorIndex
+
+
+def vector(*values: float) -> list[float]:
+    return list(values) + [0.0] * (4 - len(values))
+
+
+def test_query_returns_the_nearest_by_cosine(tmp_path: Path) -> None:
+    index = LocalVectorIndex(str(tmp_path), 4)
+    index.upsert([{"id": "x", "values": vector(1)}, {"id": "y", "values": vector(0, 2)}, {"id": "xy", "values": vector(1, 1)}])
+
+    matches = index.query(vector(3, 0.1), top_k=2).matches
+    assert [match.id for match in matches] == ["x", "xy"]
+    assert abs(matches[0].score - 0.9994) < 0.001
+
+
+def test_namespaces_are_separate(tmp_path: Path) -> None:
+    index = LocalVectorIndex(str(tmp_path), 4)
+    index.upsert([{"id": "x", "values": vector(1)}], namespace="a")
+
+    assert index.query(vector(1), namespace="b").matches == []
+    assert [match.id for match in index.query(vector(1), namespace="a").matches] == ["x"]
+
+
+def test_upsert_grows_deletes_and_persists(tmp_path: Path) -> None:
+    index = LocalVectorIndex(str(tmp_path), 4)
+    # More rows than the initial capacity of 16.
+    index.upsert([{"id": f"v{i}", "values": vector(1, i)} for i in range(40)])
+    index.upsert([{"id": "v0", "values": vector(0, 0, 1)}])
+    index.delete(ids=["v1", "v2"])
+
+    reopened = LocalVectorIndex(str(tmp_path), 4)
+    assert [match.id for match in reopened.query(vector(0, 0, 1)).matches] == ["v0"]
+    assert len(reopened.query(vector(1), top_k=100).matches) == 38
+    reopened.delete(delete_all=True)
+    assert reopened.query(vector(1)).matches == []
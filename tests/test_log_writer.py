@@ -0,0 +1,43 @@
+import json
+from pathlib import Path
+
+from src.log_writer import JsonlLogWriter, convert_jsonl_to_json
+
+
+def read_lines(path: Path) -> list[dict[str, object]]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_flush_writes_pending_records(tmp_path: Path) -> None:
+    # The interval and size are large enough that nothing would be written without flush.
+    writer = JsonlLogWriter(str(tmp_path / "session.jsonl"), flush_bytes=1 << 20, flush_interval=60)
+    try:
+        writer.write({"text": "こんにちは"})
+        writer.write({"text": "second"})
+        writer.flush()
+        assert read_lines(tmp_path / "session.jsonl") == [{"text": "こんにちは"}, {"text": "second"}]
+    finally:
+        writer.close()
+
+
+def test_close_writes_the_rest_and_drops_later_records(tmp_path: Path) -> None:
+    writer = JsonlLogWriter(str(tmp_path / "session.jsonl"), flush_interval=60)
+    writer.write({"text": "before"})
+    writer.close()
+    writer.write({"text": "after"})
+    writer.close()
+
+    assert read_lines(tmp_path / "session.jsonl") == [{"text": "before"}]
+
+
+def test_rotated_and_compressed_files_convert_back(tmp_path: Path) -> None:
+    writer = JsonlLogWriter(str(tmp_path / "session.jsonl"), max_bytes=100, flush_bytes=1, compress=True)
+    records = [{"index": i, "text": "x" * 40} for i in range(6)]
+    for record in records:
+        writer.write(record)
+    writer.close()
+
+    assert len(writer.paths) > 1
+    assert all(path.endswith(".gz") for path in writer.paths[:-1])
+    convert_jsonl_to_json(writer.paths, str(tmp_path / "session.json"))
+    assert json.loads((tmp_path / "session.json").read_text(encoding="utf-8")) == records
@@ -0,0 +1,77 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from src.module_runner import ModuleRunner, RunResult
+from src.warm_interpreter_pool import WarmInterpreterPool
+
+
+def write_module(directory: Path, name: str, source: str) -> None:
+    (directory / f"{name}.py").write_text(source, encoding="utf-8")
+
+
+def test_lines_longer_than_the_stream_limit(tmp_path: Path) -> None:
+    write_module(tmp_path, "long_line", "print('x' * 200_000)\nprint('end')\n")
+    lines: list[str] = []
+    result = asyncio.run(ModuleRunner().arun_module("long_line", str(tmp_path), lambda _, name, line: lines.append(line)))
+    assert result.succeeded
+    assert result.stdout == "x" * 200_000 + "\nend\n"
+    assert lines == ["x" * 200_000 + "\n", "end\n"]
+
+
+def test_exit_code_and_stderr(tmp_path: Path) -> None:
+    write_module(tmp_path, "failing", "import sys\nprint('oops', file=sys.stderr, end='')\nsys.exit(3)\n")
+    result = asyncio.run(ModuleRunner().arun_module("failing", str(tmp_path)))
+    assert result.exit_code == 3
+    assert not result.timed_out
+    assert result.stderr == "oops"
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the child is started with sleep")
+def test_child_holding_the_pipe_is_not_a_timeout(tmp_path: Path) -> None:
+    write_module(tmp_path, "leaves_child", "import subprocess\nsubprocess.Popen(['sleep', '30'])\nprint('done')\n")
+    result = asyncio.run(ModuleRunner(timeout=10).arun_module("leaves_child", str(tmp_path)))
+    assert not result.timed_out
+    assert result.exit_code == 0
+    assert result.stdout == "done\n"
+    assert result.duration < 5
+
+
+def test_timeout(tmp_path: Path) -> None:
+    write_module(tmp_path, "sleeper", "import time\nprint('started', flush=True)\ntime.sleep(30)\n")
+    result = asyncio.run(ModuleRunner(timeout=0.5).arun_module("sleeper", str(tmp_path)))
+    assert result.timed_out
+    assert result.exit_code is None
+    assert result.stdout == "started\n"
+
+
+async def run_warm(directory: Path, module_names: list[str], timeout: float = 10) -> list[RunResult]:
+    pool = WarmInterpreterPool(["json"])
+    try:
+        runner = ModuleRunner(timeout=timeout, warm_pool=pool)
+        return [await runner.arun_module(name, str(directory)) for name in module_names]
+    finally:
+        await pool.close()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the warm pool needs fork()")
+def test_warm_runs_are_isolated(tmp_path: Path) -> None:
+    write_module(tmp_path, "first", "import json\njson.marker = 1\nprint('first')\n")
+    write_module(tmp_path, "second", "import json, sys\nprint(hasattr(json, 'marker'), file=sys.stderr, end='')\nsys.exit(2)\n")
+    first, second = asyncio.run(run_warm(tmp_path, ["first", "second"]))
+
+    assert (first.exit_code, first.stdout) == (0, "first\n")
+    # The change the first run made to a preloaded module is not seen by the second.
+    assert (second.exit_code, second.stderr) == (2, "False")
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the warm pool needs fork()")
+def test_warm_run_timeout(tmp_path: Path) -> None:
+    write_module(tmp_path, "sleeper", "import time\ntime.sleep(30)\n")
+    result, = asyncio.run(run_warm(tmp_path, ["sleeper"], timeout=0.5))
+
+    assert result.timed_out
+    assert result.exit_code is None
+    assert result.duration < 5
@@ -0,0 +1,30 @@
+import pytest
+
+from src.prompt_templates import PromptTemplate
+from src.session_prompts import PROMPTS
+
+
+def test_indentation_and_surrounding_blank_lines_are_removed() -> None:
+    template = PromptTemplate("greeting", """
+        Hello, {name}.
+            Bye.   
+        """)
+
+    assert template.text == "Hello, {name}.\nBye."
+    assert template.fields == ["name"]
+    assert template.render(name="Ann") == "Hello, Ann.\nBye."
+
+
+def test_missing_values_raise() -> None:
+    with pytest.raises(KeyError):
+        PromptTemplate("greeting", "Hello, {name}.").render()
+
+
+def test_prefix_holds_only_the_objective_and_context() -> None:
+    prefix = PROMPTS.render("prefix", objective="Make a game", context="Use Python")
+
+    assert PROMPTS.get("prefix").fields == ["objective", "context"]
+    assert "Make a game" in prefix and "Use Python" in prefix
+    # abilities.txt is only sent to the feasibility assessment, so the prefix stays the same for every call.
+    assert PROMPTS.get("feasibility").fields == ["abilities"]
+    assert all("abilities" not in template.fields for name, template in PROMPTS.templates.items() if name != "feasibility")
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import pytest
+
+from src.bot_agent import BotAgent
+from src.response_cache import ResponseCache
+from src.role import Role
+from src.structured_output import OutputSchema, StructuredOutputError
+
+MESSAGES = [{"role": "system", "content": "Say hello."}]
+ANSWER_SCHEMA = OutputSchema(
+    "answer",
+    "Answer the question.",
+    {"type": "object", "properties": {"ok": {"type": "boolean"}}, "required": ["ok"]},
+    lambda arguments: bool(arguments["ok"]),
+    )
+
+
+def test_keys_differ_by_model_messages_and_params() -> None:
+    key = ResponseCache.make_key("model-a", MESSAGES)
+    assert key == ResponseCache.make_key("model-a", [dict(message) for message in MESSAGES])
+    assert key != ResponseCache.make_key("model-b", MESSAGES)
+    assert key != ResponseCache.make_key("model-a", MESSAGES, {"temperature": 0.5})
+
+
+def test_least_recently_used_records_are_evicted(tmp_path: Path) -> None:
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_bytes=300)
+    keys = [ResponseCache.make_key("model", [{"role": "user", "content": str(i)}]) for i in range(3)]
+    cache.set(keys[0], "a" * 50)
+    cache.set(keys[1], "b" * 50)
+    # Reading the first record makes the second the least recently used.
+    time.sleep(0.01)
+    assert cache.get(keys[0]) == "a" * 50
+    cache.set(keys[2], "c" * 50)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == "a" * 50
+    assert cache.get(keys[2]) == "c" * 50
+
+
+def test_expired_records_are_misses(tmp_path: Path) -> None:
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_age=60)
+    key = ResponseCache.make_key("model", MESSAGES)
+    cache.set(key, "hello")
+    cache.connection.execute("UPDATE responses SET created_at = ?", (time.time() - 120,))
+
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def replying(agent: BotAgent, replies: list[str]) -> None:
+    """
+    Make the agent's completions return replies in order, repeating the last one, without calling the API.
+    """
+    async def acomplete(messages: list[dict[str, str]], model: str, use_cache: bool, labels: Optional[dict[str, Any]] = None, schema: Optional[OutputSchema[Any]] = None, store: bool = True) -> str:
+        return replies.pop(0) if len(replies) > 1 else replies[0]
+
+    agent._acomplete = acomplete  # type: ignore[method-assign]
+
+
+def structured_key(agent: BotAgent, prompt: str) -> str:
+    model = agent.router.escalation_path("answer")[0][1]
+    return ResponseCache.make_key(model, agent._prompt_messages(prompt, Role.system, ""), agent._schema_params(ANSWER_SCHEMA))
+
+
+def test_repaired_reply_is_cached_under_the_original_request(tmp_path: Path) -> None:
+    agent = BotAgent(ResponseCache(str(tmp_path / "responses.sqlite3")))
+    replying(agent, ["not an answer", '{"ok": true}'])
+
+    assert asyncio.run(agent.aresponse_structured("Is it ok?", ANSWER_SCHEMA, "answer")) is True
+    assert agent.cache is not None
+    assert agent.cache.get(structured_key(agent, "Is it ok?")) == '{"ok": true}'
+
+
+def test_unparsable_replies_are_not_cached(tmp_path: Path) -> None:
+    agent = BotAgent(ResponseCache(str(tmp_path / "responses.sqlite3")))
+    replying(agent, ["not an answer"])
+
+    with pytest.raises(StructuredOutputError):
+        asyncio.run(agent.aresponse_structured("Is it ok?", ANSWER_SCHEMA, "answer"))
+    assert agent.cache is not None
+    assert agent.cache.get(structured_key(agent, "Is it ok?")) is None
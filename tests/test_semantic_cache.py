@@ -0,0 +1,103 @@
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pytest
+
+from src.local_vector_index import LocalVectorIndex
+from src.semantic_cache import SemanticCache
+
+DIMENSION = 64
+
+
+class WordHippocampus:
+    """
+    Hippocampus that embeds a text as the counts of its words, so texts sharing most words score close to 1.
+    """
+    def __init__(self, directory: str, barrier: Optional[threading.Barrier] = None) -> None:
+        self.index = LocalVectorIndex(directory, DIMENSION)
+        # Every query waits here until as many queries are in flight as the barrier has parties.
+        self.barrier = barrier
+
+    def text_to_vector(self, text: str) -> list[float]:
+        vector = np.zeros(DIMENSION)
+        for word in text.lower().split():
+            vector[sum(word.encode("utf-8")) % DIMENSION] += 1
+        return [float(value) for value in vector]
+
+    def input_memories(self, memories: list[tuple[str, str]], namespace: str = "") -> None:
+        self.index.upsert([{"id": id, "values": self.text_to_vector(text)} for id, text in memories], namespace)
+
+    def query_scored_memories(self, queries: list[str], top_k: int = 1, namespace: str = "") -> list[list[tuple[str, float]]]:
+        if self.barrier:
+            self.barrier.wait()
+        results = []
+        for query in queries:
+            matches = self.index.query(self.text_to_vector(query), top_k, namespace).matches
+            results.append([(match.id, match.score) for match in matches])
+        return results
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> SemanticCache:
+    return SemanticCache(WordHippocampus(str(tmp_path / "memory")), str(tmp_path / "semantic.sqlite3"))  # type: ignore[arg-type]
+
+
+def test_sibling_tasks_of_one_objective_do_not_collide(cache: SemanticCache) -> None:
+    scope = cache.scope_for("Objective: Make a command line tool to rename photos by date.\nContext: It runs in Python 3.11 on Linux.")
+    cache.set_many("classify", scope, [("Write the argument parser", "use_python")])
+
+    assert cache.get_many("classify", scope, ["Write the argument parser", "Write the unit tests"]) == ["use_python", None]
+    assert cache.hit_rate("classify") == 0.5
+
+
+def test_reworded_objective_reuses_the_scope(cache: SemanticCache) -> None:
+    scope = cache.scope_for("Objective: Make a command line tool to rename photos by date.\nContext: It runs in Python 3.11 on Linux.")
+    cache.set_many("classify", scope, [("Write the argument parser", "use_python")])
+
+    reworded = cache.scope_for("Objective: Make a command line tool that renames photos by date.\nContext: It runs in Python 3.11 on Linux.")
+    assert reworded == scope
+    assert cache.get_many("classify", reworded, ["Write the argument parser"]) == ["use_python"]
+
+
+def test_answers_are_scoped_to_the_objective_and_context(cache: SemanticCache) -> None:
+    scope = cache.scope_for("Objective: Make a command line tool to rename photos by date.\nContext: It runs in Python 3.11 on Linux.")
+    cache.set_many("subdivide", scope, [("Write the argument parser", '["Parse flags"]')])
+
+    other = cache.scope_for("Objective: Bake sourdough bread at home.\nContext: Only a regular oven is available.")
+    assert other != scope
+    assert cache.get_many("subdivide", other, ["Write the argument parser"]) == [None]
+    assert cache.get_many("classify", scope, ["Write the argument parser"]) == [None]
+
+
+def test_expired_answers_are_dropped(tmp_path: Path) -> None:
+    cache = SemanticCache(WordHippocampus(str(tmp_path / "memory")), str(tmp_path / "semantic.sqlite3"), ttls={"classify": 60})  # type: ignore[arg-type]
+    scope = cache.scope_for("Objective: Make a CLI.\nContext: In Python.")
+    cache.set_many("classify", scope, [("Write the argument parser", "use_python")])
+    cache.connection.execute("UPDATE answers SET created_at = ?", (time.time() - 120,))
+
+    assert cache.get_many("classify", scope, ["Write the argument parser"]) == [None]
+    assert cache.hippocampus.index.query([1.0] * DIMENSION, 1, cache.namespace_for("classify", scope)).matches == []
+
+
+def test_lookups_run_concurrently(tmp_path: Path) -> None:
+    # Both lookups must reach the index at the same time, which they cannot if the lock is held across it.
+    hippocampus = WordHippocampus(str(tmp_path / "memory"), threading.Barrier(2, timeout=5))
+    cache = SemanticCache(hippocampus, str(tmp_path / "semantic.sqlite3"))  # type: ignore[arg-type]
+    errors: list[Exception] = []
+
+    def lookup() -> None:
+        try:
+            cache.get_many("classify", "scope", ["Write the argument parser"])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.lookups["classify"] == 2
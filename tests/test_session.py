@@ -0,0 +1,139 @@
+import asyncio
+from gettext import NullTranslations
+from pathlib import Path
+from typing import Any, Optional
+
+import pytest
+
+pytest.importorskip("rx")
+
+from benchmarks.scripted_ui import ScriptedUI  # noqa: E402
+from src import i18n  # noqa: E402
+from src.session import BATCH_CLASSIFICATION_SCHEMA, CLASSIFICATION_SCHEMA, FEASIBILITY_SCHEMA, TASK_LIST_SCHEMA, Session  # noqa: E402
+from src.task import Task, TaskTag  # noqa: E402
+from src.telemetry import Telemetry  # noqa: E402
+
+
+@pytest.fixture
+def session(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Session:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("RESPONSE_CACHE", "off")
+    monkeypatch.setenv("CHECKPOINT_PATH", str(tmp_path / "session.json"))
+    monkeypatch.setattr(i18n, "trans", NullTranslations())
+    # Speculation must be accounted for even when telemetry is off.
+    monkeypatch.setattr(Telemetry, "_shared", Telemetry(str(tmp_path), enabled=False))
+    return Session(ScriptedUI(["Fly to the moon.", "On foot.", "Make a CLI.", "In Python."]))
+
+
+def test_bare_classification_number() -> None:
+    assert CLASSIFICATION_SCHEMA.parse("4") == TaskTag.use_python
+    assert CLASSIFICATION_SCHEMA.parse("2") == TaskTag.subdivide
+    assert CLASSIFICATION_SCHEMA.parse('{"number": 0}') == TaskTag.unsolvable
+
+
+def test_bare_feasibility_answers() -> None:
+    assert FEASIBILITY_SCHEMA.parse("true") is True
+    assert FEASIBILITY_SCHEMA.parse("No") is False
+    assert FEASIBILITY_SCHEMA.parse('{"feasible": true}') is True
+
+
+def test_plain_text_task_lists_and_classifications() -> None:
+    assert TASK_LIST_SCHEMA.parse("- Write a parser\n- Test it") == ["Write a parser", "Test it"]
+    assert BATCH_CLASSIFICATION_SCHEMA.parse("1: 3\n2: 4\n3: 2") == {1: TaskTag.use_bot, 2: TaskTag.use_python, 3: TaskTag.subdivide}
+
+
+def stub_objective(session: Session, verdicts: list[Any], events: list[str]) -> None:
+    """
+    Replace the calls of determine_objective. The first speculation hangs in a recorded call until cancelled.
+    """
+    async def initial_tasks(objective: str, context: str, pending: Optional[list[tuple[str, str]]] = None) -> list[Task]:
+        if events:
+            return []
+        with Telemetry.shared().call("chat", "test-model") as record:
+            record.set_usage(100, 0)
+            try:
+                events.append("speculating")
+                await asyncio.sleep(10)
+            finally:
+                events.append("cancelled")
+        return []
+
+    async def feasibility_assessment(objective: str, context: str) -> tuple[bool, Any]:
+        while not events:
+            await asyncio.sleep(0)
+        verdict = verdicts.pop(0)
+        if isinstance(verdict, Exception):
+            raise verdict
+        return verdict, None
+
+    async def explain_infeasibility(agent: Any) -> None:
+        events.append("explained")
+
+    session.initial_tasks = initial_tasks  # type: ignore[method-assign]
+    session.feasibility_assessment = feasibility_assessment  # type: ignore[method-assign]
+    session.explain_infeasibility = explain_infeasibility  # type: ignore[method-assign]
+
+
+def test_infeasible_objective_cancels_speculation_before_explaining(session: Session) -> None:
+    events: list[str] = []
+    stub_objective(session, [False, True], events)
+
+    assert asyncio.run(session.determine_objective()) == ("Make a CLI.", "In Python.")
+    assert events == ["speculating", "cancelled", "explained"]
+    assert Telemetry.usage(session.wasted_speculation)["tokens"] == 100
+    assert session.speculation is not None and session.speculation.done()
+
+
+def test_failed_assessment_cancels_speculation(session: Session) -> None:
+    events: list[str] = []
+    stub_objective(session, [RuntimeError("assessment failed")], events)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(session.determine_objective())
+    assert events == ["speculating", "cancelled"]
+    assert len(session.wasted_speculation) == 1
+
+
+def test_speculative_classifications_are_not_cached(session: Session) -> None:
+    stored: list[tuple[str, str]] = []
+
+    async def cached_answers(call_type: str, objective: str, context: str, texts: list[str]) -> list[Optional[str]]:
+        return [None] * len(texts)
+
+    async def cache_answers(call_type: str, objective: str, context: str, items: list[tuple[str, str]]) -> None:
+        stored.extend(items)
+
+    async def tasktexts_to_tags(objective: str, context: str, tasks_text: list[str]) -> list[Optional[TaskTag]]:
+        return [TaskTag.use_python] * len(tasks_text)
+
+    session.cached_answers = cached_answers  # type: ignore[method-assign]
+    session.cache_answers = cache_answers  # type: ignore[method-assign]
+    session.tasktexts_to_tags = tasktexts_to_tags  # type: ignore[method-assign]
+
+    pending: list[tuple[str, str]] = []
+    asyncio.run(session.classify_tasks("Make a CLI.", "In Python.", ["Parse arguments", "Print help"], pending))
+    assert stored == []
+    assert pending == [("Parse arguments", "use_python"), ("Print help", "use_python")]
+
+    asyncio.run(session.classify_tasks("Make a CLI.", "In Python.", ["Parse arguments", "Print help"]))
+    assert stored == pending
+
+
+class BrokenSemanticCache:
+    def scope_for(self, text: str) -> str:
+        return "scope"
+
+    def get_many(self, call_type: str, scope: str, texts: list[str]) -> list[Optional[str]]:
+        raise ConnectionError("embedding API is unreachable")
+
+    def set_many(self, call_type: str, scope: str, items: list[tuple[str, str]]) -> None:
+        raise ConnectionError("embedding API is unreachable")
+
+
+def test_failing_semantic_cache_is_a_miss(session: Session) -> None:
+    session.semantic_cache = BrokenSemanticCache()  # type: ignore[assignment]
+
+    assert asyncio.run(session.cached_answers("classify", "Make a CLI.", "In Python.", ["Parse arguments"])) == [None]
+    asyncio.run(session.cache_answers("classify", "Make a CLI.", "In Python.", [("Parse arguments", "use_python")]))
+    assert session.semantic_cache_errors == 2
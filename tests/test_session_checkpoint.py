@@ -0,0 +1,44 @@
+import asyncio
+from pathlib import Path
+from typing import Callable
+
+from src.session_checkpoint import SessionCheckpoint
+from src.task import Task, TaskTag
+from src.task_tree_expander import TaskTreeExpander
+
+
+def test_state_survives_a_restart(tmp_path: Path) -> None:
+    checkpoint = SessionCheckpoint(str(tmp_path / "checkpoint" / "session.json"))
+    parent = Task("Build the CLI", TaskTag.subdivide)
+    parent.set_subtasks([Task("Parse arguments", TaskTag.use_python)])
+    checkpoint.save_objective("Make a CLI.", "In Python.")
+    checkpoint.save_tasks([parent], False)
+
+    restarted = SessionCheckpoint(str(tmp_path / "checkpoint" / "session.json"))
+    assert restarted.load()
+    assert restarted.objective == ("Make a CLI.", "In Python.")
+    assert restarted.tasks is not None
+    assert [task.to_dict() for task in restarted.tasks] == [parent.to_dict()]
+    assert not restarted.subdivided
+
+    restarted.clear()
+    assert not SessionCheckpoint(str(tmp_path / "checkpoint" / "session.json")).load()
+
+
+def test_resumed_expansion_skips_tasks_already_split(tmp_path: Path) -> None:
+    checkpoint = SessionCheckpoint(str(tmp_path / "session.json"))
+    done = Task("Build the CLI", TaskTag.subdivide)
+    done.set_subtasks([Task("Parse arguments", TaskTag.use_python)])
+    checkpoint.save_tasks([done, Task("Write the docs", TaskTag.subdivide)], False)
+    checkpoint.load()
+    assert checkpoint.tasks is not None
+    tasks = checkpoint.tasks
+    split_tasks: list[str] = []
+
+    async def split(task: Task, claim: Callable[[int], int]) -> list[Task]:
+        split_tasks.append(task.content)
+        return [Task("Write the README", TaskTag.use_bot)][:claim(1)]
+
+    asyncio.run(TaskTreeExpander(split, max_depth=3, max_nodes=100, time_limit=10).expand(tasks))
+    assert split_tasks == ["Write the docs"]
+    assert [len(task.subtasks) for task in tasks] == [1, 1]
@@ -0,0 +1,70 @@
+import re
+from typing import Optional
+
+import pytest
+
+from src.structured_output import OutputSchema, StructuredOutputError, validate
+
+
+def parse_number(reply: str) -> Optional[int]:
+    numbers = re.findall(r"\d+", reply)
+    return int(numbers[0]) if len(numbers) == 1 else None
+
+
+NUMBER_SCHEMA = OutputSchema(
+    "classify_task",
+    "Classify the task.",
+    {"type": "object", "properties": {"number": {"type": "integer", "enum": [0, 1, 2, 3, 4]}}, "required": ["number"]},
+    lambda arguments: int(arguments["number"]),
+    parse_number,
+    )
+
+
+def test_function_arguments() -> None:
+    assert NUMBER_SCHEMA.parse('{"number": 3}') == 3
+
+
+def test_json_in_a_code_block() -> None:
+    assert NUMBER_SCHEMA.parse('```json\n{"number": 2}\n```') == 2
+
+
+def test_plain_text_falls_back_to_the_text_parser() -> None:
+    assert NUMBER_SCHEMA.parse("The answer is 4.") == 4
+
+
+def test_bare_json_value_falls_back_to_the_text_parser() -> None:
+    assert NUMBER_SCHEMA.parse("4") == 4
+
+
+def test_bare_json_value_without_text_parser_is_rejected() -> None:
+    schema = OutputSchema("classify_task", "", NUMBER_SCHEMA.parameters, lambda arguments: arguments["number"])
+    with pytest.raises(StructuredOutputError, match=r"\$ must be object"):
+        schema.parse("4")
+
+
+def test_schema_errors_name_the_path() -> None:
+    with pytest.raises(StructuredOutputError, match=r"\$\.number must be one of"):
+        NUMBER_SCHEMA.parse('{"number": 7}')
+    with pytest.raises(StructuredOutputError, match=r"\$\.number is missing"):
+        NUMBER_SCHEMA.parse('{"tag": 1}')
+
+
+def test_invalid_json_without_readable_text() -> None:
+    with pytest.raises(StructuredOutputError, match="invalid JSON"):
+        NUMBER_SCHEMA.parse('{"number": ')
+
+
+def test_validate_items_and_bounds() -> None:
+    schema = {"type": "array", "items": {"type": "integer", "minimum": 1}}
+    validate(schema, [1, 2])
+    with pytest.raises(StructuredOutputError, match=r"\$\[1\] must be at least 1"):
+        validate(schema, [1, 0])
+    with pytest.raises(StructuredOutputError, match=r"\$\[0\] must be integer"):
+        validate(schema, [True])
+
+
+def test_repair_prompt_holds_only_the_reply_and_error() -> None:
+    prompt = NUMBER_SCHEMA.repair_prompt('{"number": 7}', "$.number must be one of [0, 1, 2, 3, 4]")
+    assert '{"number": 7}' in prompt
+    assert "$.number must be one of" in prompt
+    assert "classify_task" in prompt
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Callable
+
+from src.task import Task, TaskTag
+from src.task_tree_expander import TaskTreeExpander
+
+
+class FakeSplitter:
+    """
+    Splits every Task into subtask_count subtasks of the given tag, counting the splits and classified subtasks.
+    """
+    def __init__(self, subtask_count: int, tag: TaskTag = TaskTag.use_python) -> None:
+        self.subtask_count = subtask_count
+        self.tag = tag
+        self.splits = 0
+        self.classified = 0
+
+    async def split(self, task: Task, claim: Callable[[int], int]) -> list[Task]:
+        self.splits += 1
+        await asyncio.sleep(0)
+        texts = [f"{task.content}.{i + 1}" for i in range(self.subtask_count)]
+        texts = texts[:claim(len(texts))]
+        self.classified += len(texts)
+        return [Task(text, self.tag) for text in texts]
+
+
+def subdividable_tasks(count: int) -> list[Task]:
+    return [Task(f"Task {i + 1}", TaskTag.subdivide) for i in range(count)]
+
+
+def test_subtasks_past_the_node_limit_are_not_classified() -> None:
+    splitter = FakeSplitter(10)
+    expander = TaskTreeExpander(splitter.split, max_depth=3, max_nodes=5 + 12, time_limit=10)
+    tasks = asyncio.run(expander.expand(subdividable_tasks(5)))
+
+    assert splitter.classified == 12
+    assert expander.count_nodes(tasks) == 17
+    assert expander.stopped_reason == "node limit (17)"
+
+
+def test_splits_are_not_launched_past_the_node_limit() -> None:
+    splitter = FakeSplitter(1)
+    expander = TaskTreeExpander(splitter.split, max_depth=3, max_nodes=5 + 2, time_limit=10)
+    tasks = asyncio.run(expander.expand(subdividable_tasks(5)))
+
+    assert splitter.splits == 2
+    assert [len(task.subtasks) for task in tasks] == [1, 1, 0, 0, 0]
+    assert expander.stopped_reason == "node limit (7)"
+
+
+def test_expansion_stops_at_the_depth_limit() -> None:
+    splitter = FakeSplitter(2, TaskTag.subdivide)
+    expander = TaskTreeExpander(splitter.split, max_depth=2, max_nodes=1000, time_limit=10)
+    tasks = asyncio.run(expander.expand(subdividable_tasks(1)))
+
+    assert expander.count_nodes(tasks) == 1 + 2 + 4
+    assert expander.stopped_reason == "depth limit (2)"